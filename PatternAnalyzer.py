@@ -1,5 +1,8 @@
 from analysis.candlestick_pattern import candlestick_patterns, GOOD_PATTERNS
 from utils.webdata import get_data_of_symbol
+from utils.SymbolUniverse import SymbolUniverse, BILLION_CAPS
+from utils.TradingCalendar import TradingCalendar
+from analysis.SignalStore import SignalStore, signal_key
 from datetime import date, timedelta
 
 import csv
@@ -7,11 +10,27 @@ import csv
 """
 Analyze the candlestick patterns of NYSE and NASDAQ symbols (price > 0 and marketcap > 1B) in the last trading day.
 """
+
+# the source of the signals of the patterns in the signal store
+SOURCE = "web"
+
+
 class PatternAnalyzer(object):
 
-    def __init__(self, symbols, outfile):
-        self.symbols = symbols
+    def __init__(self, symbols, outfile, signal_store=None):
+        """
+        Parameters
+        -----------
+        symbols: list or SymbolUniverse
+            the symbols to analyze
+        outfile: string
+        signal_store: SignalStore
+            save the patterns of the symbols to the signal store, see analysis.SignalStore
+        """
+        self.symbols = list(symbols)
         self.outfile = outfile
+        self.signal_store = signal_store
+        self.last_date = None
 
 
     def analyze(self):
@@ -21,6 +40,22 @@ class PatternAnalyzer(object):
         for symbol in self.symbols:
             self.__analyze_pattern(symbol)
 
+        if self.signal_store is not None and self.last_date is not None:
+            self.signal_store.save()
+            self.__print_pattern_counts()
+
+
+    def __print_pattern_counts(self):
+        """
+        Print the number of the symbols that have each pattern in the last trading day.
+        """
+        symbols = set(self.symbols)
+        for col in GOOD_PATTERNS:
+            key = signal_key(col, source=SOURCE)
+            bull = len(symbols.intersection(self.signal_store.match(self.last_date, [(key, 1)])))
+            bear = len(symbols.intersection(self.signal_store.match(self.last_date, [(key, -1)])))
+            print "{} {}: bull {} bear {}".format(self.last_date.date(), col, bull, bear)
+
 
     def __analyze_pattern(self, symbol):
         enddate = date.today()
@@ -37,6 +72,12 @@ class PatternAnalyzer(object):
         patterns = candlestick_patterns(prices, GOOD_PATTERNS)
         self.__print_lastday_pattern(patterns.iloc[-1, :], symbol)
 
+        if self.signal_store is not None:
+            for col in GOOD_PATTERNS:
+                self.signal_store.put(symbol, signal_key(col, source=SOURCE), patterns.index, patterns[col].values)
+            self.last_date = max(self.last_date, patterns.index[-1]) if self.last_date is not None \
+                else patterns.index[-1]
+
 
     def __print_lastday_pattern(self, patterns, symbol):
         for col in GOOD_PATTERNS:
@@ -44,29 +85,24 @@ class PatternAnalyzer(object):
                 self.writer.writerow([symbol, col, patterns[col]])
 
 
-def read_symbols(filename):
-    csvfile = open(filename, 'r')
-    symbol_reader = csv.reader(csvfile, delimiter=",")
-    symbol_reader.next()
-    symbols = []
-
-    for row in symbol_reader:
-        if row[2] == 'n/a':
-            continue
-
-        lastsale = float(row[2])
-        if lastsale > 1 and row[3].endswith('B'):
-            symbols.append(row[0])
-
-    return symbols
+def read_symbols(exchange, universe=None):
+    """
+    Get the universe of the symbols of the exchange to analyze, see BILLION_CAPS.
+    """
+    if universe is None:
+        universe = SymbolUniverse.load()
+    return universe.select(exchanges=[exchange], **BILLION_CAPS)
 
 
 if __name__ == "__main__":
     today = date.today()
-    symbols = read_symbols("./data/NYSE_symbols.csv")
-    analyzer = PatternAnalyzer(symbols, "./out/NYSE-PATTERNS-{}.csv".format(today.isoformat()))
+    universe = SymbolUniverse.load()
+    # the web prices may be newer than the csv files, so the calendar is the business days
+    store = SignalStore("data/signals/patterns", calendar=TradingCalendar.from_holidays("2016-01-01", today))
+    symbols = read_symbols("NYSE", universe)
+    analyzer = PatternAnalyzer(symbols, "./out/NYSE-PATTERNS-{}.csv".format(today.isoformat()), store)
     analyzer.analyze()
 
-    symbols = read_symbols("./data/NASDAQ_symbols.csv")
-    analyzer = PatternAnalyzer(symbols, "./out/NASDAQ-PATTERNS-{}.csv".format(today.isoformat()))
+    symbols = read_symbols("NASDAQ", universe)
+    analyzer = PatternAnalyzer(symbols, "./out/NASDAQ-PATTERNS-{}.csv".format(today.isoformat()), store)
     analyzer.analyze()
\ No newline at end of file
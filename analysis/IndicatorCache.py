@@ -0,0 +1,328 @@
+import threading as th
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+
+import analysis.indicators as ind
+from utils.OHLCV import price_field
+from utils.PriceStore import COLUMNS
+
+"""
+A persistent cache of the values of the functions in analysis.indicators and
+analysis.indicator_feature. An entry is the values of a function on the prices of a
+symbol, it is keyed by the symbol, the function, the canonical json of the params
+and the first dates of the prices, and it records the digest of the rows it was
+computed from. The values are saved in a npz file per entry, the index.json file
+records the entries in the order of their last use.
+
+    macd_val = indicator_cache.compute("AAPL", ind.macd, prices, {"windows": [12, 26, 9]})
+
+An entry is used only if the digest of the same rows of the prices is not changed,
+so the prices that do not come from a csv file (e.g. the web data) are checked the
+same way. If new bars were appended to the prices, only the new rows are computed:
+an indicator that has a finite warm-up (see analysis.indicators.warmup) is computed
+on the new rows and its warm-up rows, the others are computed again. The least
+recently used entries are removed when the files exceed max_bytes.
+
+The index is written every SAVE_INTERVAL new entries and by save(), call save()
+after a batch of computations (the evaluators do it when they finish).
+"""
+
+CACHE_DIR = "data/indicators"
+INDEX_FILE = "index.json"
+SAVE_INTERVAL = 100
+
+
+def canonical_params(params):
+    """
+    The json of the params with sorted keys, the equal params have the same json.
+    """
+    return json.dumps(params, sort_keys=True)
+
+
+def price_digest(prices, rows):
+    """
+    Get the sha1 hex digest of the dates and the prices of the first rows.
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(np.ascontiguousarray(prices.index.values[:rows]).view(np.int64))
+    for name in COLUMNS:
+        try:
+            values = price_field(prices, name)
+        except KeyError:
+            continue
+        sha1.update(np.ascontiguousarray(values[:rows]))
+    return sha1.hexdigest()
+
+
+def _tail(prices, start):
+    """
+    The rows of the prices (DataFrame or OHLCV) from the position start.
+    """
+    if isinstance(prices, pd.DataFrame):
+        return prices.iloc[start:]
+    return prices.slice(start, len(prices))
+
+
+class IndicatorCache(object):
+    """
+    The cache of the indicator values, it is thread safe.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        """
+        Parameters
+        -----------
+        cache_dir: string
+            the directory of the cached values, None to disable the cache
+        max_bytes: int
+            the maximum number of bytes of the files of the cached values
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index = None   # key -> record of the entry, from the least recently used
+        self.bytes = 0      # the bytes of the files of the entries
+        self.unsaved = 0    # the number of the entries added after the index was written
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+        self.lock = th.Lock()
+
+
+    def compute(self, symbol, func, prices, params=None):
+        """
+        Get the values of func(prices, params), they are computed and cached if they
+        are not cached.
+
+        Parameters
+        ----------
+        symbol: string
+            the symbol of the prices
+        func: function
+            a function of analysis.indicators or analysis.indicator_feature
+        prices: DataFrame or OHLCV
+            the prices of the symbol, or the prices derived from them (e.g. weekly prices)
+        params: dict
+            the parameters of the function, the default parameters if None
+
+        Returns
+        ----------
+        values: DataFrame or Series
+            the same as the values returned by the function
+        """
+        if self.cache_dir is None:
+            return self.__call(func, prices, params)
+
+        key = self.__key(symbol, func, params, prices)
+        length = len(prices.index)
+
+        self.lock.acquire()
+        try:
+            self.__load()
+            record = self.index.pop(key, None)
+            if record is not None:
+                self.index[key] = record    # the most recently used
+        finally:
+            self.lock.release()
+
+        cached = None
+        if record is not None and record["rows"] <= length and record["digest"] == price_digest(prices, record["rows"]):
+            cached = self.__read(record)
+
+        if cached is not None and record["rows"] == length:
+            self.__count("hits")
+            return self.__result(cached, record, prices)
+
+        if cached is not None:
+            values = self.__extend(func, prices, params, cached, record["rows"])
+            self.__count("extensions")
+        else:
+            values = self.__call(func, prices, params)
+            self.__count("misses")
+
+        self.__put(key, symbol, func, params, prices, values)
+        return values
+
+
+    def __count(self, name):
+        self.lock.acquire()
+        setattr(self, name, getattr(self, name) + 1)
+        self.lock.release()
+
+
+    def __call(self, func, prices, params):
+        return func(prices) if params is None else func(prices, params)
+
+
+    def __extend(self, func, prices, params, cached, rows):
+        """
+        Compute the values of the new rows and append them to the cached rows.
+        """
+        name = func.__name__
+        length = None
+        if func.__module__ == ind.__name__ and name in ind.WARMUP:
+            length = ind.warmup(name, params)
+        if length is None:
+            return self.__call(func, prices, params)
+
+        start = max(0, rows - length)
+        tail = self.__call(func, _tail(prices, start), params)
+        values = np.concatenate((cached, np.asarray(tail.values).reshape(len(tail.index), -1)[rows-start:]))
+        if isinstance(tail, pd.Series):
+            return pd.Series(values[:, 0], index=prices.index, name=tail.name)
+        return pd.DataFrame(values, index=prices.index, columns=tail.columns)
+
+
+    def __result(self, values, record, prices):
+        if record["columns"] is None:
+            return pd.Series(values[:, 0], index=prices.index)
+        return pd.DataFrame(values, index=prices.index, columns=record["columns"])
+
+
+    def __key(self, symbol, func, params, prices):
+        if params is None and func.__defaults__:
+            params = func.__defaults__[0]
+        # the first dates tell the prices of different ranges or periods (e.g. weekly) apart
+        dates = [str(d) for d in prices.index.values[:2]]
+        text = "|".join([symbol, func.__module__, func.__name__, canonical_params(params)] + dates)
+        return hashlib.sha1(text).hexdigest()
+
+
+    def __read(self, record):
+        try:
+            with np.load(os.path.join(self.cache_dir, record["file"])) as data:
+                return data["values"]
+        except (IOError, KeyError, ValueError):
+            return None
+
+
+    def __put(self, key, symbol, func, params, prices, values):
+        columns = None if isinstance(values, pd.Series) else [str(c) for c in values.columns]
+        array = np.asarray(values.values, dtype=np.float64)
+        if array.ndim == 1:
+            array = array[:, np.newaxis]
+        filename = "{}.npz".format(key)
+        if not os.path.exists(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                pass    # created by another thread
+
+        path = os.path.join(self.cache_dir, filename)
+        temp = path + ".{}.tmp".format(th.current_thread().ident)
+        with open(temp, "wb") as f:
+            np.savez(f, values=array)
+        os.rename(temp, path)
+
+        record = {"file": filename, "symbol": symbol, "func": "{}.{}".format(func.__module__, func.__name__),
+                  "params": canonical_params(params), "columns": columns, "rows": len(values.index),
+                  "digest": price_digest(prices, len(values.index)), "bytes": os.path.getsize(path)}
+
+        self.lock.acquire()
+        try:
+            self.__load()
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.bytes -= old["bytes"]
+            self.index[key] = record
+            self.bytes += record["bytes"]
+            self.__evict()
+            self.unsaved += 1
+            if self.unsaved >= SAVE_INTERVAL:
+                self.__save()
+        finally:
+            self.lock.release()
+
+
+    def __evict(self):
+        while self.bytes > self.max_bytes and len(self.index) > 0:
+            key, record = self.index.popitem(last=False)
+            self.bytes -= record["bytes"]
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, record["file"]))
+            except OSError:
+                pass
+
+
+    def __load(self):
+        if self.index is not None:
+            return
+
+        self.index = OrderedDict()
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.index = json.load(f, object_pairs_hook=OrderedDict)
+            except ValueError:
+                print "The index of the indicator cache is broken, the cache is cleared."
+        self.bytes = sum(record["bytes"] for record in self.index.values())
+
+
+    def __save(self):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.rename(path + ".tmp", path)
+        self.unsaved = 0
+
+
+    def save(self):
+        """
+        Save the index, i.e. the new entries and the access order of the entries.
+        """
+        self.lock.acquire()
+        try:
+            if self.index is not None and self.cache_dir is not None and os.path.exists(self.cache_dir):
+                self.__save()
+        finally:
+            self.lock.release()
+
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.__load()
+            for record in self.index.values():
+                try:
+                    os.remove(os.path.join(self.cache_dir, record["file"]))
+                except OSError:
+                    pass
+            self.index = OrderedDict()
+            self.bytes = 0
+            if os.path.exists(self.cache_dir):
+                self.__save()
+        finally:
+            self.lock.release()
+
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+
+        Returns
+        ----------
+        stats: dict
+            the keys are [hits, misses, extensions, evictions, entries, bytes, max_bytes]
+        """
+        self.lock.acquire()
+        try:
+            entries = []
+            if self.cache_dir is not None:
+                self.__load()
+                entries = self.index.values()
+            return {"hits": self.hits, "misses": self.misses, "extensions": self.extensions,
+                    "evictions": self.evictions, "entries": len(entries),
+                    "bytes": self.bytes, "max_bytes": self.max_bytes}
+        finally:
+            self.lock.release()
+
+
+# the cache shared by the evaluators and the strategies
+indicator_cache = IndicatorCache()
@@ -0,0 +1,247 @@
+import pandas as pd
+import numpy as np
+import math
+
+import analysis.indicators as ind
+from analysis import kernels
+from utils.OHLCV import price_field
+
+"""
+Compute a set of indicators of a symbol with the shared intermediate results computed
+once. Each indicator is described by a recipe of expression nodes, a node is a tuple
+(op, arg1, arg2, ...) whose args are literals or other nodes, for example the EMA12 of
+the close price is ("ema", ("field", "Close"), 12). The nodes of all the requested
+indicators are merged into one dependency DAG, the equal nodes are the same node, so
+the EMAs shared by macd, ema and trix, the RSV shared by kdj and stoch, the typical
+price shared by cci, mfi and mafe and the true range shared by atr and adx are
+evaluated once per symbol.
+
+    graph = IndicatorGraph([("macd", None), ("ema", {"windows": [12, 26]}), ("kdj", None)])
+    macd_val, ema_val, kdj_val = graph.evaluate(prices)
+"""
+
+
+def __ema(values, window):
+    data = pd.ewma(values, span=window)
+    data[0:window-1] = np.nan
+    return data
+
+
+def __zero_below(values, cond):
+    return np.where(cond < 0, 0, values)
+
+
+def __zero_above(values, cond):
+    return np.where(cond > 0, 0, values)
+
+
+def __mafe(close, tp, volume, window):
+    ret = close / kernels.shift(close) - 1
+    ret[0:1] = 0
+    values = ret / (tp * volume)
+    mean = math.fabs(np.nanmean(values))
+    return pd.rolling_mean(values / mean, window)
+
+
+# op -> function of the prices and the values of the args
+OPS = {
+    "field": lambda prices, name: price_field(prices, name),
+    "add": lambda prices, a, b: np.add(a, b),
+    "sub": lambda prices, a, b: np.subtract(a, b),
+    "mul": lambda prices, a, b: np.multiply(a, b),
+    "div": lambda prices, a, b: np.divide(a, b),
+    "abs": lambda prices, a: np.abs(a),
+    "item": lambda prices, a, i: a[i],
+    "shift": lambda prices, a, n: kernels.shift(a, n),
+    "cumsum": lambda prices, a: np.cumsum(a),
+    "zero_below": lambda prices, a, cond: __zero_below(a, cond),
+    "zero_above": lambda prices, a, cond: __zero_above(a, cond),
+    "ema": lambda prices, a, window: __ema(a, window),
+    "mean": lambda prices, a, window: pd.rolling_mean(a, window),
+    "std": lambda prices, a, window: pd.rolling_std(a, window),
+    "sum": lambda prices, a, window: pd.rolling_sum(a, window),
+    "mad": lambda prices, a, center, window: kernels.rolling_mad(a, window, center),
+    "rsv": lambda prices, close, high, low, window: kernels.rsv(close, high, low, window),
+    "tr": lambda prices, high, low, close: kernels.true_range(high, low, close),
+    "dm": lambda prices, high, low: kernels.directional_movement(high, low),
+    "atr": lambda prices, tr, window: kernels.average_true_range(tr, window),
+    "adx": lambda prices, tr, pdm, mdm, window: kernels.directional_index(tr, pdm, mdm, window),
+    "mfv": lambda prices, close, high, low, volume: kernels.money_flow_volume(close, high, low, volume),
+    "obv": lambda prices, close, volume: kernels.obv(close, volume),
+    "mafe": lambda prices, close, tp, volume, window: __mafe(close, tp, volume, window),
+}
+
+CLOSE = ("field", "Close")
+HIGH = ("field", "High")
+LOW = ("field", "Low")
+VOLUME = ("field", "Volume")
+TP = ("div", ("add", ("add", HIGH, LOW), CLOSE), 3.0)
+TR = ("tr", HIGH, LOW, CLOSE)
+MFV = ("mfv", CLOSE, HIGH, LOW, VOLUME)
+DELTA = ("sub", CLOSE, ("shift", CLOSE, 1))
+
+
+def __oscillator(ratio):
+    """
+    100 - 100 / (1 + ratio)
+    """
+    return ("sub", 100.0, ("div", 100.0, ("add", 1.0, ratio)))
+
+
+def __bb(params):
+    rm = ("mean", CLOSE, params["window"])
+    rstd = ("std", CLOSE, params["window"])
+    return [("Middle", rm), ("Upper", ("add", rm, ("mul", rstd, 2))), ("Lower", ("sub", rm, ("mul", rstd, 2)))]
+
+
+def __macd(params):
+    windows = params["windows"]
+    diff = ("sub", ("ema", CLOSE, windows[0]), ("ema", CLOSE, windows[1]))
+    dea = ("ema", diff, windows[2])
+    return [("DIFF", diff), ("DEA", dea), ("MACD", ("sub", diff, dea))]
+
+
+def __rsi(params):
+    window = params["window"]
+    gain = ("mean", ("zero_below", DELTA, DELTA), window)
+    lose = ("mean", ("zero_above", DELTA, DELTA), window)
+    return [("RSI", __oscillator(("div", gain, ("abs", lose))))]
+
+
+def __mfi(params):
+    window = params["window"]
+    rmf = ("mul", TP, VOLUME)
+    mfr = ("div", ("sum", ("zero_below", rmf, DELTA), window), ("sum", ("zero_above", rmf, DELTA), window))
+    return [("MFI", __oscillator(mfr))]
+
+
+def __kd(windows):
+    k = ("mean", ("rsv", CLOSE, HIGH, LOW, windows[0]), windows[1])
+    return k, ("mean", k, windows[2])
+
+
+def __kdj(params):
+    k, d = __kd(params["windows"])
+    return [("K", k), ("D", d), ("J", ("sub", ("mul", 3, k), ("mul", 2, d)))]
+
+
+def __adx(params):
+    dm = ("dm", HIGH, LOW)
+    adx = ("adx", TR, ("item", dm, 0), ("item", dm, 1), params["window"])
+    return [("ADX", ("item", adx, 0)), ("+DI", ("item", adx, 1)), ("-DI", ("item", adx, 2))]
+
+
+def __cci(params):
+    window = params["window"]
+    stp = ("mean", TP, window)
+    dev = ("mad", TP, stp, window)
+    return [("CCI", ("div", ("sub", TP, stp), ("mul", 0.015, dev)))]
+
+
+def __trix(params):
+    windows = params["windows"]
+    tr = ("ema", ("ema", ("ema", CLOSE, windows[0]), windows[0]), windows[0])
+    shift_tr = ("shift", tr, 1)
+    trix = ("mul", ("div", ("sub", tr, shift_tr), shift_tr), 100)
+    return [("TRIX", trix), ("MATRIX", ("mean", trix, windows[1]))]
+
+
+# indicator name -> function of the params that returns the [(column, node)] of the indicator
+RECIPES = {
+    "sma": lambda p: [("SMA{}".format(w), ("mean", CLOSE, w)) for w in p["windows"]],
+    "ema": lambda p: [("EMA{}".format(w), ("ema", CLOSE, w)) for w in p["windows"]],
+    "bb": __bb,
+    "macd": __macd,
+    "rsi": __rsi,
+    "cmf": lambda p: [("CMF", ("div", ("sum", MFV, p["window"]), ("sum", VOLUME, p["window"])))],
+    "mfi": __mfi,
+    "kdj": __kdj,
+    "stoch": lambda p: zip(["K", "D"], __kd(p["windows"])),
+    "atr": lambda p: [("ATR", ("atr", TR, p["window"]))],
+    "adx": __adx,
+    "cci": __cci,
+    "obv": lambda p: [("OBV", ("obv", CLOSE, VOLUME))],
+    "adl": lambda p: [("ADL", ("cumsum", MFV))],
+    "trix": __trix,
+    "mafe": lambda p: [("MAFE", ("mafe", CLOSE, TP, VOLUME, p["window"]))],
+}
+
+
+class IndicatorGraph(object):
+
+    def __init__(self, requests):
+        """
+        Parameters
+        -----------
+        requests: list
+            the (name, params) of the indicators, name is the name of the function in
+            analysis.indicators, params is None for the default parameters of the function
+        """
+        self.requests = list(requests)
+        self.outputs = []
+        for name, params in self.requests:
+            if params is None:
+                params = ind.default_params(name)
+            self.outputs.append(RECIPES[name](params))
+
+        # the nodes in the topological order, each node is after its args
+        self.nodes = []
+        visited = set()
+        for columns in self.outputs:
+            for column, node in columns:
+                self.__visit(node, visited)
+
+
+    def __visit(self, node, visited):
+        if node in visited:
+            return
+        visited.add(node)
+        for arg in node[1:]:
+            if isinstance(arg, tuple):
+                self.__visit(arg, visited)
+        self.nodes.append(node)
+
+
+    def evaluate(self, prices):
+        """
+        Compute the indicators.
+
+        Parameters
+        ----------
+        prices: DataFrame or OHLCV
+
+        Returns
+        ----------
+        results: list
+            the DataFrames of the requested indicators in the order of the requests, the
+            same as the DataFrames returned by the functions in analysis.indicators
+        """
+        values = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for node in self.nodes:
+                args = [values[arg] if isinstance(arg, tuple) else arg for arg in node[1:]]
+                values[node] = OPS[node[0]](prices, *args)
+
+        results = []
+        for columns in self.outputs:
+            data = np.column_stack(tuple(values[node] for column, node in columns))
+            results.append(pd.DataFrame(data, index=prices.index, columns=[column for column, node in columns]))
+        return results
+
+
+def compute_indicators(prices, requests):
+    """
+    Compute the indicators with the shared intermediate results computed once.
+
+    Parameters
+    ----------
+    prices: DataFrame or OHLCV
+    requests: list
+        the (name, params) of the indicators
+
+    Returns
+    ----------
+    results: list
+        the DataFrames of the indicators in the order of the requests
+    """
+    return IndicatorGraph(requests).evaluate(prices)
@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+
+from analysis.resample import resample, completed_buckets
+from utils.PriceStore import DAY_NS
+
+"""
+The higher timeframes (e.g. weekly and monthly) of the daily prices of a symbol. The
+resampled prices and the daily -> higher timeframe map are computed once per period
+and cached, then the values of a higher timeframe are aligned to the daily prices by
+one gather:
+
+    timeframes = MultiTimeframe(prices)
+    week_prices = timeframes.bars("W")
+    week_kdj = timeframes.align(ind.kdj(week_prices), "W")
+
+The row of a day is the row of the last completed bar, so the values of a bar are not
+used before the bar is completed. The last bar is dropped (it may be incomplete).
+"""
+
+
+class MultiTimeframe(object):
+
+    def __init__(self, prices):
+        """
+        Parameters
+        -----------
+        prices: DataFrame
+            the daily prices, it contains the columns [Open, High, Low, Close, Volume]
+        """
+        self.prices = prices
+        self.days = prices.index.values.view(np.int64) // DAY_NS
+        self.__bars = {}        # period -> resampled prices
+        self.__positions = {}   # period -> the row of the last completed bar of each day
+
+
+    def bars(self, period):
+        """
+        Get the resampled prices, the last bar is dropped.
+
+        Parameters
+        ----------
+        period: string or int
+            "W", "M" or the number of trading days, see analysis.resample
+        """
+        if period not in self.__bars:
+            self.__bars[period] = resample(self.prices, period, drop_last=True)
+        return self.__bars[period]
+
+
+    def positions(self, period):
+        """
+        Get the row of the last completed bar of each day, -1 if no bar is completed.
+        """
+        if period not in self.__positions:
+            self.__positions[period] = completed_buckets(self.days, period)
+        return self.__positions[period]
+
+
+    def ready(self, periods):
+        """
+        Get the mask of the days that have a completed bar of all the periods.
+        """
+        mask = np.ones(len(self.days), dtype=bool)
+        for period in periods:
+            mask &= self.positions(period) >= 0
+        return mask
+
+
+    def align(self, values, period, fill=np.nan):
+        """
+        Align the values of the bars to the daily prices.
+
+        Parameters
+        ----------
+        values: DataFrame, Series or np.array
+            the values of the bars, one row per bar of bars(period)
+        period: string or int
+        fill: scalar
+            the value of the days that no bar is completed, the integer values stay
+            integer if fill is an integer
+
+        Returns
+        ----------
+        values: DataFrame, Series or np.array
+            the values of the last completed bar of each day
+        """
+        positions = self.positions(period)
+        missing = positions < 0
+        data = np.asarray(values.values if isinstance(values, (pd.Series, pd.DataFrame)) else values)
+        dtype = data.dtype
+        if isinstance(fill, float) and missing.any():
+            dtype = np.result_type(dtype, np.float32)
+        if len(data) == 0:
+            data = np.full((len(positions),) + data.shape[1:], fill, dtype=dtype)
+        else:
+            data = data.take(np.maximum(positions, 0), axis=0).astype(dtype, copy=False)
+            data[missing] = fill
+
+        if isinstance(values, pd.Series):
+            return pd.Series(data, index=self.prices.index, name=values.name)
+        elif isinstance(values, pd.DataFrame):
+            return pd.DataFrame(data, index=self.prices.index, columns=values.columns)
+        return data
@@ -0,0 +1,428 @@
+import threading as th
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+
+from analysis.IndicatorCache import canonical_params, price_digest
+from utils.PriceStore import DAY_NS, to_day
+from utils.csvdata import get_fingerprint, get_trading_calendar
+
+"""
+A persistent store of the signals of the symbols, the signals are the values of the
+features of analysis.indicator_feature (1, 0, -1) and of the candlestick patterns
+(+-100, 0). A signal is saved as two bit planes, bull (value > 0) and bear (value < 0),
+with the shape (symbols, bytes): one row per symbol and one bit per day of the trading
+calendar (np.packbits). Each signal is a npz file, the index.json file records the
+symbols and the prices each row was computed from. The key of a signal contains the
+source of the prices (e.g. the daily prices of the csv files or the web data), so the
+signals of the same function on different prices are stored apart.
+
+    store = SignalStore()
+    trend = store.compute("AAPL", indfr.trend_sma, prices, {"windows": [5, 20]})
+    store.save()
+    store.count("2016-01-29", [(signal_key("CDLHANGINGMAN", source="web"), -1),
+                               (signal_key("trend_sma", {"windows": [5, 20]}), 1)])
+
+A row is read instead of computed again if it covers the requested days and the prices
+are not changed: the csv file of the symbol has the same fingerprint (see
+utils.csvdata.get_fingerprint), or the prices have the same digest as the prices the
+row was computed from. The queries on the signals of all the symbols (count, match,
+counts, symbol_counts) are the AND of the bit planes.
+"""
+
+SIGNAL_DIR = "data/signals"
+DAILY = "daily"     # the source of the daily prices of the csv files
+INDEX_FILE = "index.json"
+CALENDAR_FILE = "calendar.npy"
+
+# the number of the set bits of each byte
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+
+def signal_key(name, params=None, source=DAILY):
+    """
+    The key of the signal of a function with the params on the prices of the source,
+    e.g. daily:trend_sma{"windows": [5, 20]}.
+    """
+    key = "{}:{}".format(source, name)
+    if params is None:
+        return key
+    return key + canonical_params(params)
+
+
+def _bits(planes, positions):
+    """
+    Get the bits of the days at the positions from the packed planes (rows x bytes).
+    """
+    return (planes[..., positions >> 3] >> (7 - (positions & 7)).astype(np.uint8)) & 1
+
+
+class SignalStore(object):
+    """
+    The store of the bit-packed signals, it is thread safe.
+    """
+
+    def __init__(self, store_dir=SIGNAL_DIR, calendar=None):
+        """
+        Parameters
+        -----------
+        store_dir: string
+            the directory of the signal files
+        calendar: TradingCalendar
+            the trading days of the signals, the trading days of SPY by default
+        """
+        self.store_dir = store_dir
+        self.calendar = calendar
+        self.symbols = None
+        self.symbol_index = {}
+        self.signals = {}       # key -> {"file": name of the npz file, "rows": {symbol: record}}
+        self.planes = {}        # key -> (bull, bear)
+        self.dirty = set()
+        self.lock = th.Lock()
+
+
+    def compute(self, symbol, func, prices, params=None, key=None, source=DAILY):
+        """
+        Get the signal func(prices, params) of the symbol, it is read from the store if
+        it was computed from the same prices, otherwise it is computed and stored.
+
+        Parameters
+        ----------
+        symbol: string
+        func: function
+            a function of analysis.indicator_feature
+        prices: DataFrame or OHLCV
+        params: dict
+            the parameters of the function, the default parameters if None
+        key: string
+            the key of the signal, signal_key(func.__name__, params, source) by default
+        source: string
+            the source of the prices, DAILY for the daily prices of the csv file of the
+            symbol. The fingerprint of the csv file is used only for this source.
+
+        Returns
+        ----------
+        signal: Series
+            int8, 1 (bull), 0 or -1 (bear)
+        """
+        if key is None:
+            key = signal_key(func.__name__, params, source)
+        fingerprint = get_fingerprint(symbol) if source == DAILY else None
+        digest = price_digest(prices, len(prices.index))
+        days = prices.index.values.view(np.int64) // DAY_NS
+
+        self.lock.acquire()
+        try:
+            self.__load()
+            positions = self.calendar.positions(days)
+            record = self.signals.get(key, {}).get("rows", {}).get(symbol)
+            if record is not None and len(days) > 0 and (positions >= 0).all():
+                same = (fingerprint is not None and record["fingerprint"] == fingerprint) \
+                    or record.get("digest") == digest
+                if same and record["first"] == days[0] and record["last"] >= days[-1]:
+                    return pd.Series(self.__read(key, symbol, positions), index=prices.index)
+        finally:
+            self.lock.release()
+
+        values = func(prices) if params is None else func(prices, params)
+        values = np.sign(np.asarray(values)).astype(np.int8)
+        if len(days) > 0 and (positions >= 0).all():
+            self.put(symbol, key, days, values, fingerprint, digest)
+        return pd.Series(values, index=prices.index)
+
+
+    def put(self, symbol, key, dates, values, fingerprint=None, digest=None):
+        """
+        Store the signal of the symbol, the values of the days out of the calendar are dropped.
+
+        Parameters
+        ----------
+        symbol: string
+        key: string
+            the key of the signal, e.g. the name of a candlestick pattern
+        dates: DatetimeIndex or np.array
+            the dates, or the days since 1970-01-01 if it is an integer array
+        values: np.array
+            the values of the signal, > 0 is bull and < 0 is bear
+        fingerprint: string
+            the fingerprint of the csv file the values were computed from
+        digest: string
+            the digest of the prices the values were computed from (see
+            analysis.IndicatorCache.price_digest)
+        """
+        values = np.asarray(values)
+        self.lock.acquire()
+        try:
+            self.__load()
+            positions = self.calendar.positions(dates)
+            valid = positions >= 0
+            row = self.__row(symbol)
+            bull, bear = self.__planes(key)
+            for plane, mask in [(bull, values > 0), (bear, values < 0)]:
+                bits = np.zeros(len(self.calendar), dtype=bool)
+                bits[positions[valid]] = mask[valid]
+                plane[row] = np.packbits(bits)
+
+            days = self.calendar.days[positions[valid]]
+            self.signals[key]["rows"][symbol] = {
+                "fingerprint": fingerprint, "digest": digest, "first": int(days[0]) if len(days) > 0 else None,
+                "last": int(days[-1]) if len(days) > 0 else None}
+            self.dirty.add(key)
+        finally:
+            self.lock.release()
+
+
+    def get(self, symbol, key, start=None, end=None):
+        """
+        Get the stored signal of the symbol on the trading days in [start, end].
+
+        Returns
+        ----------
+        signal: Series
+            int8, 1 (bull), 0 or -1 (bear), None if the signal of the symbol is not stored
+        """
+        self.lock.acquire()
+        try:
+            self.__load()
+            if symbol not in self.signals.get(key, {}).get("rows", {}):
+                return None
+            days = self.calendar.range(start, end)
+            positions = np.arange(days.start, days.stop)
+            return pd.Series(self.__read(key, symbol, positions), index=self.calendar.index[days])
+        finally:
+            self.lock.release()
+
+
+    def count(self, date, conditions):
+        """
+        Count the symbols that have all the signals on the date.
+
+        Parameters
+        ----------
+        date: string
+        conditions: list
+            the (key, value) of the signals, value is 1 (bull) or -1 (bear)
+
+        Returns
+        ----------
+        count: int
+        """
+        return len(self.match(date, conditions))
+
+
+    def match(self, date, conditions):
+        """
+        Get the symbols that have all the signals on the date.
+        """
+        self.lock.acquire()
+        try:
+            self.__load()
+            position = self.calendar.positions(np.array([to_day(date)]))[0]
+            if position < 0:
+                return []
+            mask = self.__and(conditions)
+            rows = np.flatnonzero(_bits(mask, np.array([position]))[:, 0])
+            return [self.symbols[i] for i in rows]
+        finally:
+            self.lock.release()
+
+
+    def counts(self, conditions, start=None, end=None):
+        """
+        Count the symbols that have all the signals on each trading day in [start, end].
+
+        Returns
+        ----------
+        counts: Series
+            the number of symbols of each trading day
+        """
+        self.lock.acquire()
+        try:
+            self.__load()
+            days = self.calendar.range(start, end)
+            mask = self.__and(conditions)
+            counts = np.unpackbits(mask, axis=1)[:, days].sum(axis=0)
+            return pd.Series(counts, index=self.calendar.index[days])
+        finally:
+            self.lock.release()
+
+
+    def symbol_counts(self, conditions, start=None, end=None):
+        """
+        Count the trading days in [start, end] that each symbol has all the signals.
+
+        Returns
+        ----------
+        counts: Series
+            the number of days of each symbol
+        """
+        self.lock.acquire()
+        try:
+            self.__load()
+            days = self.calendar.range(start, end)
+            bits = np.zeros(len(self.calendar), dtype=bool)
+            bits[days] = True
+            mask = self.__and(conditions) & np.packbits(bits)
+            return pd.Series(POPCOUNT[mask].sum(axis=1), index=self.symbols)
+        finally:
+            self.lock.release()
+
+
+    def __and(self, conditions):
+        """
+        The AND of the planes of the conditions, one row per symbol.
+        """
+        mask = np.empty((len(self.symbols), (len(self.calendar) + 7) // 8), dtype=np.uint8)
+        mask.fill(255)
+        for key, value in conditions:
+            if value not in (1, -1):
+                raise ValueError("The value of a condition must be 1 or -1: {}".format(value))
+            if key not in self.signals:
+                mask.fill(0)
+                continue
+            bull, bear = self.__planes(key)
+            mask &= bull if value == 1 else bear
+        return mask
+
+
+    def __read(self, key, symbol, positions):
+        bull, bear = self.__planes(key)
+        row = self.symbol_index[symbol]
+        return (_bits(bull[row], positions).astype(np.int8) - _bits(bear[row], positions).astype(np.int8))
+
+
+    def __row(self, symbol):
+        if symbol not in self.symbol_index:
+            self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_index[symbol]
+
+
+    def __planes(self, key):
+        """
+        Get the (bull, bear) planes of the signal, the planes of a new signal are empty.
+        The rows of the new symbols are added.
+        """
+        if key not in self.signals:
+            filename = "{}.npz".format(hashlib.sha1(key).hexdigest())
+            self.signals[key] = {"file": filename, "rows": {}}
+
+        shape = (len(self.symbols), (len(self.calendar) + 7) // 8)
+        planes = self.planes.get(key)
+        if planes is None:
+            planes = (np.zeros(shape, dtype=np.uint8), np.zeros(shape, dtype=np.uint8))
+            path = os.path.join(self.store_dir, self.signals[key]["file"])
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    stored = (data["bull"], data["bear"])
+                # a file that has more rows or days than the index is not of this store
+                if stored[0].shape[0] <= shape[0] and stored[0].shape[1] <= shape[1]:
+                    planes = stored
+
+        if planes[0].shape != shape:
+            # the new symbols or the new days of the calendar
+            resized = []
+            for plane in planes:
+                grown = np.zeros(shape, dtype=np.uint8)
+                grown[:plane.shape[0], :plane.shape[1]] = plane
+                resized.append(grown)
+            planes = tuple(resized)
+        self.planes[key] = planes
+        return planes
+
+
+    def __load(self):
+        if self.symbols is not None:
+            return
+
+        if self.calendar is None:
+            self.calendar = get_trading_calendar()
+        self.symbols = []
+        self.symbol_index = {}
+        self.signals = {}
+
+        path = os.path.join(self.store_dir, INDEX_FILE)
+        calendar_path = os.path.join(self.store_dir, CALENDAR_FILE)
+        if not os.path.exists(path) or not os.path.exists(calendar_path):
+            return
+
+        try:
+            with open(path, "r") as f:
+                index = json.load(f)
+            days = np.load(calendar_path)
+        except (IOError, ValueError):
+            print "The index of the signal store is broken, the store is cleared."
+            self.__remove_files()
+            return
+
+        # the stored bits are valid if the calendar only has new days after them
+        if len(days) > len(self.calendar) or not (self.calendar.days[:len(days)] == days).all():
+            print "The trading calendar was changed, the signal store is cleared."
+            self.__remove_files()
+            return
+
+        self.symbols = index["symbols"]
+        self.symbol_index = dict((s, i) for i, s in enumerate(self.symbols))
+        self.signals = index["signals"]
+
+
+    def save(self):
+        """
+        Save the changed signals.
+        """
+        self.lock.acquire()
+        try:
+            if self.symbols is None:
+                return
+            if not os.path.exists(self.store_dir):
+                try:
+                    os.makedirs(self.store_dir)
+                except OSError:
+                    pass    # created by another process
+
+            for key in self.dirty:
+                bull, bear = self.__planes(key)
+                path = os.path.join(self.store_dir, self.signals[key]["file"])
+                with open(path + ".tmp", "wb") as f:
+                    np.savez(f, bull=bull, bear=bear)
+                os.rename(path + ".tmp", path)
+            self.dirty = set()
+
+            path = os.path.join(self.store_dir, CALENDAR_FILE)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, self.calendar.days)
+            os.rename(path + ".tmp", path)
+
+            path = os.path.join(self.store_dir, INDEX_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump({"symbols": self.symbols, "signals": self.signals}, f)
+            os.rename(path + ".tmp", path)
+        finally:
+            self.lock.release()
+
+
+    def __remove_files(self):
+        """
+        Remove the signal files, the index and the calendar of the store.
+        """
+        if not os.path.isdir(self.store_dir):
+            return
+        for filename in os.listdir(self.store_dir):
+            if filename.endswith(".npz") or filename in [INDEX_FILE, CALENDAR_FILE]:
+                try:
+                    os.remove(os.path.join(self.store_dir, filename))
+                except OSError:
+                    pass
+
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.__remove_files()
+            self.symbols = None
+            self.planes = {}
+            self.dirty = set()
+        finally:
+            self.lock.release()
@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 import math
 
+from analysis.resample import resample, WEEK
+
 
 def compute_daily_returns(prices):
     """
@@ -58,33 +60,18 @@ def evaluate_predict_result(test, predict):
     return rmse, corr[0, 1]
 
 
-def normalize(values):
+def normalize(values, base=None):
     """
-    Normalize the values.
+    Normalize the values by the base, the first value by default.
     """
-    return (values - values[0]) / values[0]
+    if base is None:
+        base = values[0]
+    return (values - base) / base
 
 
 def daily_prices_to_weekly_prices(prices):
-    data = []
-    new_indices = []
-    indices = prices.index
-
-    start_ind = 0
-    pre_week = indices[0].isocalendar()[1]
-    for i in range(1, len(prices.index)):
-        week = indices[i].isocalendar()[1]
-        if week == pre_week:
-            continue
-        week_prices = prices.iloc[start_ind:i]
-        new_indices.append(indices[i-1])
-        data.append([week_prices["Open"][0],        # open
-                    np.max(week_prices["High"]),    # high
-                    np.min(week_prices["Low"]),     # low
-                    week_prices["Close"][-1],       # close
-                    np.sum(week_prices["Volume"])]) # volume
-        start_ind = i
-        pre_week = week
-
-    df = pd.DataFrame(data, columns=["Open", "High", "Low", "Close", "Volume"], index=new_indices)
-    return df
\ No newline at end of file
+    """
+    Convert the daily prices to the weekly prices, the last week is dropped (it may be
+    incomplete). The index is the last trading day of each week, see analysis.resample.
+    """
+    return resample(prices, WEEK, drop_last=True)
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import talib
 
+from utils.OHLCV import price_field
+
 PATTERNS = {
     "CDL2CROWS" : {"name" : "Two Crows", "signal_type": "bearish", "candles": 2},
     "CDL3BLACKCROWS" : {"name" : "Three Black Crows", "signal_type": "bearish", "candles": 3},
@@ -166,10 +168,10 @@ def analyze_pattern(pattern_name, open, high, low, close):
 
 def candlestick_patterns(prices, pattern_names=[]):
     signals = pd.DataFrame(index=prices.index)
-    open = prices["Open"].values
-    high = prices["High"].values
-    low = prices["Low"].values
-    close = prices["Close"].values
+    open = price_field(prices, "Open")
+    high = price_field(prices, "High")
+    low = price_field(prices, "Low")
+    close = price_field(prices, "Close")
 
     for name in pattern_names:
         result = analyze_pattern(name, open, high, low, close)
@@ -180,15 +182,15 @@ def candlestick_patterns(prices, pattern_names=[]):
 
 
 def fractals(prices):
-    length = len(prices.index)
+    length = len(prices)
     frac = pd.Series(np.zeros(length), index=prices.index)
     breakout = pd.Series(np.zeros(length), index=prices.index)
     if length < 5:
         return frac, breakout
 
-    high = prices["High"]
-    low = prices["Low"]
-    close = prices["Close"]
+    high = price_field(prices, "High")
+    low = price_field(prices, "Low")
+    close = price_field(prices, "Close")
     pre_up = -1
     pre_down = -1
     for i in range(2, length - 2):
@@ -0,0 +1,144 @@
+import pandas as pd
+import numpy as np
+
+import analysis.indicator_feature as indfr
+from analysis.IndicatorCache import indicator_cache
+
+"""
+Compute a list of the features of analysis.indicator_feature into one int8 matrix,
+one row per date and one column per feature, the values are 1 (bull), 0 and -1 (bear).
+
+    features = [("trend_adx", {"window": 14, "threshold": 20}), ("reverse_kdj_cross", {"thresholds": [30, 70]})]
+    matrix = feature_matrix(prices, features, "AAPL")
+    bull = (matrix == 1).all(axis=1)
+"""
+
+
+def feature_names(features):
+    """
+    Get the names of the columns of the feature matrix.
+    """
+    return [f[0] for f in features]
+
+
+class FeatureRow(object):
+    """
+    The features of one date, a row of the feature matrix. A feature is read by its
+    position or by its name (the first feature of the name):
+
+        row[0] == 1 or row["trend_adx"] == 1
+    """
+    __slots__ = ["values", "positions"]
+
+    def __init__(self, values, positions):
+        """
+        Parameters
+        -----------
+        values: np.array
+            int8, the row of the feature matrix
+        positions: dict
+            the name of a feature -> its column, see feature_positions
+        """
+        self.values = values
+        self.positions = positions
+
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            key = self.positions[key]
+        return self.values[key]
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+    def __repr__(self):
+        names = sorted(self.positions, key=self.positions.get)
+        return "FeatureRow({})".format(", ".join("{}={}".format(n, self.values[self.positions[n]]) for n in names))
+
+
+def feature_positions(features):
+    """
+    Get the column of each feature name, the first column if a name is repeated.
+    """
+    positions = {}
+    for i, name in enumerate(feature_names(features)):
+        positions.setdefault(name, i)
+    return positions
+
+
+def feature_matrix(prices, features, symbol=None, store=None):
+    """
+    Compute the features of a symbol.
+
+    Parameters
+    ----------
+    prices: DataFrame or OHLCV
+    features: list
+        the (function name, params) of the features, params is None for the default parameters
+    symbol: string
+        the symbol of the prices, the features are cached in analysis.IndicatorCache if
+        it is not None
+    store: SignalStore
+        read the features of the symbol from the signal store instead of the indicator
+        cache, see analysis.SignalStore
+
+    Returns
+    ----------
+    matrix: np.array
+        int8 with the shape (dates, features)
+    """
+    matrix = np.zeros((len(prices.index), len(features)), dtype=np.int8)
+    for i, (name, params) in enumerate(features):
+        func = getattr(indfr, name)
+        if symbol is not None and store is not None:
+            values = store.compute(symbol, func, prices, params)
+        elif symbol is not None:
+            values = indicator_cache.compute(symbol, func, prices, params)
+        else:
+            values = func(prices) if params is None else func(prices, params)
+        matrix[:, i] = values.values
+    return matrix
+
+
+def feature_frame(prices, features, symbol=None):
+    """
+    Get the feature matrix as a DataFrame, the columns are the names of the features.
+    """
+    matrix = feature_matrix(prices, features, symbol)
+    return pd.DataFrame(matrix, index=prices.index, columns=feature_names(features))
+
+
+def panel_feature_matrix(panel, features):
+    """
+    Compute the features of the symbols of a PricePanel, the features of a symbol are
+    computed on its trading days (the days that its close price is not NaN), they are
+    0 on the other days.
+
+    Parameters
+    ----------
+    panel: PricePanel
+        it contains the fields that the features need
+    features: list
+        the (function name, params) of the features
+
+    Returns
+    ----------
+    matrix: np.array
+        int8 with the shape (symbols, days, features)
+    """
+    matrix = np.zeros((len(panel.symbols), len(panel.days), len(features)), dtype=np.int8)
+    close = panel.field("Close")
+    for i in range(len(panel.symbols)):
+        valid = ~np.isnan(close[i])
+        if not valid.any():
+            continue
+        prices = pd.DataFrame(np.asarray(panel.values[i][valid], dtype=np.float64),
+                              index=panel.dates[valid], columns=panel.fields)
+        matrix[i, valid] = feature_matrix(prices, features)
+    return matrix
@@ -6,6 +6,55 @@ import pandas as pd
 
 from indicators import sma, ema, macd, kdj, cci, adx, stoch, trix
 
+
+def __previous(values):
+    """
+    The values of the previous rows, the previous row of the first row is the last row
+    (the same as values[i - 1] of a loop from 0).
+    """
+    return np.roll(values, 1)
+
+
+def __signal(prices, bull, bear, valid=None):
+    """
+    Combine the masks into the feature values, bull wins if both masks are set, the
+    rows out of valid are 0.
+    """
+    data = np.where(bull, 1.0, np.where(bear, -1.0, 0.0))
+    if valid is not None:
+        data[~valid] = 0
+    return pd.Series(data, index=prices.index)
+
+
+def __after_first(values):
+    """
+    The mask of the rows after the first row.
+    """
+    return np.arange(len(values)) > 0
+
+
+def __trend(prices, fast, slow):
+    """
+    bull if fast > slow, bear otherwise, 0 if slow is NaN.
+    """
+    fast, slow = np.asarray(fast), np.asarray(slow)
+    with np.errstate(invalid='ignore'):
+        bull = fast > slow
+    return __signal(prices, bull, ~bull, ~np.isnan(slow))
+
+
+def __cross(prices, fast, slow):
+    """
+    bull if fast crosses above slow, bear if fast crosses below slow, 0 if slow is NaN.
+    """
+    fast, slow = np.asarray(fast), np.asarray(slow)
+    pre_fast, pre_slow = __previous(fast), __previous(slow)
+    with np.errstate(invalid='ignore'):
+        bull = (fast > slow) & (pre_fast <= pre_slow)
+        bear = (fast < slow) & (pre_fast >= pre_slow)
+    return __signal(prices, bull, bear, ~np.isnan(slow))
+
+
 """
 Trend Feature: it shows the current trend of the symbol.
     1: bull trend
@@ -22,38 +71,12 @@ def trend_sma(prices, params):
         2. bear trend if fast <= slow
     """
     sma_val = sma(prices, params=params)
-    fast = sma_val.ix[:,0]
-    slow = sma_val.ix[:,1]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(fast)):
-        if np.isnan(slow[i]):
-            continue
-
-        if fast[i] > slow[i]:
-            data[i] = 1
-        else:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    return __trend(prices, sma_val.ix[:,0], sma_val.ix[:,1])
 
 
 def trend_ema(prices, params):
     ema_val = ema(prices, params=params)
-    fast = ema_val.ix[:,0]
-    slow = ema_val.ix[:,1]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(fast)):
-        if np.isnan(slow[i]):
-            continue
-
-        if fast[i] > slow[i]:
-            data[i] = 1
-        else:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    return __trend(prices, ema_val.ix[:,0], ema_val.ix[:,1])
 
 
 def trend_macd_zero_line(prices, params=None):
@@ -66,16 +89,9 @@ def trend_macd_zero_line(prices, params=None):
         3. otherwise, unknown
     """
     macd_val = macd(prices)
-    diff = macd_val["DIFF"]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(prices.index)):
-        if diff[i] > 0:
-            data[i] = 1
-        elif diff[i] < 0:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    diff = np.asarray(macd_val["DIFF"])
+    with np.errstate(invalid='ignore'):
+        return __signal(prices, diff > 0, diff < 0)
 
 
 def trend_adx(prices, params={"window": 14, "threshold": 20}):
@@ -86,41 +102,25 @@ def trend_adx(prices, params={"window": 14, "threshold": 20}):
         3. otherwise, weak trend or no trend
     """
     adx_val = adx(prices, params)
-    pdi = adx_val["+DI"]
-    mdi = adx_val["-DI"]
-    adx_val = adx_val["ADX"]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(prices.index)):
-        if np.isnan(adx_val[i]) or np.isnan(pdi[i]) or np.isnan(mdi[i]):
-            continue
+    pdi = np.asarray(adx_val["+DI"])
+    mdi = np.asarray(adx_val["-DI"])
+    adx_val = np.asarray(adx_val["ADX"])
+    valid = ~(np.isnan(adx_val) | np.isnan(pdi) | np.isnan(mdi))
 
-        if adx_val[i] > params["threshold"]:
-            if pdi[i] > mdi[i]:
-                data[i] = 1
-            else:
-                data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    with np.errstate(invalid='ignore'):
+        strong = adx_val > params["threshold"]
+        bull = pdi > mdi
+    return __signal(prices, strong & bull, strong & ~bull, valid)
 
 
 def trend_stoch(prices, params={"windows": [14, 3, 3]}):
     stoch_val = stoch(prices, params)
 
-    k = stoch_val["K"]
-    d = stoch_val["D"]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(prices.index)):
-        if np.isnan(k[i]) or np.isnan(d[i]):
-            continue
-
-        if k[i] > d[i]:
-            data[i] = 1
-        else:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    k = np.asarray(stoch_val["K"])
+    d = np.asarray(stoch_val["D"])
+    with np.errstate(invalid='ignore'):
+        bull = k > d
+    return __signal(prices, bull, ~bull, ~(np.isnan(k) | np.isnan(d)))
 
 
 """
@@ -136,19 +136,13 @@ def reverse_kdj_over_sell_buy(prices, params={"thresholds": [0, 100]}):
     else:
         kdj_val = kdj(prices, params)
     thresholds = params["thresholds"]
-    data = np.zeros(len(prices.index))
-    j_val = kdj_val["J"]
-
-    for i in range(len(prices.index)):
-        if np.isnan(j_val[i]):
-            continue
+    j_val = np.asarray(kdj_val["J"])
+    pre_j = __previous(j_val)
 
-        if j_val[i - 1] < thresholds[0] and j_val[i] > thresholds[0]:
-            data[i] = 1
-        elif j_val[i - 1] > thresholds[1] and j_val[i] < thresholds[1]:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    with np.errstate(invalid='ignore'):
+        bull = (pre_j < thresholds[0]) & (j_val > thresholds[0])
+        bear = (pre_j > thresholds[1]) & (j_val < thresholds[1])
+    return __signal(prices, bull, bear, ~np.isnan(j_val))
 
 
 def reverse_kdj_cross(prices, params={"thresholds": [30, 70]}):
@@ -157,17 +151,14 @@ def reverse_kdj_cross(prices, params={"thresholds": [30, 70]}):
     else:
         kdj_val = kdj(prices, params)
     thresholds = params["thresholds"]
-    data = np.zeros(len(prices.index))
-    k_val = kdj_val["K"]
-    d_val = kdj_val["D"]
+    k_val = np.asarray(kdj_val["K"])
+    d_val = np.asarray(kdj_val["D"])
+    pre_k, pre_d = __previous(k_val), __previous(d_val)
 
-    for i in range(len(prices.index)):
-        if k_val[i - 1] < d_val[i - 1] and k_val[i] >= d_val[i] and k_val[i] < thresholds[0]:
-            data[i] = 1
-        elif k_val[i - 1] > d_val[i - 1] and k_val[i] <= d_val[i] and k_val[i] > thresholds[1]:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    with np.errstate(invalid='ignore'):
+        bull = (pre_k < pre_d) & (k_val >= d_val) & (k_val < thresholds[0])
+        bear = (pre_k > pre_d) & (k_val <= d_val) & (k_val > thresholds[1])
+    return __signal(prices, bull, bear)
 
 
 def reverse_sma_cross(prices, params):
@@ -180,72 +171,37 @@ def reverse_sma_cross(prices, params):
         2. bear trend if fast crosses slow and fast < slow
     """
     sma_val = sma(prices, params=params)
-    fast = sma_val.ix[:,0]
-    slow = sma_val.ix[:,1]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(fast)):
-        if np.isnan(slow[i]):
-            continue
-
-        if fast[i] > slow[i] and fast[i-1] <= slow[i-1]:
-            data[i] = 1
-        elif fast[i] < slow[i] and fast[i-1] >= slow[i-1]:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    return __cross(prices, sma_val.ix[:,0], sma_val.ix[:,1])
 
 
 def reverse_ema_cross(prices, params):
     ema_val = ema(prices, params=params)
-    fast = ema_val.ix[:,0]
-    slow = ema_val.ix[:,1]
-    data = np.zeros(len(prices.index))
-
-    for i in range(len(fast)):
-        if np.isnan(slow[i]):
-            continue
-
-        if fast[i] > slow[i] and fast[i-1] <= slow[i-1]:
-            data[i] = 1
-        elif fast[i] < slow[i] and fast[i-1] >= slow[i-1]:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    return __cross(prices, ema_val.ix[:,0], ema_val.ix[:,1])
 
 
-def reverse_cci_over_sell_buy(prices, params=None):
+def __reverse_cci(prices, params, bull_line, bear_line):
+    """
+    bull if cci crosses above bull_line, bear if cci crosses below bear_line.
+    """
     if params is None:
         cci_val = cci(prices)
     else:
         cci_val = cci(prices, params)
-    cci_val = cci_val["CCI"]
-    data = np.zeros(len(prices.index))
+    cci_val = np.asarray(cci_val["CCI"])
+    pre_cci = __previous(cci_val)
 
-    for i in range(1, len(prices.index)):
-        if cci_val[i - 1] < -200 and cci_val[i] > -200:
-            data[i] = 1
-        elif cci_val[i - 1] > 200 and cci_val[i] < 200:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
+    with np.errstate(invalid='ignore'):
+        bull = (pre_cci < bull_line) & (cci_val > bull_line)
+        bear = (pre_cci > bear_line) & (cci_val < bear_line)
+    return __signal(prices, bull, bear, __after_first(cci_val))
 
 
-def reverse_cci_cross(prices, params=None):
-    if params is None:
-        cci_val = cci(prices)
-    else:
-        cci_val = cci(prices, params)
-    cci_val = cci_val["CCI"]
-    data = np.zeros(len(prices.index))
+def reverse_cci_over_sell_buy(prices, params=None):
+    return __reverse_cci(prices, params, -200, 200)
 
-    for i in range(1, len(prices.index)):
-        if cci_val[i - 1] < 100 and cci_val[i] > 100:
-            data[i] = 1
-        elif cci_val[i - 1] > -100 and cci_val[i] < -100:
-            data[i] = -1
 
-    return pd.Series(data, index=prices.index)
+def reverse_cci_cross(prices, params=None):
+    return __reverse_cci(prices, params, 100, -100)
 
 
 def reverse_trix_cross(prices, params=None):
@@ -253,14 +209,11 @@ def reverse_trix_cross(prices, params=None):
         values = trix(prices)
     else:
         values = trix(prices, params)
-    trix_val = values["TRIX"]
-    ma = values["MATRIX"]
-    data = np.zeros(len(prices.index))
-
-    for i in range(1, len(prices.index)):
-        if trix_val[i - 1] < ma[i-1] and trix_val[i] > ma[i]:
-            data[i] = 1
-        elif trix_val[i - 1] >= ma[i-1] and trix_val[i] <= ma[i]:
-            data[i] = -1
-
-    return pd.Series(data, index=prices.index)
\ No newline at end of file
+    trix_val = np.asarray(values["TRIX"])
+    ma = np.asarray(values["MATRIX"])
+    pre_trix, pre_ma = __previous(trix_val), __previous(ma)
+
+    with np.errstate(invalid='ignore'):
+        bull = (pre_trix < pre_ma) & (trix_val > ma)
+        bear = (pre_trix >= pre_ma) & (trix_val <= ma)
+    return __signal(prices, bull, bear, __after_first(trix_val))
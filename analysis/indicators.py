@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
 
-from analysis.basic import compute_daily_returns
+from utils.OHLCV import price_field
+from analysis import kernels
 import math
 
 def sma(prices, params):
@@ -10,7 +11,7 @@ def sma(prices, params):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
     params: dict
             e.g. {"windows": [5, 10]}
 
@@ -20,7 +21,7 @@ def sma(prices, params):
         the simple moving average of the close price.
     """
     windows = params["windows"]
-    close = prices["Close"].values
+    close = price_field(prices, "Close")
     values = []
     column_names = []
 
@@ -43,7 +44,7 @@ def ema(prices, params):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
     params: dict
             e.g. {"windows": [5, 10]}
 
@@ -53,7 +54,7 @@ def ema(prices, params):
         the simple moving average of the close price.
     """
     windows = params["windows"]
-    close = prices["Close"].values
+    close = price_field(prices, "Close")
     values = []
     column_names = []
 
@@ -65,13 +66,60 @@ def ema(prices, params):
     return pd.DataFrame(np.column_stack(tuple(values)), index=prices.index, columns=column_names)
 
 
+def sma_sweep(prices, params):
+    """
+    The simple moving averages of many windows at once, see kernels.sma_sweep. The
+    values are the values of sma within the floating point rounding, but not bit for
+    bit: the ties of two averages may come out on the other side, so the features
+    use sma.
+
+    Parameters
+    ----------
+    prices: DataFrame or OHLCV
+    params: dict
+            e.g. {"windows": [5, 10, 20, 60]}
+
+    Returns
+    ----------
+    sma_val : DataFrame
+        the columns are the same as sma
+    """
+    windows = params["windows"]
+    close = price_field(prices, "Close")
+    column_names = ["SMA{}".format(w) for w in windows]
+    return pd.DataFrame(kernels.sma_sweep(close, windows).T, index=prices.index, columns=column_names)
+
+
+def ema_sweep(prices, params):
+    """
+    The exponential moving averages of many windows at once, see kernels.ema_sweep.
+    The values are the values of ema within the floating point rounding, the same
+    as sma_sweep.
+
+    Parameters
+    ----------
+    prices: DataFrame or OHLCV
+    params: dict
+            e.g. {"windows": [5, 10, 20, 60]}
+
+    Returns
+    ----------
+    ema_val : DataFrame
+        the columns are the same as ema
+    """
+    windows = params["windows"]
+    close = price_field(prices, "Close")
+    column_names = ["EMA{}".format(w) for w in windows]
+    return pd.DataFrame(kernels.ema_sweep(close, windows).T, index=prices.index, columns=column_names)
+
+
 def bb(prices, params={"window": 20}):
     """
     Calculate the bollinger bands indicator
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
     params: dict
 
     Returns
@@ -80,7 +128,7 @@ def bb(prices, params={"window": 20}):
     """
     window = params["window"]
 
-    close = prices["Close"].values
+    close = price_field(prices, "Close")
     rm = pd.rolling_mean(close, window)   # 20 day mean
     rstd = pd.rolling_std(close, window)  # 20 day standard deviation
     upper_band = rm + (rstd * 2)
@@ -95,14 +143,14 @@ def macd(prices, params={"windows": [12, 26, 9]}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
     params: dict
 
     Returns
     ----------
     macd_val: DataFrame
     """
-    close = prices["Close"]
+    close = price_field(prices, "Close")
     windows = params["windows"]
 
     ema12 = __ema(close, windows[0])
@@ -121,7 +169,7 @@ def rsi(prices, params={"window": 14}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
     params: dict
 
     Returns
@@ -129,28 +177,33 @@ def rsi(prices, params={"window": 14}):
     rsi_val: DataFrame
     """
     window = params["window"]
-    close = prices["Close"]
+    close = price_field(prices, "Close")
 
-    delta = close - close.shift(1)  # the difference between rows
+    delta = __delta(close)  # the difference between rows
     gain = delta.copy()
     lose = delta.copy()
-    gain[gain < 0] = 0
-    lose[lose > 0] = 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gain[gain < 0] = 0
+        lose[lose > 0] = 0
 
-    rs = pd.rolling_mean(gain, window) / abs(pd.rolling_mean(lose, window))
-    rsi_val = 100 - 100 / (1 + rs)
-    return pd.DataFrame(rsi_val.values, index=prices.index, columns=["RSI"])
+        rs = pd.rolling_mean(gain, window) / abs(pd.rolling_mean(lose, window))
+        rsi_val = 100 - 100 / (1 + rs)
+    return pd.DataFrame(rsi_val, index=prices.index, columns=["RSI"])
 
 
-def __mfm(prices):
-    mfm = ((prices['Close'] - prices['Low']) - (prices['High'] - prices['Close'])) \
-          /(prices['High'] - prices['Low'])
-    return mfm
+def __delta(values):
+    """
+    The difference between rows, the first value is NaN.
+    """
+    delta = np.empty(len(values))
+    delta[0:1] = np.nan
+    delta[1:] = values[1:] - values[:-1]
+    return delta
 
 
 def __mfv(prices):
-    mfm = __mfm(prices)
-    return mfm * prices['Volume']
+    return kernels.money_flow_volume(price_field(prices, "Close"), price_field(prices, "High"),
+                                     price_field(prices, "Low"), price_field(prices, "Volume"))
 
 
 def cmf(prices, params={"window": 20}):
@@ -161,7 +214,7 @@ def cmf(prices, params={"window": 20}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -172,14 +225,15 @@ def cmf(prices, params={"window": 20}):
     window = params["window"]
     mfv = __mfv(prices)
     mfv = pd.rolling_sum(mfv, window)
-    volumes = pd.rolling_sum(prices['Volume'], window)
-    cmf_val = (mfv/volumes)
+    volumes = pd.rolling_sum(price_field(prices, "Volume"), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cmf_val = (mfv/volumes)
 
-    return pd.DataFrame(cmf_val.values, index=prices.index, columns=["CMF"])
+    return pd.DataFrame(cmf_val, index=prices.index, columns=["CMF"])
 
 
 def __tp(prices):
-    return (prices['High'] + prices['Low'] + prices['Close']) / 3.0
+    return (price_field(prices, "High") + price_field(prices, "Low") + price_field(prices, "Close")) / 3.0
 
 
 def mfi(prices, params={"window": 14}):
@@ -191,7 +245,7 @@ def mfi(prices, params={"window": 14}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -201,35 +255,24 @@ def mfi(prices, params={"window": 14}):
     """
     window = params["window"]
     tp = __tp(prices)
-    rmf = tp * prices['Volume']
-    close = prices["Close"]
-    ret = close - close.shift(1)
+    rmf = tp * price_field(prices, "Volume")
+    close = price_field(prices, "Close")
+    ret = __delta(close)
     prmf = rmf.copy()
     nrmf = rmf.copy()
-    prmf[ret < 0] = 0
-    nrmf[ret > 0] = 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prmf[ret < 0] = 0
+        nrmf[ret > 0] = 0
 
-    mfr = pd.rolling_sum(prmf, window)/pd.rolling_sum(nrmf, window)
-    mfi_val = 100 - 100. / (1 + mfr)
+        mfr = pd.rolling_sum(prmf, window)/pd.rolling_sum(nrmf, window)
+        mfi_val = 100 - 100. / (1 + mfr)
 
-    return pd.DataFrame(mfi_val.values, index=prices.index, columns=["MFI"])
+    return pd.DataFrame(mfi_val, index=prices.index, columns=["MFI"])
 
 
 def __rsv(prices, window):
-    close = prices["Close"]
-    high = prices["High"]
-    low = prices["Low"]
-    length = len(prices.index)
-
-    rsv_val = np.zeros(length)
-    rsv_val[0:window-1] = np.nan
-
-    for i in range(window-1, length):
-        hn = high[i-window+1:i+1].max()
-        ln = low[i-window+1:i+1].min()
-        rsv_val[i] = (close[i] - ln) * 100.0 / (hn - ln)
-
-    return rsv_val
+    return kernels.rsv(price_field(prices, "Close"), price_field(prices, "High"),
+                       price_field(prices, "Low"), window)
 
 
 def kdj(prices, params={"windows": [9, 3, 3]}):
@@ -242,7 +285,7 @@ def kdj(prices, params={"windows": [9, 3, 3]}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -268,7 +311,7 @@ def stoch(prices, params={"windows": [14, 3, 3]}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -284,55 +327,6 @@ def stoch(prices, params={"windows": [14, 3, 3]}):
 
     return pd.DataFrame(stoch_val, index=prices.index, columns=["K", "D"])
 
-def __tr(prices):
-    """
-    TR is defined as the greatest of the following:
-    Method 1: Current High less the current Low
-    Method 2: Current High less the previous Close (absolute value)
-    Method 3: Current Low less the previous Close (absolute value)
-    """
-    m1 = prices['High'] - prices['Low']
-    m2 = abs(prices['High'] - prices['Close'].shift(1))
-    m3 = abs(prices['Low'] - prices['Close'].shift(1))
-
-    tr = pd.concat([m1, m2, m3], axis=1).max(axis=1)
-    tr[0] = np.nan
-    return tr
-
-
-def __wilder_smooth_1(values, window):
-    """
-    First TR14 = Sum of first 14 periods of TR1
-    Second TR14 = First TR14 - (First TR14/14) + Current TR1
-    Subsequent Values = Prior TR14 - (Prior TR14/14) + Current TR1
-    """
-    length = len(values.index)
-    smooth_val = pd.Series(np.zeros(length), index=values.index)
-    smooth_val[0:window] = np.nan
-    smooth_val[window] = np.sum(values[1:window+1].values)
-
-    for i in range(window + 1, length):
-        smooth_val[i] = (smooth_val[i-1] * (1 - 1.0 / window)) + values[i]
-    return smooth_val
-
-
-def __wilder_smooth_2(values, window):
-    """
-    First ADX14 = 14 period Average of DX
-    Second ADX14 = ((First ADX14 x 13) + Current DX Value)/14
-    Subsequent ADX14 = ((Prior ADX14 x 13) + Current DX Value)/14
-    """
-    start = window
-    length = len(values.index)
-    smooth_val = pd.Series(np.zeros(length), index=values.index)
-    smooth_val[0:start + window - 1] = np.nan
-    smooth_val[start + window - 1] = np.mean(values[start: start + window].values)
-
-    for i in range(start + window, length):
-        smooth_val[i] = (smooth_val[i-1] * (window - 1) + values[i]) / window
-    return smooth_val
-
-
 def atr(prices, params={"window":14}):
     """
     Current ATR = [(Prior ATR x 13) + Current TR] / 14
@@ -340,7 +334,7 @@ def atr(prices, params={"window":14}):
 
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -348,22 +342,17 @@ def atr(prices, params={"window":14}):
     ----------
     atr_val: DataFrame
     """
-    tr = __tr(prices)
     window = params["window"]
-    length = len(prices.index)
-    atr_val = pd.Series(np.zeros(length), index=prices.index)
-    atr_val[1] = tr[1]
-
-    for i in range(2, length):
-        atr_val[i] = (atr_val[i-1] * (window - 1) + tr[i]) / window
-    return pd.DataFrame(atr_val.values, index=prices.index, columns=["ATR"])
+    atr_val = kernels.atr(price_field(prices, "High"), price_field(prices, "Low"),
+                          price_field(prices, "Close"), window)
+    return pd.DataFrame(atr_val, index=prices.index, columns=["ATR"])
 
 
 def adx(prices, params={"window":14}):
     """
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -373,34 +362,8 @@ def adx(prices, params={"window":14}):
         the DataFrame has three columns: ADX, +DI, -DI
     """
     window = params["window"]
-    tr = __tr(prices)
-    high = prices["High"]
-    low = prices["Low"]
-    length = len(prices.index)
-    pdm = pd.Series(np.zeros(length), index=prices.index)
-    mdm = pd.Series(np.zeros(length), index=prices.index)
-    pdm[0] = np.nan
-    mdm[0] = np.nan
-
-    for i in range(1, length):
-        up = high[i] - high[i-1]
-        down = low[i-1] - low[i]
-
-        if up > down and up > 0:
-            pdm[i] = up
-
-        if down > up and down > 0:
-            mdm[i] = down
-
-    str = __wilder_smooth_1(tr, window)
-    spdm = __wilder_smooth_1(pdm, window)
-    smdm = __wilder_smooth_1(mdm, window)
-    # green line
-    pdi = spdm / str * 100
-    # red line
-    mdi = smdm / str * 100
-    dx = abs(pdi - mdi) / (pdi + mdi) * 100
-    adx_val = __wilder_smooth_2(dx, window)
+    adx_val, pdi, mdi = kernels.adx(price_field(prices, "High"), price_field(prices, "Low"),
+                                    price_field(prices, "Close"), window)
     values = np.column_stack((adx_val, pdi, mdi))
     return pd.DataFrame(values, index=prices.index, columns=["ADX", "+DI", "-DI"])
 
@@ -409,7 +372,7 @@ def cci(prices, params={"window":20}):
     """
     Parameters
     ----------
-    prices: DataFrame
+    prices: DataFrame or OHLCV
         Includes the open, close, high, low and volume.
     params: dict
 
@@ -417,37 +380,15 @@ def cci(prices, params={"window":20}):
     ----------
     cci_val: DataFrame
     """
-    length = len(prices.index)
     window = params["window"]
-
-    tp = __tp(prices)
-    stp = pd.rolling_mean(tp, window)
-    cci_val = pd.Series(np.zeros(length), index=prices.index)
-    cci_val[0:window-1] = np.nan
-
-    for i in range(window-1, length):
-        dev = np.sum(abs(stp[i] - tp[i-window+1:i+1])) / window
-        cci_val[i] = (tp[i]  -  stp[i]) / (0.015 * dev)
-
-    return pd.DataFrame(cci_val.values, index=prices.index, columns=["CCI"])
+    cci_val = kernels.cci(price_field(prices, "Close"), price_field(prices, "High"),
+                          price_field(prices, "Low"), window)
+    return pd.DataFrame(cci_val, index=prices.index, columns=["CCI"])
 
 
 def obv(prices, params=None):
-    length = len(prices.index)
-    close = prices["Close"]
-    volume = prices["Volume"]
-    obv_val = pd.Series(np.zeros(length), index=prices.index)
-    obv_val[0] = volume[0]
-
-    for i in range(1, length):
-        if close[i] > close[i-1]:
-            obv_val[i] = obv_val[i-1] + volume[i]
-        elif close[i] < close[i-1]:
-            obv_val[i] = obv_val[i-1] - volume[i]
-        else:
-            obv_val[i] = obv_val[i-1]
-
-    return pd.DataFrame(obv_val.values, index=prices.index, columns=["OBV"])
+    obv_val = kernels.obv(price_field(prices, "Close"), price_field(prices, "Volume"))
+    return pd.DataFrame(obv_val, index=prices.index, columns=["OBV"])
 
 
 def adl(prices, params=None):
@@ -456,22 +397,16 @@ def adl(prices, params=None):
     2. Money Flow Volume = Money Flow Multiplier x Volume for the Period
     3. ADL = Previous ADL + Current Period's Money Flow Volume
     """
-    length = len(prices.index)
-    mfv = __mfv(prices)
-    adl_val = pd.Series(np.zeros(length), index=prices.index)
-    adl_val[0] = mfv[0]
-
-    for i in range(1, length):
-        adl_val[i] = adl_val[i-1] + mfv[i]
-
-    return pd.DataFrame(adl_val.values, index=prices.index, columns=["ADL"])
+    adl_val = kernels.adl(price_field(prices, "Close"), price_field(prices, "High"),
+                          price_field(prices, "Low"), price_field(prices, "Volume"))
+    return pd.DataFrame(adl_val, index=prices.index, columns=["ADL"])
 
 
 def trix(prices, params={"windows": [15, 9]}):
     windows = params["windows"]
-    raw = __ema(prices["Close"], windows[0])
+    raw = __ema(price_field(prices, "Close"), windows[0])
     tr = __ema(__ema(raw, windows[0]), windows[0])
-    shift_tr = tr.shift(1)
+    shift_tr = kernels.shift(tr)
     trix_val = (tr - shift_tr) / shift_tr * 100
     matrix = pd.rolling_mean(trix_val, windows[1])
 
@@ -488,10 +423,126 @@ def mafe(prices, params={"window": 5}):
     It is better to read this indicator with volume.
     """
     window = params["window"]
-    ret = compute_daily_returns(prices["Close"])
-    rmf = __tp(prices) * prices['Volume']
-    values = ret / rmf
-    mean = math.fabs(np.mean(values))
-    ma = pd.rolling_mean(values / mean, window)
+    close = price_field(prices, "Close")
+    ret = close / kernels.shift(close) - 1
+    ret[0:1] = 0
+    rmf = __tp(prices) * price_field(prices, "Volume")
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = ret / rmf
+        mean = math.fabs(np.nanmean(values))
+        ma = pd.rolling_mean(values / mean, window)
+
+    return pd.DataFrame(ma, index=prices.index, columns=["MAFE"])
+
+# the relative error of an exponential smoothing that is started without the
+# earlier history, it bounds the warm-up of the recursive indicators
+SMOOTH_TOLERANCE = 1e-8
+
+
+def __decay_length(factor):
+    """
+    The number of rows that the weight of the earlier history decays below SMOOTH_TOLERANCE.
+    """
+    return int(math.ceil(math.log(SMOOTH_TOLERANCE) / math.log(factor)))
+
+
+def __ema_warmup(window):
+    return window - 1 + __decay_length(1 - 2.0 / (window + 1))
+
+
+def __wilder_warmup(window):
+    return __decay_length(1 - 1.0 / window)
+
+
+# indicator name -> function of the params that returns the number of rows before
+# the first row that has a valid value. The cumulative indicators depend on the
+# whole history, their warm-up is None.
+WARMUP = {
+    "sma": lambda p: max(p["windows"]) - 1,
+    "ema": lambda p: __ema_warmup(max(p["windows"])),
+    "sma_sweep": lambda p: max(p["windows"]) - 1,
+    "ema_sweep": lambda p: __ema_warmup(max(p["windows"])),
+    "bb": lambda p: p["window"] - 1,
+    "macd": lambda p: __ema_warmup(max(p["windows"][:2])) + __ema_warmup(p["windows"][2]),
+    "rsi": lambda p: p["window"],
+    "cmf": lambda p: p["window"] - 1,
+    "mfi": lambda p: p["window"],
+    "kdj": lambda p: sum(p["windows"]) - 3,
+    "stoch": lambda p: sum(p["windows"]) - 3,
+    "atr": lambda p: 1 + __wilder_warmup(p["window"]),
+    "adx": lambda p: 2 * p["window"] + 2 * __wilder_warmup(p["window"]),
+    "cci": lambda p: p["window"] - 1,
+    "trix": lambda p: 3 * __ema_warmup(p["windows"][0]) + p["windows"][1],
+    "obv": None,
+    "adl": None,
+    "mafe": None,
+}
+
+
+def default_params(name):
+    """
+    Get the default parameters of the indicator function.
+
+    Parameters
+    ----------
+    name: string
+        the name of the indicator function
 
-    return pd.DataFrame(ma, index=prices.index, columns=["MAFE"])
\ No newline at end of file
+    Returns
+    ----------
+    params: dict
+        None for the functions without parameters (e.g. obv), ValueError is raised
+        for the functions that have no default parameters (sma and ema)
+    """
+    defaults = globals()[name].__defaults__
+    if not defaults:
+        raise ValueError("params are required for {}".format(name))
+    return defaults[0]
+
+
+def warmup(name, params=None):
+    """
+    Get the number of rows of history that the indicator needs before the first row of
+    a range, so that the values in the range are the same as the values computed from
+    the whole history (within SMOOTH_TOLERANCE for the recursive indicators).
+
+    Parameters
+    ----------
+    name: string
+        the name of the indicator function
+    params: dict
+        the parameters of the indicator, the default parameters of the function if None
+
+    Returns
+    ----------
+    length: int
+        the number of rows, None if the indicator needs the whole history
+    """
+    if WARMUP[name] is None:
+        return None
+    if params is None:
+        params = default_params(name)
+    return WARMUP[name](params)
+
+
+def lookback(indicators):
+    """
+    Get the number of rows of history that all the indicators need.
+
+    Parameters
+    ----------
+    indicators: list
+        the (name, params) of the indicators
+
+    Returns
+    ----------
+    length: int
+        the maximum warm-up of the indicators, None if any of them needs the whole history
+    """
+    length = 0
+    for name, params in indicators:
+        n = warmup(name, params)
+        if n is None:
+            return None
+        length = max(length, n)
+    return length
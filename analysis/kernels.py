@@ -0,0 +1,542 @@
+import pandas as pd
+import numpy as np
+
+from scipy.signal import lfilter
+from numpy.lib.stride_tricks import as_strided
+
+"""
+The array kernels of the indicators. The kernels work on a 1-D array (one symbol)
+or a 2-D array with one column per symbol, the windows run along the first axis
+(the dates). The rows before the first full window are NaN.
+"""
+
+
+def __rolling_extreme(values, window, accumulate):
+    """
+    The rolling maximum or minimum with the van Herk/Gil-Werman algorithm. The rows
+    are split into blocks of the window size, the extreme of a window is the extreme
+    of the suffix of a block and the prefix of the next block, so each row is
+    visited a constant number of times whatever the window is.
+
+    Parameters
+    ----------
+    values: np.array
+        1-D or 2-D array
+    window: int
+    accumulate: function
+        np.fmax.accumulate or np.fmin.accumulate, the NaN values are ignored
+
+    Returns
+    ----------
+    result: np.array
+        float64 array with the shape of values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = values.shape[0]
+    result = np.empty(values.shape)
+    result.fill(np.nan)
+    if window < 1 or length < window:
+        return result
+
+    blocks = -(-length // window)
+    padded = np.empty((blocks * window,) + values.shape[1:])
+    padded[:length] = values
+    padded[length:] = np.nan
+    padded = padded.reshape((blocks, window) + values.shape[1:])
+
+    prefix = accumulate(padded, axis=1).reshape((-1,) + values.shape[1:])
+    suffix = accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape((-1,) + values.shape[1:])
+
+    # the window [i-window+1, i] is the suffix from i-window+1 and the prefix to i
+    ufunc = np.fmax if accumulate == np.fmax.accumulate else np.fmin
+    result[window-1:] = ufunc(suffix[:length-window+1], prefix[window-1:length])
+    return result
+
+
+def rolling_max(values, window):
+    """
+    The maximum of the values in the rolling window, the NaN values are ignored.
+    """
+    return __rolling_extreme(values, window, np.fmax.accumulate)
+
+
+def rolling_min(values, window):
+    """
+    The minimum of the values in the rolling window, the NaN values are ignored.
+    """
+    return __rolling_extreme(values, window, np.fmin.accumulate)
+
+
+def rsv(close, high, low, window):
+    """
+    RSV = (Ct - Ln) / (Hn - Ln) * 100, Hn and Ln are the highest high and the lowest
+    low in the window.
+
+    Parameters
+    ----------
+    close: np.array
+        1-D or 2-D array
+    high: np.array
+    low: np.array
+    window: int
+
+    Returns
+    ----------
+    rsv_val: np.array
+    """
+    hn = rolling_max(high, window)
+    ln = rolling_min(low, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.asarray(close, dtype=np.float64) - ln) * 100.0 / (hn - ln)
+
+
+def shift(values, n=1):
+    """
+    Shift the values n rows down along the first axis, the first n rows are NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(values.shape)
+    result[:n] = np.nan
+    result[n:] = values[:len(values)-n]
+    return result
+
+
+def recursive_filter(values, factor, gain=1.0, initial=0.0):
+    """
+    The first order recursion y[i] = factor * y[i-1] + gain * x[i] along the first
+    axis, it is evaluated by scipy.signal.lfilter instead of a Python loop.
+
+    Parameters
+    ----------
+    values: np.array
+        x, 1-D or 2-D array
+    factor: float
+    gain: float
+    initial: float or np.array
+        y[-1], one value per column if values is 2-D
+
+    Returns
+    ----------
+    result: np.array
+        y
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+    zi = factor * np.asarray(initial, dtype=np.float64) * np.ones((1,) + values.shape[1:])
+    return lfilter([gain], [1.0, -factor], values, axis=0, zi=zi)[0]
+
+
+def ewma(values, span):
+    """
+    The exponentially weighted moving average (pd.ewma with adjust=True) along the
+    first axis. It is the ratio of the weighted sum of the values to the sum of the
+    weights, both are evaluated by one linear filter. The NaN values have no weight.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    factor = 1 - 2.0 / (span + 1)
+    filtered = recursive_filter(np.stack((np.where(valid, values, 0), valid.astype(np.float64)), axis=-1), factor)
+    weighted = filtered[..., 0]
+    weights = filtered[..., 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = weighted / weights
+    result[weights == 0] = np.nan
+    return result
+
+
+def true_range(high, low, close):
+    """
+    TR is defined as the greatest of the following:
+    Method 1: Current High less the current Low
+    Method 2: Current High less the previous Close (absolute value)
+    Method 3: Current Low less the previous Close (absolute value)
+    The first row is NaN.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    pre_close = shift(close)
+    tr = np.fmax(np.fmax(high - low, abs(high - pre_close)), abs(low - pre_close))
+    tr[:1] = np.nan
+    return tr
+
+
+def wilder_sum(values, window):
+    """
+    First TR14 = Sum of first 14 periods of TR1
+    Second TR14 = First TR14 - (First TR14/14) + Current TR1
+    Subsequent Values = Prior TR14 - (Prior TR14/14) + Current TR1
+    The first row of values is skipped, it is NaN for the differences.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(values.shape)
+    result.fill(np.nan)
+    if len(values) <= window:
+        return result
+
+    result[window] = np.sum(values[1:window+1], axis=0)
+    result[window+1:] = recursive_filter(values[window+1:], 1 - 1.0 / window, 1.0, result[window])
+    return result
+
+
+def wilder_average(values, window, start=0):
+    """
+    First ADX14 = 14 period Average of DX
+    Second ADX14 = ((First ADX14 x 13) + Current DX Value)/14
+    Subsequent ADX14 = ((Prior ADX14 x 13) + Current DX Value)/14
+    The average starts from the row <start> of values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(values.shape)
+    result.fill(np.nan)
+    first = start + window - 1
+    if len(values) <= first:
+        return result
+
+    result[first] = np.mean(values[start:first+1], axis=0)
+    result[first+1:] = recursive_filter(values[first+1:], (window - 1.0) / window, 1.0 / window, result[first])
+    return result
+
+
+def atr(high, low, close, window):
+    """
+    Current ATR = [(Prior ATR x 13) + Current TR] / 14
+    The first ATR is the TR of the second row, the ATR of the first row is 0.
+    """
+    return average_true_range(true_range(high, low, close), window)
+
+
+def average_true_range(tr, window):
+    """
+    The ATR of the true ranges, see atr.
+    """
+    result = np.zeros(tr.shape)
+    if len(tr) < 2:
+        return result
+
+    result[1] = tr[1]
+    result[2:] = recursive_filter(tr[2:], (window - 1.0) / window, 1.0 / window, tr[1])
+    return result
+
+
+def directional_movement(high, low):
+    """
+    +DM is the up move (High - Prior High) if it is greater than the down move
+    (Prior Low - Low) and positive, otherwise 0. -DM is the down move if it is
+    greater than the up move and positive, otherwise 0. The first row is NaN.
+
+    Returns
+    ----------
+    pdm, mdm: np.array
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    pdm = np.zeros(high.shape)
+    mdm = np.zeros(high.shape)
+    pdm[:1] = np.nan
+    mdm[:1] = np.nan
+
+    up = high[1:] - high[:-1]
+    down = low[:-1] - low[1:]
+    with np.errstate(invalid='ignore'):
+        up_move = (up > down) & (up > 0)
+        down_move = (down > up) & (down > 0)
+    pdm[1:][up_move] = up[up_move]
+    mdm[1:][down_move] = down[down_move]
+    return pdm, mdm
+
+
+def adx(high, low, close, window):
+    """
+    The average directional index and the directional indicators.
+
+    Returns
+    ----------
+    adx_val, pdi, mdi: np.array
+    """
+    pdm, mdm = directional_movement(high, low)
+    return directional_index(true_range(high, low, close), pdm, mdm, window)
+
+
+def directional_index(tr, pdm, mdm, window):
+    """
+    The ADX, +DI and -DI of the true ranges and the directional movements, see adx.
+    """
+    str = wilder_sum(tr, window)
+    spdm = wilder_sum(pdm, window)
+    smdm = wilder_sum(mdm, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # green line
+        pdi = spdm / str * 100
+        # red line
+        mdi = smdm / str * 100
+        dx = abs(pdi - mdi) / (pdi + mdi) * 100
+    return wilder_average(dx, window, window), pdi, mdi
+
+
+def money_flow_volume(close, high, low, volume):
+    """
+    1. Money Flow Multiplier = [(Close  -  Low) - (High - Close)] /(High - Low)
+    2. Money Flow Volume = Money Flow Multiplier x Volume for the Period
+    """
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mfm = ((close - low) - (high - close)) / (high - low)
+    return mfm * np.asarray(volume, dtype=np.float64)
+
+
+def obv(close, volume):
+    """
+    OBV = Previous OBV + Current Volume if the close is up, - Current Volume if the
+    close is down, the first OBV is the first volume. It is the cumulative sum of
+    the signed volumes.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signed = np.array(volume, dtype=np.float64)
+    delta = close[1:] - close[:-1]
+    with np.errstate(invalid='ignore'):
+        signed[1:] *= (delta > 0).astype(np.float64) - (delta < 0)
+    return np.cumsum(signed, axis=0)
+
+
+def adl(close, high, low, volume):
+    """
+    ADL = Previous ADL + Current Period's Money Flow Volume, the cumulative sum of
+    the money flow volumes.
+    """
+    return np.cumsum(money_flow_volume(close, high, low, volume), axis=0)
+
+
+def compact(values, valid):
+    """
+    Move the valid rows of each column to the top of the column, keeping their order,
+    so the kernels can run on the columns of symbols that have different trading days.
+
+    Parameters
+    ----------
+    values: np.array
+        2-D array, one column per symbol
+    valid: np.array
+        the boolean mask of the valid rows with the shape of values
+
+    Returns
+    ----------
+    compacted: np.array
+        the valid rows of each column followed by NaN rows
+    order: np.array
+        the rows of values in compacted, pass it to expand to move the rows back
+    """
+    order = np.argsort(~valid, axis=0, kind='mergesort')
+    compacted = np.take_along_axis(np.asarray(values, dtype=np.float64), order, axis=0)
+    compacted[~np.take_along_axis(valid, order, axis=0)] = np.nan
+    return compacted, order
+
+
+def expand(compacted, order, valid):
+    """
+    Move the rows of the compacted values back to their rows, the inverse of compact.
+    The invalid rows are NaN.
+    """
+    values = np.empty(compacted.shape)
+    values.fill(np.nan)
+    np.put_along_axis(values, order, compacted, axis=0)
+    values[~valid] = np.nan
+    return values
+
+
+# the maximum number of bytes of the windows that are materialised at once
+WINDOW_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def rolling_mean(values, window):
+    """
+    The mean of the values in the rolling window.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    columns = int(np.prod(values.shape[1:]))
+    mean = pd.DataFrame(values.reshape(len(values), columns)).rolling(window).mean().values
+    return mean.reshape(values.shape)
+
+
+def rolling_mad(values, window, center=None, chunk_bytes=WINDOW_CHUNK_BYTES):
+    """
+    The mean absolute deviation of the values in the rolling window from the center
+    of the window. The windows are strided views of the values, they are evaluated
+    in chunks of rows so that at most chunk_bytes are allocated at once.
+
+    Parameters
+    ----------
+    values: np.array
+        1-D or 2-D array
+    window: int
+    center: np.array
+        the center of each window, the rolling mean by default
+
+    Returns
+    ----------
+    mad: np.array
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if center is None:
+        center = rolling_mean(values, window)
+    length = len(values)
+    result = np.empty(values.shape)
+    result.fill(np.nan)
+    if window < 1 or length < window:
+        return result
+
+    # windows[i] is values[i:i+window], the window that ends at the row i+window-1
+    count = length - window + 1
+    windows = as_strided(values, shape=(count, window) + values.shape[1:],
+                         strides=(values.strides[0],) + values.strides, writeable=False)
+    step = max(1, chunk_bytes // (values[0:1].nbytes * window))
+    for lo in range(0, count, step):
+        hi = min(lo + step, count)
+        deviation = abs(center[window-1+lo:window-1+hi, np.newaxis] - windows[lo:hi])
+        result[window-1+lo:window-1+hi] = np.sum(deviation, axis=1) / window
+    return result
+
+
+def cci(close, high, low, window):
+    """
+    CCI = (Typical Price - SMA of Typical Price) / (0.015 x Mean Deviation)
+    """
+    tp = (np.asarray(high, dtype=np.float64) + low + close) / 3.0
+    stp = rolling_mean(tp, window)
+    dev = rolling_mad(tp, window, stp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (tp - stp) / (0.015 * dev)
+
+
+def sma_sweep(values, windows):
+    """
+    The simple moving averages of many windows from one prefix sum of the values.
+    The values are offset by the first valid value and summed in extended precision
+    (np.longdouble) so the differences of the prefix sums keep their precision.
+
+    Parameters
+    ----------
+    values: np.array
+        1-D array
+    windows: list
+        e.g. [5, 10, 20]
+
+    Returns
+    ----------
+    result: np.array
+        windows x dates, the same as pd.rolling_mean(values, window) in each row
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    result = np.empty((len(windows), length))
+    result.fill(np.nan)
+
+    valid = ~np.isnan(values)
+    offset = values[valid][0] if valid.any() else 0.0
+    sums = np.zeros(length + 1, dtype=np.longdouble)
+    np.cumsum(np.where(valid, values - offset, 0), dtype=np.longdouble, out=sums[1:])
+    invalid = np.zeros(length + 1, dtype=np.int64)
+    np.cumsum(~valid, out=invalid[1:])
+
+    for row, window in enumerate(windows):
+        if window < 1 or length < window:
+            continue
+        mean = (sums[window:] - sums[:-window]).astype(np.float64) / window + offset
+        mean[invalid[window:] - invalid[:-window] > 0] = np.nan
+        result[row, window-1:] = mean
+    return result
+
+
+def __scan(values, factors, block):
+    """
+    y[i, s] = factors[s] * y[i-1, s] + x[i, s], values is x (dates) for all the factors
+    or x (dates x factors).
+    """
+    length = len(values)
+    blocks = (length + block - 1) // block
+    padded = np.zeros((blocks * block,) + values.shape[1:])
+    padded[:length] = values
+
+    # the recursions inside the blocks: lower[s, j, i] = factor_s ** (j - i) if i <= j
+    steps = np.arange(block)
+    powers = factors[:, np.newaxis] ** np.arange(block + 1)
+    lower = powers[:, np.abs(steps[:, np.newaxis] - steps)]
+    lower[:, steps[:, np.newaxis] < steps] = 0
+    if values.ndim == 1:
+        # blocks x (factors, block), one product for all the factors
+        result = np.dot(padded.reshape((blocks, block)), lower.transpose(2, 0, 1).reshape((block, -1)))
+        result = result.reshape((blocks, len(factors), block))
+    else:
+        result = np.einsum('bis,sji->bsj', padded.reshape((blocks, block, -1)), lower)
+
+    if blocks > 1:
+        # the last values of the blocks are the recursions with the factors ** block
+        ends = __scan(result[:, :, -1], powers[:, -1], block)
+        result[1:] += ends[:-1, :, np.newaxis] * powers[np.newaxis, :, 1:]
+    return result.transpose(0, 2, 1).reshape((blocks * block, -1))[:length]
+
+
+def recursive_filter_sweep(values, factors, block=16):
+    """
+    The first order recursions y[i] = factor * y[i-1] + x[i] of many factors, y[-1] = 0.
+    The dates are split into blocks, the recursions inside the blocks of all the
+    factors are one matrix product with the powers of the factors, then the last
+    values of the blocks are carried to the next blocks by the same recursion on
+    the blocks.
+
+    Parameters
+    ----------
+    values: np.array
+        x, 1-D array
+    factors: np.array
+        the factors in [0, 1)
+    block: int
+        the number of dates of a block
+
+    Returns
+    ----------
+    result: np.array
+        factors x dates
+    """
+    values = np.asarray(values, dtype=np.float64)
+    factors = np.asarray(factors, dtype=np.float64)
+    if len(values) == 0:
+        return np.zeros((len(factors), 0))
+    return __scan(values, factors, block).T
+
+
+def ema_sweep(values, spans):
+    """
+    The exponential moving averages of many spans (pd.ewma with adjust=True), the
+    weighted sums of all the spans are one recursive_filter_sweep. The first span-1
+    rows are NaN.
+
+    Parameters
+    ----------
+    values: np.array
+        1-D array
+    spans: list
+        e.g. [5, 10, 20]
+
+    Returns
+    ----------
+    result: np.array
+        spans x dates
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    factors = 1 - 2.0 / (np.asarray(spans, dtype=np.float64) + 1)
+    weighted = recursive_filter_sweep(np.where(valid, values, 0), factors)
+    if valid.all():
+        # the sums of the powers of the factors
+        weights = (1 - factors[:, np.newaxis] ** np.arange(1, len(values) + 1)) / (1 - factors[:, np.newaxis])
+    else:
+        weights = recursive_filter_sweep(valid, factors)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = weighted / weights
+    result[weights == 0] = np.nan
+    for row, span in enumerate(spans):
+        result[row, :span-1] = np.nan
+    return result
@@ -0,0 +1,271 @@
+import pandas as pd
+import numpy as np
+
+from analysis import kernels
+
+"""
+The indicators of analysis.indicators computed for a universe of symbols at once.
+The prices are a dict of 2-D arrays (dates x symbols), one column per symbol, for
+example the fields of a PricePanel (see panel_prices). The results are a dict of
+column name -> 2-D array in the same layout.
+
+The symbols may have different trading days (e.g. listed in the middle of the
+range), the rows that the close price of a symbol is NaN are not trading days of
+the symbol. The trading days of each symbol are moved to the top of its column
+before the indicators are computed and moved back after, so the windows of a
+symbol only contain its own trading days, as if the indicator of analysis.indicators
+was computed on the prices of each symbol. The results are NaN on the other rows.
+"""
+
+
+def panel_prices(panel, fields=None):
+    """
+    Get the prices of a PricePanel as the dict of 2-D arrays (dates x symbols).
+    """
+    if fields is None:
+        fields = panel.fields
+    return dict((name, panel.field(name).T.astype(np.float64)) for name in fields)
+
+
+def __apply(prices, params, func, fields):
+    """
+    Compute the indicator on the trading days of each symbol and move the results back.
+    """
+    valid = ~np.isnan(np.asarray(prices["Close"], dtype=np.float64))
+    compacted = {}
+    for name in fields:
+        compacted[name], order = kernels.compact(prices[name], valid)
+
+    results = func(compacted, params)
+    return dict((column, kernels.expand(values, order, valid)) for column, values in results.items())
+
+
+def __rolling(values, window):
+    return pd.DataFrame(values).rolling(window)
+
+
+def __ema(close, window):
+    data = kernels.ewma(close, window)
+    data[0:window-1] = np.nan
+    return data
+
+
+def __sma(prices, params):
+    close = prices["Close"]
+    return dict(("SMA{}".format(w), __rolling(close, w).mean().values) for w in params["windows"])
+
+
+def sma(prices, params):
+    """
+    Calculate the simple moving average indicator.
+
+    Parameters
+    ----------
+    prices: dict
+        field -> 2-D array (dates x symbols)
+    params: dict
+            e.g. {"windows": [5, 10]}
+
+    Returns
+    ----------
+    sma_val : dict
+        column -> 2-D array, e.g. {"SMA5": ..., "SMA10": ...}
+    """
+    return __apply(prices, params, __sma, ["Close"])
+
+
+def __ema_columns(prices, params):
+    close = prices["Close"]
+    return dict(("EMA{}".format(w), __ema(close, w)) for w in params["windows"])
+
+
+def ema(prices, params):
+    """
+    Calculate the exponential moving average indicator, the columns are EMA<window>.
+    """
+    return __apply(prices, params, __ema_columns, ["Close"])
+
+
+def __bb(prices, params):
+    window = params["window"]
+    rolling = __rolling(prices["Close"], window)
+    rm = rolling.mean().values
+    rstd = rolling.std().values
+    return {"Middle": rm, "Upper": rm + rstd * 2, "Lower": rm - rstd * 2}
+
+
+def bb(prices, params={"window": 20}):
+    """
+    Calculate the bollinger bands indicator, the columns are Middle, Upper and Lower.
+    """
+    return __apply(prices, params, __bb, ["Close"])
+
+
+def __macd(prices, params):
+    close = prices["Close"]
+    windows = params["windows"]
+    diff = __ema(close, windows[0]) - __ema(close, windows[1])
+    dea = __ema(diff, windows[2])
+    return {"DIFF": diff, "DEA": dea, "MACD": diff - dea}
+
+
+def macd(prices, params={"windows": [12, 26, 9]}):
+    """
+    Calculate the MACD indicator, the columns are DIFF, DEA and MACD.
+    """
+    return __apply(prices, params, __macd, ["Close"])
+
+
+def __rsi(prices, params):
+    window = params["window"]
+    close = prices["Close"]
+    delta = close - kernels.shift(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gain = np.where(delta < 0, 0, delta)
+        lose = np.where(delta > 0, 0, delta)
+        rs = __rolling(gain, window).mean().values / abs(__rolling(lose, window).mean().values)
+        return {"RSI": 100 - 100 / (1 + rs)}
+
+
+def rsi(prices, params={"window": 14}):
+    """
+    Calculate the RSI indicator, the column is RSI.
+    """
+    return __apply(prices, params, __rsi, ["Close"])
+
+
+def __cmf(prices, params):
+    window = params["window"]
+    mfv = kernels.money_flow_volume(prices["Close"], prices["High"], prices["Low"], prices["Volume"])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {"CMF": __rolling(mfv, window).sum().values / __rolling(prices["Volume"], window).sum().values}
+
+
+def cmf(prices, params={"window": 20}):
+    """
+    Calculate the Chaikin money flow, the column is CMF.
+    """
+    return __apply(prices, params, __cmf, ["Close", "High", "Low", "Volume"])
+
+
+def __mfi(prices, params):
+    window = params["window"]
+    close = prices["Close"]
+    rmf = (prices["High"] + prices["Low"] + close) / 3.0 * prices["Volume"]
+    ret = close - kernels.shift(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prmf = np.where(ret < 0, 0, rmf)
+        nrmf = np.where(ret > 0, 0, rmf)
+        mfr = __rolling(prmf, window).sum().values / __rolling(nrmf, window).sum().values
+        return {"MFI": 100 - 100. / (1 + mfr)}
+
+
+def mfi(prices, params={"window": 14}):
+    """
+    Calculate the money flow index, the column is MFI.
+    """
+    return __apply(prices, params, __mfi, ["Close", "High", "Low", "Volume"])
+
+
+def __kd(prices, windows):
+    rsv = kernels.rsv(prices["Close"], prices["High"], prices["Low"], windows[0])
+    k = __rolling(rsv, windows[1]).mean().values
+    d = __rolling(k, windows[2]).mean().values
+    return k, d
+
+
+def __kdj(prices, params):
+    k, d = __kd(prices, params["windows"])
+    return {"K": k, "D": d, "J": 3 * k - 2 * d}
+
+
+def kdj(prices, params={"windows": [9, 3, 3]}):
+    """
+    Calculate the KDJ indicator, the columns are K, D and J.
+    """
+    return __apply(prices, params, __kdj, ["Close", "High", "Low"])
+
+
+def __stoch(prices, params):
+    k, d = __kd(prices, params["windows"])
+    return {"K": k, "D": d}
+
+
+def stoch(prices, params={"windows": [14, 3, 3]}):
+    """
+    Calculate the stochastic oscillator, the columns are K and D.
+    """
+    return __apply(prices, params, __stoch, ["Close", "High", "Low"])
+
+
+def __atr(prices, params):
+    return {"ATR": kernels.atr(prices["High"], prices["Low"], prices["Close"], params["window"])}
+
+
+def atr(prices, params={"window": 14}):
+    """
+    Calculate the average true range, the column is ATR.
+    """
+    return __apply(prices, params, __atr, ["Close", "High", "Low"])
+
+
+def __adx(prices, params):
+    adx_val, pdi, mdi = kernels.adx(prices["High"], prices["Low"], prices["Close"], params["window"])
+    return {"ADX": adx_val, "+DI": pdi, "-DI": mdi}
+
+
+def adx(prices, params={"window": 14}):
+    """
+    Calculate the average directional index, the columns are ADX, +DI and -DI.
+    """
+    return __apply(prices, params, __adx, ["Close", "High", "Low"])
+
+
+def __cci(prices, params):
+    return {"CCI": kernels.cci(prices["Close"], prices["High"], prices["Low"], params["window"])}
+
+
+def cci(prices, params={"window": 20}):
+    """
+    Calculate the commodity channel index, the column is CCI.
+    """
+    return __apply(prices, params, __cci, ["Close", "High", "Low"])
+
+
+def __obv(prices, params):
+    return {"OBV": kernels.obv(prices["Close"], prices["Volume"])}
+
+
+def obv(prices, params=None):
+    """
+    Calculate the on balance volume, the column is OBV.
+    """
+    return __apply(prices, params, __obv, ["Close", "Volume"])
+
+
+def __adl(prices, params):
+    return {"ADL": kernels.adl(prices["Close"], prices["High"], prices["Low"], prices["Volume"])}
+
+
+def adl(prices, params=None):
+    """
+    Calculate the accumulation distribution line, the column is ADL.
+    """
+    return __apply(prices, params, __adl, ["Close", "High", "Low", "Volume"])
+
+
+def __trix(prices, params):
+    windows = params["windows"]
+    raw = __ema(prices["Close"], windows[0])
+    tr = __ema(__ema(raw, windows[0]), windows[0])
+    shift_tr = kernels.shift(tr)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trix_val = (tr - shift_tr) / shift_tr * 100
+    return {"TRIX": trix_val, "MATRIX": __rolling(trix_val, windows[1]).mean().values}
+
+
+def trix(prices, params={"windows": [15, 9]}):
+    """
+    Calculate the TRIX indicator, the columns are TRIX and MATRIX.
+    """
+    return __apply(prices, params, __trix, ["Close"])
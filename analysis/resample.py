@@ -0,0 +1,230 @@
+import pandas as pd
+import numpy as np
+
+from utils.OHLCV import OHLCV
+from utils.PricePanel import PricePanel
+from utils.PriceStore import COLUMNS, DAY_NS, days_to_index
+
+"""
+Resample the daily bars to the bars of a longer period. The trading days are grouped
+into buckets once with array arithmetic on the days since 1970-01-01, then each field
+is reduced per bucket with the segment reductions of numpy (ufunc.reduceat):
+
+    Open: the first price of the bucket
+    High: the highest price of the bucket
+    Low: the lowest price of the bucket
+    Close: the last price of the bucket
+    Volume: the sum of the volumes of the bucket
+
+The date of a resampled bar is the last trading day of its bucket. The periods are
+
+    "W": the calendar weeks from Monday to Sunday
+    "M": the calendar months
+    N (int): N trading days, the buckets start from the first day
+
+The NaN values (the days that a symbol of a panel has no price) are skipped, a bucket
+without any valid value is NaN.
+"""
+
+WEEK = "W"
+MONTH = "M"
+
+
+def bucket_keys(days, period):
+    """
+    Get the bucket of each day, the days of the same bucket have the same key.
+
+    Parameters
+    ----------
+    days: np.array
+        the sorted trading days (days since 1970-01-01)
+    period: string or int
+        "W", "M" or the number of trading days
+
+    Returns
+    ----------
+    keys: np.array
+        int64
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if period == WEEK:
+        # 1970-01-01 is a Thursday, the weeks start from Monday 1969-12-29
+        return (days + 3) // 7
+    elif period == MONTH:
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    elif isinstance(period, (int, long)) and period > 0:
+        return np.arange(len(days), dtype=np.int64) // period
+    raise ValueError("Unknown period: {}".format(period))
+
+
+def bucket_bounds(days, period):
+    """
+    Get the first and the last positions of the buckets.
+
+    Returns
+    ----------
+    starts, ends: np.array
+        the positions of the first and the last day of each bucket
+    """
+    keys = bucket_keys(days, period)
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.concatenate((starts[1:] - 1, [len(keys) - 1]))
+    return starts, ends
+
+
+def completed_buckets(days, period):
+    """
+    Get the last completed bucket of each day, which is the bucket before the bucket
+    of the day. The buckets are numbered from 0, the same as the rows of the resampled
+    prices.
+
+    Returns
+    ----------
+    positions: np.array
+        int64, -1 for the days of the first bucket
+    """
+    keys = bucket_keys(days, period)
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    new = np.concatenate(([False], keys[1:] != keys[:-1]))
+    return np.cumsum(new, dtype=np.int64) - 1
+
+
+def __positions(values):
+    """
+    The row numbers broadcast to the shape of values.
+    """
+    return np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+
+
+def __take(values, rows, ok):
+    result = np.take_along_axis(values, rows, axis=0).astype(np.float64)
+    result[~ok] = np.nan
+    return result
+
+
+def first(values, starts, ends):
+    """
+    The first valid value of each bucket along the first axis.
+    """
+    if not np.issubdtype(values.dtype, np.floating):
+        return values[starts]
+    length = len(values)
+    rows = np.where(np.isnan(values), length, __positions(values))
+    # the row of the next valid value at or after each row
+    rows = np.minimum.accumulate(rows[::-1], axis=0)[::-1][starts]
+    ends = ends.reshape((-1,) + (1,) * (values.ndim - 1))
+    return __take(values, np.minimum(rows, length - 1), rows <= ends)
+
+
+def last(values, starts, ends):
+    """
+    The last valid value of each bucket along the first axis.
+    """
+    if not np.issubdtype(values.dtype, np.floating):
+        return values[ends]
+    rows = np.where(np.isnan(values), -1, __positions(values))
+    # the row of the previous valid value at or before each row
+    rows = np.maximum.accumulate(rows, axis=0)[ends]
+    starts = starts.reshape((-1,) + (1,) * (values.ndim - 1))
+    return __take(values, np.maximum(rows, 0), rows >= starts)
+
+
+def highest(values, starts, ends):
+    return np.fmax.reduceat(values, starts, axis=0)
+
+
+def lowest(values, starts, ends):
+    return np.fmin.reduceat(values, starts, axis=0)
+
+
+def total(values, starts, ends):
+    """
+    The sum of the valid values of each bucket, NaN if the bucket has no valid value.
+    """
+    if not np.issubdtype(values.dtype, np.floating):
+        return np.add.reduceat(values, starts, axis=0)
+    valid = ~np.isnan(values)
+    result = np.add.reduceat(np.where(valid, values, 0), starts, axis=0)
+    result[np.add.reduceat(valid, starts, axis=0) == 0] = np.nan
+    return result
+
+
+# field -> the reduction of the field
+REDUCTIONS = {"Open": first, "High": highest, "Low": lowest, "Close": last, "Volume": total}
+
+
+def __days(prices):
+    if isinstance(prices, OHLCV):
+        return prices.dates
+    return prices.index.values.view(np.int64) // DAY_NS
+
+
+def resample(prices, period=WEEK, drop_last=False):
+    """
+    Resample the daily prices of a symbol.
+
+    Parameters
+    ----------
+    prices: DataFrame or OHLCV
+        it contains the columns [Open, High, Low, Close, Volume]
+    period: string or int
+        "W", "M" or the number of trading days
+    drop_last: bool
+        drop the last bucket, it may be incomplete
+
+    Returns
+    ----------
+    df: DataFrame
+        the resampled prices, the index is the last trading day of each bucket
+    """
+    days = __days(prices)
+    starts, ends = bucket_bounds(days, period)
+    if drop_last:
+        starts, ends = starts[:-1], ends[:-1]
+
+    # the last segment of reduceat runs to the end of the values
+    stop = ends[-1] + 1 if len(ends) > 0 else 0
+    data = {}
+    for name in COLUMNS:
+        values = np.asarray(prices[name])[:stop]
+        data[name] = REDUCTIONS[name](values, starts, ends) if len(starts) > 0 else values[:0]
+
+    index = prices.index[ends] if isinstance(prices, pd.DataFrame) else days_to_index(days[ends])
+    return pd.DataFrame(data, index=index, columns=COLUMNS)
+
+
+def resample_panel(panel, period=WEEK, drop_last=False):
+    """
+    Resample the prices of a panel, the buckets are the same for all the symbols.
+
+    Parameters
+    ----------
+    panel: PricePanel
+    period: string or int
+        "W", "M" or the number of trading days
+    drop_last: bool
+        drop the last bucket, it may be incomplete
+
+    Returns
+    ----------
+    panel: PricePanel
+        the resampled panel, the days are the last trading day of each bucket. The
+        fields out of [Open, High, Low, Close, Volume] are the last values.
+    """
+    starts, ends = bucket_bounds(panel.days, period)
+    if drop_last:
+        starts, ends = starts[:-1], ends[:-1]
+
+    stop = ends[-1] + 1 if len(ends) > 0 else 0
+    values = np.empty((len(panel.symbols), len(starts), len(panel.fields)),
+                      dtype=np.result_type(panel.values.dtype, np.float32))
+    if len(starts) > 0:
+        for i, name in enumerate(panel.fields):
+            reduce = REDUCTIONS.get(name, last)
+            # the days are the first axis of the reductions
+            values[:, :, i] = reduce(np.asarray(panel.field(name))[:, :stop].T, starts, ends).T
+
+    return PricePanel(values, panel.symbols, panel.days[ends], panel.fields)
@@ -0,0 +1,683 @@
+import json
+import numpy as np
+import pandas as pd
+
+from collections import deque
+
+import analysis.indicators as ind
+from utils.OHLCV import price_field
+
+"""
+The streaming counterparts of the indicators in analysis.indicators. An indicator is
+seeded from the history and then updated with one bar at a time, each update takes
+constant time and memory whatever the length of the history is (CCI takes O(window)
+time for the mean deviation of its window). The values are the same as the values
+of the batch functions on the replayed prices, the recursions follow the same steps
+as pandas and the kernels.
+
+    macd = MACD()
+    history = macd.seed(prices)      # the same DataFrame as indicators.macd(prices)
+    diff, dea, macd_val = macd.update({"Close": 10.5})
+    macd.save("data/macd_AAPL.json")
+
+The state of an indicator can be saved by snapshot() (a json-serialisable dict) and
+restored by restore() into an indicator created with the same parameters.
+"""
+
+NAN = np.float64(np.nan)
+ZERO = np.float64(0)
+
+
+class _State(object):
+    """
+    The base of the objects whose state can be snapshotted and restored, the state
+    is the attributes of the object.
+    """
+
+    def snapshot(self):
+        state = {}
+        for key, value in self.__dict__.items():
+            if isinstance(value, _State):
+                value = value.snapshot()
+            elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], _State):
+                value = [item.snapshot() for item in value]
+            elif isinstance(value, (deque, list)):
+                value = list(value)
+            state[key] = value
+        return state
+
+
+    def restore(self, state):
+        for key, value in state.items():
+            current = getattr(self, key)
+            if isinstance(current, _State):
+                current.restore(value)
+            elif isinstance(current, list) and len(current) > 0 and isinstance(current[0], _State):
+                for item, item_state in zip(current, value):
+                    item.restore(item_state)
+            elif isinstance(current, deque):
+                setattr(self, key, deque([_restore_value(v) for v in value], current.maxlen))
+            elif isinstance(current, list):
+                setattr(self, key, [_restore_value(v) for v in value])
+            else:
+                setattr(self, key, _restore_value(value))
+
+
+def _restore_value(value):
+    # the floats are numpy floats, the division by zero is inf or NaN as the batch functions
+    return np.float64(value) if isinstance(value, float) else value
+
+
+class _Ema(_State):
+    """
+    pd.ewma(values, span=window) with the first window-1 values masked to NaN.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.factor = 1 - 2.0 / (window + 1)
+        self.count = 0
+        self.average = NAN
+        self.weight = 1.0
+
+
+    def update(self, value):
+        self.count += 1
+        if self.average == self.average:
+            self.weight *= self.factor
+            if value == value:
+                if self.average != value:
+                    self.average = (self.weight * self.average + value) / (self.weight + 1.0)
+                self.weight += 1.0
+        elif value == value:
+            self.average = value
+        return self.average if self.count >= self.window else NAN
+
+
+class _Rolling(_State):
+    """
+    The rolling sum and mean, the window must be full of valid values.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = ZERO
+        self.valid = 0
+        self.negative = 0
+
+
+    def update(self, value):
+        old = self.values[0] if len(self.values) == self.window else NAN
+        self.values.append(value)
+        if value == value:
+            self.valid += 1
+            self.total += value
+            self.negative += int(np.signbit(value))
+        if old == old:
+            self.valid -= 1
+            self.total -= old
+            self.negative -= int(np.signbit(old))
+
+
+    def sum(self):
+        return self.total if self.valid >= self.window else NAN
+
+
+    def mean(self):
+        if self.valid < self.window:
+            return NAN
+        result = self.total / self.valid
+        if (self.negative == 0 and result < 0) or (self.negative == self.valid and result > 0):
+            result = ZERO
+        return result
+
+
+class _RollingStd(_State):
+    """
+    The rolling standard deviation (ddof=1) updated by the Welford's method.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.valid = 0
+        self.mean = ZERO
+        self.ssqdm = ZERO
+
+
+    def __add(self, value):
+        self.valid += 1
+        delta = value - self.mean
+        self.mean += delta / self.valid
+        self.ssqdm += (self.valid - 1) * delta * delta / self.valid
+
+
+    def __remove(self, value):
+        self.valid -= 1
+        if self.valid > 0:
+            delta = value - self.mean
+            self.mean -= delta / self.valid
+            self.ssqdm -= (self.valid + 1) * delta * delta / self.valid
+        else:
+            self.mean = ZERO
+            self.ssqdm = ZERO
+
+
+    def update(self, value):
+        old = self.values[0] if len(self.values) == self.window else NAN
+        self.values.append(value)
+        if value == value and old == old:
+            # add one value and remove another one
+            delta = value - old
+            old -= self.mean
+            self.mean += delta / self.valid
+            value -= self.mean
+            self.ssqdm += (value + old) * delta
+        elif value == value:
+            self.__add(value)
+        elif old == old:
+            self.__remove(old)
+
+        if self.valid < self.window or self.valid <= 1:
+            return NAN
+        return np.sqrt(max(self.ssqdm / (self.valid - 1), ZERO))
+
+
+class _Extreme(_State):
+    """
+    The rolling maximum or minimum ignoring NaN values, the candidates of the window
+    are kept in a monotonic queue.
+    """
+
+    def __init__(self, window, sign):
+        self.window = window
+        self.sign = sign
+        self.count = 0
+        self.indices = deque()
+        self.values = deque()
+
+
+    def update(self, value):
+        if value == value:
+            while len(self.values) > 0 and self.sign * self.values[-1] <= self.sign * value:
+                self.values.pop()
+                self.indices.pop()
+            self.values.append(value)
+            self.indices.append(self.count)
+        while len(self.indices) > 0 and self.indices[0] <= self.count - self.window:
+            self.values.popleft()
+            self.indices.popleft()
+        self.count += 1
+        if self.count < self.window or len(self.values) == 0:
+            return NAN
+        return self.values[0]
+
+
+class _TrueRange(_State):
+    """
+    The true range, it is NaN on the first bar.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.pre_close = NAN
+
+
+    def update(self, high, low, close):
+        tr = NAN
+        if self.count > 0:
+            tr = np.fmax(np.fmax(high - low, abs(high - self.pre_close)), abs(low - self.pre_close))
+        self.pre_close = close
+        self.count += 1
+        return tr
+
+
+class _WilderSum(_State):
+    """
+    The sum of the first window values after the first bar, then
+    Subsequent Values = Prior TR14 - (Prior TR14/14) + Current TR1
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.factor = 1 - 1.0 / window
+        self.count = 0
+        self.first = []
+        self.total = NAN
+
+
+    def update(self, value):
+        self.count += 1
+        if self.count > self.window + 1:
+            self.total = value + self.factor * self.total
+        elif self.count > 1:
+            self.first.append(value)
+            if self.count == self.window + 1:
+                self.total = np.sum(self.first)
+                self.first = []
+        return self.total
+
+
+class _WilderAverage(_State):
+    """
+    The average of the first window values from the bar <start>, then
+    Subsequent ADX14 = ((Prior ADX14 x 13) + Current DX Value)/14
+    """
+
+    def __init__(self, window, start):
+        self.window = window
+        self.start = start
+        self.factor = (window - 1.0) / window
+        self.gain = 1.0 / window
+        self.count = 0
+        self.first = []
+        self.average = NAN
+
+
+    def update(self, value):
+        self.count += 1
+        if self.count > self.start + self.window:
+            self.average = self.gain * value + self.factor * self.average
+        elif self.count > self.start:
+            self.first.append(value)
+            if self.count == self.start + self.window:
+                self.average = np.mean(self.first)
+                self.first = []
+        return self.average
+
+
+class StreamingIndicator(_State):
+    """
+    The base of the streaming indicators.
+
+    name: the name of the batch function in analysis.indicators
+    fields: the price fields of a bar that the indicator uses
+    columns: the columns of the values, the same as the batch function
+    """
+    name = None
+    fields = ["Close"]
+    columns = []
+
+    def __init__(self, params=None):
+        """
+        Parameters
+        ----------
+        params: dict
+            the parameters of the batch function, the default parameters of the
+            batch function if None
+        """
+        if params is None:
+            params = ind.default_params(self.name)
+        self.params = params
+
+
+    def _update(self, *values):
+        raise NotImplementedError
+
+
+    def update(self, bar):
+        """
+        Add one bar.
+
+        Parameters
+        ----------
+        bar: dict or Series
+            the prices of the bar, e.g. {"Close": 10.5, "High": 10.8, "Low": 10.1, "Volume": 2000}
+
+        Returns
+        ----------
+        values: tuple
+            the values of the columns on the bar
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._update(*[np.float64(bar[field]) for field in self.fields])
+
+
+    def seed(self, prices):
+        """
+        Replay the history bar by bar.
+
+        Parameters
+        ----------
+        prices: DataFrame or OHLCV
+
+        Returns
+        ----------
+        values: DataFrame
+            the values of the history, the same as the batch function
+        """
+        arrays = [np.asarray(price_field(prices, field), dtype=np.float64) for field in self.fields]
+        values = np.empty((len(prices.index), len(self.columns)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i, bar in enumerate(zip(*arrays)):
+                values[i] = self._update(*bar)
+        return pd.DataFrame(values, index=prices.index, columns=self.columns)
+
+
+    def restore(self, state):
+        """
+        Restore the state from a snapshot of the indicator with the same parameters.
+        """
+        if json.loads(json.dumps(self.params)) != json.loads(json.dumps(state["params"])):
+            raise ValueError("the snapshot of {} has different parameters: {}".format(self.name, state["params"]))
+        super(StreamingIndicator, self).restore(state)
+
+
+    def save(self, filepath):
+        with open(filepath, "w") as f:
+            json.dump(self.snapshot(), f)
+
+
+    def load(self, filepath):
+        with open(filepath, "r") as f:
+            self.restore(json.load(f))
+
+
+class SMA(StreamingIndicator):
+    name = "sma"
+
+    def __init__(self, params):
+        super(SMA, self).__init__(params)
+        self.columns = ["SMA{}".format(w) for w in params["windows"]]
+        self.windows = [_Rolling(w) for w in params["windows"]]
+
+
+    def _update(self, close):
+        values = []
+        for window in self.windows:
+            window.update(close)
+            values.append(window.mean())
+        return tuple(values)
+
+
+class EMA(StreamingIndicator):
+    name = "ema"
+
+    def __init__(self, params):
+        super(EMA, self).__init__(params)
+        self.columns = ["EMA{}".format(w) for w in params["windows"]]
+        self.emas = [_Ema(w) for w in params["windows"]]
+
+
+    def _update(self, close):
+        return tuple(ema.update(close) for ema in self.emas)
+
+
+class BB(StreamingIndicator):
+    name = "bb"
+    columns = ["Middle", "Upper", "Lower"]
+
+    def __init__(self, params=None):
+        super(BB, self).__init__(params)
+        self.rolling = _Rolling(self.params["window"])
+        self.std = _RollingStd(self.params["window"])
+
+
+    def _update(self, close):
+        self.rolling.update(close)
+        rm = self.rolling.mean()
+        rstd = self.std.update(close)
+        return rm, rm + (rstd * 2), rm - (rstd * 2)
+
+
+class MACD(StreamingIndicator):
+    name = "macd"
+    columns = ["DIFF", "DEA", "MACD"]
+
+    def __init__(self, params=None):
+        super(MACD, self).__init__(params)
+        windows = self.params["windows"]
+        self.fast = _Ema(windows[0])
+        self.slow = _Ema(windows[1])
+        self.dea = _Ema(windows[2])
+
+
+    def _update(self, close):
+        diff = self.fast.update(close) - self.slow.update(close)
+        dea = self.dea.update(diff)
+        return diff, dea, diff - dea
+
+
+class RSI(StreamingIndicator):
+    name = "rsi"
+    columns = ["RSI"]
+
+    def __init__(self, params=None):
+        super(RSI, self).__init__(params)
+        self.pre_close = NAN
+        self.gain = _Rolling(self.params["window"])
+        self.lose = _Rolling(self.params["window"])
+
+
+    def _update(self, close):
+        delta = close - self.pre_close
+        self.pre_close = close
+        self.gain.update(ZERO if delta < 0 else delta)
+        self.lose.update(ZERO if delta > 0 else delta)
+        rs = self.gain.mean() / abs(self.lose.mean())
+        return 100 - 100 / (1 + rs),
+
+
+class CMF(StreamingIndicator):
+    name = "cmf"
+    fields = ["Close", "High", "Low", "Volume"]
+    columns = ["CMF"]
+
+    def __init__(self, params=None):
+        super(CMF, self).__init__(params)
+        self.mfv = _Rolling(self.params["window"])
+        self.volume = _Rolling(self.params["window"])
+
+
+    def _update(self, close, high, low, volume):
+        mfm = ((close - low) - (high - close)) / (high - low)
+        self.mfv.update(mfm * volume)
+        self.volume.update(volume)
+        return self.mfv.sum() / self.volume.sum(),
+
+
+class MFI(StreamingIndicator):
+    name = "mfi"
+    fields = ["Close", "High", "Low", "Volume"]
+    columns = ["MFI"]
+
+    def __init__(self, params=None):
+        super(MFI, self).__init__(params)
+        self.pre_close = NAN
+        self.positive = _Rolling(self.params["window"])
+        self.negative = _Rolling(self.params["window"])
+
+
+    def _update(self, close, high, low, volume):
+        rmf = (high + low + close) / 3.0 * volume
+        ret = close - self.pre_close
+        self.pre_close = close
+        self.positive.update(ZERO if ret < 0 else rmf)
+        self.negative.update(ZERO if ret > 0 else rmf)
+        mfr = self.positive.sum() / self.negative.sum()
+        return 100 - 100. / (1 + mfr),
+
+
+class Stoch(StreamingIndicator):
+    name = "stoch"
+    fields = ["Close", "High", "Low"]
+    columns = ["K", "D"]
+
+    def __init__(self, params=None):
+        super(Stoch, self).__init__(params)
+        windows = self.params["windows"]
+        self.highest = _Extreme(windows[0], 1)
+        self.lowest = _Extreme(windows[0], -1)
+        self.k = _Rolling(windows[1])
+        self.d = _Rolling(windows[2])
+
+
+    def _kd(self, close, high, low):
+        hn = self.highest.update(high)
+        ln = self.lowest.update(low)
+        self.k.update((close - ln) * 100.0 / (hn - ln))
+        k = self.k.mean()
+        self.d.update(k)
+        return k, self.d.mean()
+
+
+    def _update(self, close, high, low):
+        return self._kd(close, high, low)
+
+
+class KDJ(Stoch):
+    name = "kdj"
+    columns = ["K", "D", "J"]
+
+    def _update(self, close, high, low):
+        k, d = self._kd(close, high, low)
+        return k, d, 3 * k - 2 * d
+
+
+class ATR(StreamingIndicator):
+    name = "atr"
+    fields = ["High", "Low", "Close"]
+    columns = ["ATR"]
+
+    def __init__(self, params=None):
+        super(ATR, self).__init__(params)
+        window = self.params["window"]
+        self.tr = _TrueRange()
+        self.factor = (window - 1.0) / window
+        self.gain = 1.0 / window
+        self.count = 0
+        self.atr = ZERO
+
+
+    def _update(self, high, low, close):
+        tr = self.tr.update(high, low, close)
+        self.count += 1
+        if self.count > 2:
+            self.atr = self.gain * tr + self.factor * self.atr
+        elif self.count == 2:
+            self.atr = tr
+        return self.atr,
+
+
+class ADX(StreamingIndicator):
+    name = "adx"
+    fields = ["High", "Low", "Close"]
+    columns = ["ADX", "+DI", "-DI"]
+
+    def __init__(self, params=None):
+        super(ADX, self).__init__(params)
+        window = self.params["window"]
+        self.tr = _TrueRange()
+        self.count = 0
+        self.pre_high = NAN
+        self.pre_low = NAN
+        self.str = _WilderSum(window)
+        self.spdm = _WilderSum(window)
+        self.smdm = _WilderSum(window)
+        self.adx = _WilderAverage(window, window)
+
+
+    def _update(self, high, low, close):
+        tr = self.tr.update(high, low, close)
+        pdm = mdm = NAN
+        if self.count > 0:
+            up = high - self.pre_high
+            down = self.pre_low - low
+            pdm = up if up > down and up > 0 else ZERO
+            mdm = down if down > up and down > 0 else ZERO
+        self.pre_high = high
+        self.pre_low = low
+        self.count += 1
+
+        str = self.str.update(tr)
+        pdi = self.spdm.update(pdm) / str * 100
+        mdi = self.smdm.update(mdm) / str * 100
+        dx = abs(pdi - mdi) / (pdi + mdi) * 100
+        return self.adx.update(dx), pdi, mdi
+
+
+class CCI(StreamingIndicator):
+    name = "cci"
+    fields = ["Close", "High", "Low"]
+    columns = ["CCI"]
+
+    def __init__(self, params=None):
+        super(CCI, self).__init__(params)
+        self.tp = _Rolling(self.params["window"])
+
+
+    def _update(self, close, high, low):
+        tp = (high + low + close) / 3.0
+        self.tp.update(tp)
+        stp = self.tp.mean()
+        window = self.params["window"]
+        if len(self.tp.values) < window:
+            return NAN,
+        dev = np.sum(abs(stp - np.array(self.tp.values))) / window
+        return (tp - stp) / (0.015 * dev),
+
+
+class OBV(StreamingIndicator):
+    name = "obv"
+    fields = ["Close", "Volume"]
+    columns = ["OBV"]
+
+    def __init__(self, params=None):
+        super(OBV, self).__init__(params)
+        self.pre_close = NAN
+        self.count = 0
+        self.obv = ZERO
+
+
+    def _update(self, close, volume):
+        if self.count > 0:
+            delta = close - self.pre_close
+            volume *= float(delta > 0) - (delta < 0)
+        self.obv += volume
+        self.pre_close = close
+        self.count += 1
+        return self.obv,
+
+
+class ADL(StreamingIndicator):
+    name = "adl"
+    fields = ["Close", "High", "Low", "Volume"]
+    columns = ["ADL"]
+
+    def __init__(self, params=None):
+        super(ADL, self).__init__(params)
+        self.adl = ZERO
+
+
+    def _update(self, close, high, low, volume):
+        mfm = ((close - low) - (high - close)) / (high - low)
+        self.adl += mfm * volume
+        return self.adl,
+
+
+class TRIX(StreamingIndicator):
+    name = "trix"
+    columns = ["TRIX", "MATRIX"]
+
+    def __init__(self, params=None):
+        super(TRIX, self).__init__(params)
+        windows = self.params["windows"]
+        self.emas = [_Ema(windows[0]) for i in range(3)]
+        self.pre_tr = NAN
+        self.matrix = _Rolling(windows[1])
+
+
+    def _update(self, close):
+        tr = close
+        for ema in self.emas:
+            tr = ema.update(tr)
+        trix_val = (tr - self.pre_tr) / self.pre_tr * 100
+        self.pre_tr = tr
+        self.matrix.update(trix_val)
+        return trix_val, self.matrix.mean()
+
+
+# the name of the batch function -> the streaming indicator
+INDICATORS = dict((cls.name, cls) for cls in [SMA, EMA, BB, MACD, RSI, CMF, MFI, Stoch, KDJ, ATR, ADX,
+                                                CCI, OBV, ADL, TRIX])
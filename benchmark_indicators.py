@@ -0,0 +1,114 @@
+import numpy as np
+import time
+
+from optparse import OptionParser
+from analysis import kernels
+
+"""
+Benchmark of the indicator kernels on synthetic prices.
+
+$python benchmark_indicators.py -s 10000,100000,1000000 rsv cci
+"""
+
+
+def synthetic_prices(length, symbols=None, seed=0):
+    """
+    Generate random walk prices.
+
+    Parameters
+    ----------
+    length: int
+        the number of bars
+    symbols: int
+        the number of symbols, the arrays are 2-D (bars x symbols) if specified
+
+    Returns
+    ----------
+    close, high, low: np.array
+    """
+    rs = np.random.RandomState(seed)
+    shape = (length,) if symbols is None else (length, symbols)
+    close = 100 * np.exp(np.cumsum(rs.normal(0, 0.01, shape), axis=0))
+    high = close * (1 + rs.uniform(0, 0.02, shape))
+    low = close * (1 - rs.uniform(0, 0.02, shape))
+    return close, high, low
+
+
+def loop_rsv(close, high, low, window):
+    """
+    The RSV computed bar by bar, the implementation that the kernel replaced.
+    """
+    length = len(close)
+    rsv_val = np.zeros(length)
+    rsv_val[0:window-1] = np.nan
+
+    for i in range(window-1, length):
+        hn = np.nanmax(high[i-window+1:i+1])
+        ln = np.nanmin(low[i-window+1:i+1])
+        rsv_val[i] = (close[i] - ln) * 100.0 / (hn - ln)
+
+    return rsv_val
+
+
+def loop_cci(close, high, low, window):
+    """
+    The CCI computed bar by bar, the implementation that the kernel replaced.
+    """
+    tp = (high + low + close) / 3.0
+    length = len(tp)
+    stp = kernels.rolling_mean(tp, window)
+    cci_val = np.zeros(length)
+    cci_val[0:window-1] = np.nan
+
+    for i in range(window-1, length):
+        dev = np.sum(abs(stp[i] - tp[i-window+1:i+1])) / window
+        cci_val[i] = (tp[i] - stp[i]) / (0.015 * dev)
+
+    return cci_val
+
+
+# name -> (the loop implementation, the kernel, the default window)
+CASES = {
+    "rsv": (loop_rsv, kernels.rsv, 9),
+    "cci": (loop_cci, kernels.cci, 20),
+}
+
+
+def timeit(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def benchmark(name, sizes, window=None, panel_symbols=1000):
+    loop, kernel, default_window = CASES[name]
+    window = default_window if window is None else window
+    print "{} window: {}".format(name.upper(), window)
+    print "{:>10} {:>12} {:>12} {:>10}".format("bars", "loop (s)", "kernel (s)", "speed-up")
+    for size in sizes:
+        close, high, low = synthetic_prices(size)
+        loop_time, expected = timeit(loop, close, high, low, window)
+        kernel_time, result = timeit(kernel, close, high, low, window)
+        assert np.allclose(expected, result, equal_nan=True)
+        print "{:>10} {:>12.4f} {:>12.4f} {:>9.1f}x".format(size, loop_time, kernel_time, loop_time / kernel_time)
+
+    # one call for the panel of symbols
+    close, high, low = synthetic_prices(sizes[0], panel_symbols)
+    kernel_time, result = timeit(kernel, close, high, low, window)
+    print "panel of {} symbols x {} bars: {:.4f}s".format(panel_symbols, sizes[0], kernel_time)
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-s sizes] [-w window] [name1 name2 ...]",)
+    parser.add_option("-s", "--sizes", dest="sizes", default="10000,100000,1000000",
+                      help="the numbers of bars separated by comma; the default value is 10000,100000,1000000")
+    parser.add_option("-w", "--window", dest="window", type="int", default=None,
+                      help="the window of the indicators; the default value depends on the indicator")
+
+    options, args = parser.parse_args()
+    for name in (args if len(args) > 0 else sorted(CASES.keys())):
+        benchmark(name, [int(s) for s in options.sizes.split(",")], options.window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+import importlib
+import inspect
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from optparse import OptionParser
+from benchmark_indicators import synthetic_prices
+
+"""
+The benchmark suite of the public functions of analysis.indicators and
+analysis.indicator_feature and of analysis.candlestick_pattern.fractals on synthetic
+prices, plus the functions of analysis.panel_indicators on a panel of symbols. Each
+case runs in its own process, so the peak memory (the maximum resident set size of
+the process) belongs to the case.
+
+Save the results as the baseline, then compare the later runs with it, the run fails
+(exit code 1) if a case is slower or uses more memory than the baseline beyond the
+tolerance, or if a case fails:
+
+$python benchmark_suite.py -s 1000,100000,1000000 --save benchmarks.json
+$python benchmark_suite.py -s 1000,100000,1000000 --baseline benchmarks.json -t 0.2
+$python benchmark_suite.py -s 1000 -f macd,cci,trend_adx
+"""
+
+MODULES = ["analysis.indicators", "analysis.indicator_feature"]
+# the functions out of MODULES, they are not imported until they run
+EXTRA_FUNCTIONS = ["analysis.candlestick_pattern.fractals"]
+PANEL_MODULE = "analysis.panel_indicators"
+
+# the parameters of the functions that have no default parameters
+PARAMS = {
+    "sma": {"windows": [5, 20]},
+    "ema": {"windows": [5, 20]},
+    "trend_sma": {"windows": [5, 20]},
+    "trend_ema": {"windows": [5, 20]},
+    "reverse_sma_cross": {"windows": [5, 10]},
+    "reverse_ema_cross": {"windows": [5, 10]},
+}
+
+# the time differences below this are noise, they are not regressions
+MIN_SECONDS = 0.005
+# a case is not repeated after its runs took this many seconds
+MAX_REPEAT_SECONDS = 10
+
+
+def synthetic_ohlcv(length, seed=0):
+    """
+    Generate the random walk prices of one symbol as a DataFrame of minute bars.
+    """
+    close, high, low = synthetic_prices(length, seed=seed)
+    rs = np.random.RandomState(seed + 1)
+    open = low + (high - low) * rs.uniform(0, 1, length)
+    volume = rs.randint(1000, 100000, length).astype(np.int64)
+    index = pd.date_range("2000-01-03", periods=length, freq="T")
+    return pd.DataFrame({"Open": open, "High": high, "Low": low, "Close": close, "Volume": volume},
+                        index=index, columns=["Open", "High", "Low", "Close", "Volume"])
+
+
+def synthetic_panel(length, symbols, seed=0):
+    """
+    Generate the prices of the symbols as the dict of 2-D arrays (dates x symbols),
+    see analysis.panel_indicators.
+    """
+    close, high, low = synthetic_prices(length, symbols, seed=seed)
+    rs = np.random.RandomState(seed + 1)
+    volume = rs.randint(1000, 100000, (length, symbols)).astype(np.float64)
+    return {"Open": (high + low) / 2, "High": high, "Low": low, "Close": close, "Volume": volume}
+
+
+def list_functions():
+    """
+    Get the full names of the benchmarked functions, the public functions of the
+    modules whose first argument is the prices.
+    """
+    names = []
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name, func in sorted(inspect.getmembers(module, inspect.isfunction)):
+            if func.__module__ == module_name and not name.startswith("_") \
+                    and inspect.getargspec(func).args[:1] == ["prices"]:
+                names.append("{}.{}".format(module_name, name))
+    return names + EXTRA_FUNCTIONS
+
+
+def has_panel(full_name):
+    module_name, name = full_name.rsplit(".", 1)
+    panel_module = importlib.import_module(PANEL_MODULE)
+    return module_name == "analysis.indicators" and hasattr(panel_module, name)
+
+
+def run_case(full_name, size, panel_symbols, repeat):
+    """
+    Run a case in this process and print the result as json.
+    """
+    module_name, name = full_name.rsplit(".", 1)
+    if panel_symbols > 0:
+        func = getattr(importlib.import_module(PANEL_MODULE), name)
+        prices = synthetic_panel(size, panel_symbols)
+    else:
+        func = getattr(importlib.import_module(module_name), name)
+        prices = synthetic_ohlcv(size)
+
+    params = PARAMS.get(name)
+    seconds = None
+    total = 0
+    for i in range(repeat):
+        start = time.time()
+        func(prices) if params is None else func(prices, params)
+        elapsed = time.time() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        total += elapsed
+        if total > MAX_REPEAT_SECONDS:
+            break
+
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print json.dumps({"seconds": seconds, "peak_rss_mb": peak})
+
+
+def measure(full_name, size, panel_symbols, repeat):
+    """
+    Run a case in a new process.
+
+    Returns
+    ----------
+    result: dict
+        the keys are [seconds, peak_rss_mb, bars_per_second], None if the case failed
+    error: string
+        the last line of the error output of the failed case
+    """
+    command = [sys.executable, __file__, "--run", full_name, "-s", str(size),
+               "-p", str(panel_symbols), "-r", str(repeat)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        lines = err.strip().splitlines()
+        return None, lines[-1] if len(lines) > 0 else "exit code {}".format(process.returncode)
+
+    result = json.loads(out.strip().splitlines()[-1])
+    bars = size * max(panel_symbols, 1)
+    result["bars_per_second"] = bars / result["seconds"] if result["seconds"] > 0 else None
+    return result, None
+
+
+def case_key(full_name, size, panel_symbols):
+    if panel_symbols > 0:
+        return "{}.{}@{}x{}".format(PANEL_MODULE, full_name.rsplit(".", 1)[1], size, panel_symbols)
+    return "{}@{}".format(full_name, size)
+
+
+def regressions(result, base, tolerance):
+    """
+    Get the measures of the result that are worse than the baseline beyond the tolerance.
+    """
+    worse = []
+    if result["seconds"] > base["seconds"] * (1 + tolerance) and result["seconds"] - base["seconds"] > MIN_SECONDS:
+        worse.append("time {:.4f}s > {:.4f}s".format(result["seconds"], base["seconds"]))
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+        worse.append("memory {:.1f}MB > {:.1f}MB".format(result["peak_rss_mb"], base["peak_rss_mb"]))
+    return worse
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-s sizes] [-p panel_symbols] [-f functions] "
+                                "[--save file] [--baseline file] [-t tolerance]")
+    parser.add_option("-s", "--sizes", dest="sizes", default="1000,100000,1000000",
+                      help="the numbers of bars separated by comma; the default value is 1000,100000,1000000")
+    parser.add_option("-p", "--panel-symbols", dest="panel_symbols", type="int", default=1000,
+                      help="the number of symbols of the panel, the panel has the bars of the first size; "
+                           "0 to skip the panel; the default value is 1000")
+    parser.add_option("-f", "--functions", dest="functions", default=None,
+                      help="the names of the functions separated by comma, e.g. macd,trend_adx; all by default")
+    parser.add_option("-r", "--repeat", dest="repeat", type="int", default=3,
+                      help="the number of runs of each case, the fastest run is recorded; the default value is 3, "
+                           "the slow cases run fewer times")
+    parser.add_option("--save", dest="save", default=None, help="save the results as the baseline to the json file")
+    parser.add_option("--baseline", dest="baseline", default=None, help="compare the results with the json file")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float", default=0.25,
+                      help="the allowed relative increase of the time and the memory; the default value is 0.25")
+    parser.add_option("--run", dest="run", default=None, help="run one case in this process (internal)")
+
+    options, args = parser.parse_args()
+    sizes = [int(s) for s in options.sizes.split(",")]
+    if options.run is not None:
+        run_case(options.run, sizes[0], options.panel_symbols, options.repeat)
+        return
+
+    functions = list_functions()
+    if options.functions is not None:
+        selected = options.functions.split(",")
+        functions = [f for f in functions if f.rsplit(".", 1)[1] in selected]
+
+    cases = [(f, size, 0) for f in functions for size in sizes]
+    if options.panel_symbols > 0:
+        cases += [(f, sizes[0], options.panel_symbols) for f in functions if has_panel(f)]
+
+    baseline = {}
+    if options.baseline is not None:
+        with open(options.baseline, "r") as f:
+            baseline = json.load(f)
+
+    results = {}
+    failed = []
+    print "{:<60} {:>10} {:>10} {:>12}  {}".format("case", "time (s)", "peak (MB)", "bars/s", "status")
+    for full_name, size, panel_symbols in cases:
+        key = case_key(full_name, size, panel_symbols)
+        result, error = measure(full_name, size, panel_symbols, options.repeat)
+        if result is None:
+            failed.append(key)
+            print "{:<60} {:>10} {:>10} {:>12}  FAILED: {}".format(key, "-", "-", "-", error)
+            continue
+
+        results[key] = result
+        status = "ok"
+        if key in baseline:
+            worse = regressions(result, baseline[key], options.tolerance)
+            if len(worse) > 0:
+                failed.append(key)
+                status = "REGRESSION: " + ", ".join(worse)
+        print "{:<60} {:>10.4f} {:>10.1f} {:>12.0f}  {}".format(key, result["seconds"], result["peak_rss_mb"],
+                                                              result["bars_per_second"] or 0, status)
+
+    if options.save is not None:
+        with open(options.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if len(failed) > 0:
+        print "{} of {} cases failed or regressed.".format(len(failed), len(cases))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
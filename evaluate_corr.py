@@ -33,7 +33,7 @@ def evaluate_obv_corr():
     indicator = {"name": "obv", "column": "OBV", "params":None, "normalize": True}
     evaluator = CorrEvaluator(PERIOD["startdate"], PERIOD["enddate"], symbols=SYMBOLS_IT,
                               indicator=indicator, target="PRICE", target_period=3)
-    evaluator.start()
+    evaluator.start_panel()
     evaluator.dump_report()
 
 
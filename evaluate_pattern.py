@@ -1,28 +1,21 @@
 from analysis.candlestick_pattern import candlestick_patterns, PATTERNS
 # from utils.webdata import get_data_of_symbol
 from utils.csvdata import get_data_of_symbol, get_available_symbols
+from utils.SymbolUniverse import SymbolUniverse, BILLION_CAPS
 from datetime import date
 
 import numpy as np
-import csv
 
 patterns = PATTERNS.keys()
 
-def get_symbols(filename):
-    csvfile = open(filename, 'r')
-    symbol_reader = csv.reader(csvfile, delimiter=",")
-    symbol_reader.next()
-    symbols = []
-
-    for row in symbol_reader:
-        if row[2] == 'n/a':
-            continue
-
-        lastsale = float(row[2])
-        if lastsale > 1 and row[3].endswith('B'):
-            symbols.append(row[0])
-
-    return symbols
+def get_symbols(exchange, universe=None):
+    """
+    Get the list of the symbols of the exchange in BILLION_CAPS. Pass the loaded
+    universe when the symbols of several exchanges are read.
+    """
+    if universe is None:
+        universe = SymbolUniverse.load()
+    return universe.filter(exchanges=[exchange], **BILLION_CAPS)
 
 
 def analyze_symbols(symbols):
@@ -103,6 +96,6 @@ def evaluate_pattern(symbol):
 
 
 if __name__ == "__main__":
-    # symbols = get_symbols("./data/NYSE_symbols.csv")
+    # symbols = get_symbols("NYSE")
     symbols = get_available_symbols()
     analyze_symbols(symbols)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from simulator.TrendReverseEvaluator import CompositeTREvaluator
+from simulator.TrendReverseEvaluator import CompositeTREvaluator, SignalSearchEvaluator
 
 
 IT_SYMBOLS = ['AAPL', 'AMZN', 'GOOG', 'FB', 'IBM', 'MSFT', 'QCOM', 'ORCL', 'NFLX',
@@ -24,5 +24,26 @@ def test_trevaluator():
     evaluator.dump_report()
 
 
+def search_signals():
+    """
+    Rank the combinations of up to 3 features by the bull percent.
+    """
+    features = [
+        ("trend_sma", {"windows": [5, 20]}),
+        ("trend_adx", {"window": 14, "threshold": 20}),
+        ("trend_stoch", {"windows": [14, 3, 3]}),
+        ("trend_macd_zero_line", None),
+        ("reverse_kdj_cross", {"thresholds": [30, 70]}),
+        ("reverse_kdj_over_sell_buy", {"thresholds": [0, 100]}),
+        ("reverse_cci_over_sell_buy", {"window": 10}),
+        ("reverse_trix_cross", None),
+    ]
+    evaluator = SignalSearchEvaluator('2014-01-01', '2016-02-01', features,
+                                      max_size=3, min_signals=20, symbols=IT_SYMBOLS)
+    evaluator.start()
+    evaluator.dump_report()
+
+
 if __name__ == "__main__":
-    test_trevaluator()
\ No newline at end of file
+    test_trevaluator()
+    # search_signals()
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 import analysis.indicators as inds
+import analysis.IndicatorGraph as graph
 
 from matplotlib.lines import Line2D
 from matplotlib.patches import Rectangle
@@ -131,6 +132,10 @@ class SymbolPlotter(object):
 
 
     def __plot_indicators(self):
+        # compute the indicators at once, the shared intermediate results are computed once
+        requests = [(name, params) for name, params in self.indicators.items() if name in graph.RECIPES]
+        self.values = dict(zip([name for name, params in requests], graph.compute_indicators(self.prices, requests)))
+
         # plot indicators
         for indicator in self.indicators.keys():
             params = self.indicators[indicator]
@@ -178,7 +183,9 @@ class SymbolPlotter(object):
                 self.__plot_mafe(ax, params)
 
     def __calculate_indicator(self, indicator, params):
-        if params is None:
+        if indicator in self.values:
+            values = self.values[indicator]
+        elif params is None:
             values = getattr(inds, indicator)(self.prices)
         else:
             values = getattr(inds, indicator)(self.prices, params)
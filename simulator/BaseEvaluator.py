@@ -2,6 +2,7 @@ import threading as th
 import multiprocessing as mp
 import time
 
+from analysis.IndicatorCache import indicator_cache
 from utils.csvdata import get_available_symbols
 
 
@@ -17,7 +18,7 @@ class BaseEvaluator(object):
         -----------
         start_date: string
         end_date: string
-        symbols: list
+        symbols: list or SymbolUniverse
             The symbols to evaluate. If not specified, all the csv files in the
             'data/prices/' directory will be used to run the evaluation.
         thread_number: int
@@ -34,7 +35,7 @@ class BaseEvaluator(object):
         if symbols is None:
             self.symbols = get_available_symbols()
         else:
-            self.symbols = symbols
+            self.symbols = list(symbols)
 
         self.results = []
         self.report = "Not generated."
@@ -60,6 +61,7 @@ class BaseEvaluator(object):
         # Wait for all threads to complete
         for t in threads:
             t.join()
+        indicator_cache.save()
 
         # Generate evaluation report
         self.generate_report()
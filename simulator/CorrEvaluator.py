@@ -1,9 +1,12 @@
 from simulator.BaseEvaluator import BaseEvaluator
-from utils.csvdata import get_data_of_symbol
+from utils.csvdata import get_data_of_symbol, get_panel
 from analysis.basic import normalize
+from analysis import kernels
 
 import numpy as np
 import analysis.indicators as ind
+import analysis.panel_indicators as pind
+from analysis.IndicatorCache import indicator_cache
 
 
 class CorrEvaluator(BaseEvaluator):
@@ -38,7 +41,8 @@ class CorrEvaluator(BaseEvaluator):
         prices = get_data_of_symbol(symbol, self.start_date, self.end_date, fill_empty=False)
         result = {"symbol": symbol}
         target_values = self.__get_evaluate_target(prices)
-        ind_vals = getattr(ind, self.indicator["name"])(prices, self.indicator["params"])
+        ind_vals = indicator_cache.compute(symbol, getattr(ind, self.indicator["name"]), prices,
+                                           self.indicator["params"])
         ind_vals = ind_vals[self.indicator["column"]].dropna()
         if self.indicator["normalize"] and ind_vals[0] != 0:
             ind_vals = normalize(ind_vals)
@@ -50,6 +54,37 @@ class CorrEvaluator(BaseEvaluator):
         return result
 
 
+    def start_panel(self):
+        """
+        Evaluate all the symbols in one pass over the panel of their prices instead of
+        one symbol per task, the indicator must be a function of analysis.panel_indicators.
+        The results are the same as the results of start.
+        """
+        panel = get_panel(self.symbols, self.start_date, self.end_date, dtype=np.float64)
+        print "Start to evaluate {} symbols on the panel.".format(len(panel.symbols))
+
+        prices = pind.panel_prices(panel)
+        params = self.indicator["params"]
+        func = getattr(pind, self.indicator["name"])
+        ind_vals = func(prices, params) if params is not None else func(prices)
+        ind_vals = ind_vals[self.indicator["column"]]
+
+        # the trading days of each symbol are moved to the top of its column
+        valid = ~np.isnan(prices["Close"])
+        close = kernels.compact(prices["Close"], valid)[0]
+        ind_vals = kernels.compact(ind_vals, valid)[0]
+        if self.indicator["normalize"]:
+            ind_vals = self.__normalize_columns(ind_vals)
+
+        corrs = self.__pearson(self.__get_evaluate_targets(close), ind_vals)
+        for i, symbol in enumerate(panel.symbols):
+            result = {"symbol": symbol, "corr": corrs[i]}
+            self.ts_print(result)
+            self.results.append(result)
+
+        self.generate_report()
+
+
     def generate_report(self):
         corrs = np.zeros(len(self.results))
         for i in range(len(self.results)):
@@ -70,4 +105,47 @@ class CorrEvaluator(BaseEvaluator):
             values = normalize(close)
             values = values.shift(-1 * self.target_period)
 
-        return values.dropna()
\ No newline at end of file
+        return values.dropna()
+
+
+    def __get_evaluate_targets(self, close):
+        """
+        The targets of the compacted close prices of the panel, NaN if the target is unknown.
+        """
+        future = np.empty(close.shape)
+        future.fill(np.nan)
+        future[:len(close)-self.target_period] = close[self.target_period:]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.target == "RETURN":
+                return future / close - 1
+            elif self.target == "PRICE":
+                return (future - close[0]) / close[0]
+
+
+    def __normalize_columns(self, values):
+        """
+        Normalize each column by its first valid value, the columns that start from 0 are not normalized.
+        """
+        rows = np.argmax(~np.isnan(values), axis=0)
+        base = values[rows, np.arange(values.shape[1])]
+        base[(base == 0) | np.isnan(base)] = np.nan
+        with np.errstate(invalid='ignore'):
+            normalized = (values - base) / base
+        keep = np.isnan(base)
+        normalized[:, keep] = values[:, keep]
+        return normalized
+
+
+    def __pearson(self, x, y):
+        """
+        The pearson correlation of each pair of columns over the rows that both are valid.
+        """
+        both = ~np.isnan(x) & ~np.isnan(y)
+        count = both.sum(axis=0).astype(np.float64)
+        x = np.where(both, x, 0)
+        y = np.where(both, y, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dx = np.where(both, x - x.sum(axis=0) / count, 0)
+            dy = np.where(both, y - y.sum(axis=0) / count, 0)
+            return (dx * dy).sum(axis=0) / np.sqrt((dx * dx).sum(axis=0) * (dy * dy).sum(axis=0))
\ No newline at end of file
@@ -1,4 +1,8 @@
-import analysis.indicator_feature as indfr
+import pandas as pd
+import numpy as np
+import itertools
+
+from analysis.feature_matrix import feature_matrix
 
 from simulator.BaseEvaluator import BaseEvaluator
 from utils.csvdata import get_data_of_symbol
@@ -10,9 +14,24 @@ class TrendReverseEvaluator(BaseEvaluator):
     period).
     """
 
-    def __init__(self, start_date, end_date, symbols=None, thread_number=None, target_period=5):
+    def __init__(self, start_date, end_date, symbols=None, thread_number=None, target_period=5,
+                 signal_store=None):
+        """
+        Parameters
+        -----------
+        signal_store: SignalStore
+            read the features from the signal store instead of computing them, see
+            analysis.SignalStore. The new features are saved to the store after the evaluation.
+        """
         BaseEvaluator.__init__(self, start_date, end_date, symbols=symbols, thread_number=thread_number)
         self.target_period = target_period
+        self.signal_store = signal_store
+
+
+    def start(self):
+        BaseEvaluator.start(self)
+        if self.signal_store is not None:
+            self.signal_store.save()
 
 
     def real_evaluate(self, symbol):
@@ -72,7 +91,7 @@ class TrendReverseEvaluator(BaseEvaluator):
 class CompositeTREvaluator(TrendReverseEvaluator):
 
     def __init__(self, start_date, end_date, features,
-                 symbols=None, thread_number=None, target_period=5):
+                 symbols=None, thread_number=None, target_period=5, signal_store=None):
         """
         Parameters
         -----------
@@ -81,28 +100,116 @@ class CompositeTREvaluator(TrendReverseEvaluator):
             tuple[1]: parameters of the feature
         """
         TrendReverseEvaluator.__init__(self, start_date, end_date, symbols=symbols,
-                                  thread_number=thread_number, target_period=target_period)
+                                  thread_number=thread_number, target_period=target_period,
+                                  signal_store=signal_store)
         self.features = features
 
 
     def count_signals(self, prices, gain, result):
-        data = []
-        for f in self.features:
-            values = getattr(indfr, f[0])(prices, f[1])
-            data.append(values)
-
-        for i in range(1, len(gain) - self.target_period):
-            if self.__check_signal(data, i, 1):
-                self.increase_bull_signal(result, gain[i] > 0)
-            elif self.__check_signal(data, i, -1):
-                self.increase_bear_signal(result, gain[i] < 0)
+        matrix = feature_matrix(prices, self.features, result["symbol"], self.signal_store)
+        # a signal needs all the features, bull wins if both are set (no features at all)
+        bull = (matrix == 1).all(axis=1)
+        bear = (matrix == -1).all(axis=1) & ~bull
+
+        days = slice(1, max(1, len(gain) - self.target_period))
+        gain = np.asarray(gain)[days]
+        bull, bear = bull[days], bear[days]
+        with np.errstate(invalid='ignore'):
+            result["bull_signal_count"] += int(bull.sum())
+            result["valid_bull_signal_count"] += int((bull & (gain > 0)).sum())
+            result["bear_signal_count"] += int(bear.sum())
+            result["valid_bear_signal_count"] += int((bear & (gain < 0)).sum())
 
         self.ts_print(result)
 
 
-    def __check_signal(self, features, index, value):
-        for feature in features:
-            if feature[index] != value:
-                return False
+class SignalSearchEvaluator(TrendReverseEvaluator):
+    """
+    This class searches the combinations of the candidate features. The features of a
+    symbol are computed once, then the signals of all the combinations of up to
+    max_size features are counted at once: the bull (bear) mask of a combination is the
+    AND of the mask of the combination without its last feature and the mask of the
+    last feature. The report is the table of the combinations ranked by the bull percent.
+    """
 
-        return True
\ No newline at end of file
+    def __init__(self, start_date, end_date, features, max_size=2, min_signals=1,
+                 symbols=None, thread_number=None, target_period=5, signal_store=None):
+        """
+        Parameters
+        -----------
+        features: list(tuple)
+            the candidate features, (function name of the feature, parameters of the feature)
+        max_size: int
+            the maximum number of features of a combination
+        min_signals: int
+            the combinations that have fewer bull signals are ranked after the others
+        """
+        TrendReverseEvaluator.__init__(self, start_date, end_date, symbols=symbols,
+                                       thread_number=thread_number, target_period=target_period,
+                                       signal_store=signal_store)
+        self.features = features
+        self.max_size = max_size
+        self.min_signals = min_signals
+
+        # the combinations (tuples of the feature positions) grouped by their size
+        self.levels = [list(itertools.combinations(range(len(features)), size))
+                       for size in range(1, min(max_size, len(features)) + 1)]
+        self.combinations = [c for level in self.levels for c in level]
+        # (position of the combination without its last feature in the previous level, last feature)
+        self.parents = [None]
+        for size in range(1, len(self.levels)):
+            positions = dict((c, i) for i, c in enumerate(self.levels[size - 1]))
+            self.parents.append(np.array([(positions[c[:-1]], c[-1]) for c in self.levels[size]]))
+        self.table = None
+
+
+    def count_signals(self, prices, gain, result):
+        matrix = feature_matrix(prices, self.features, result["symbol"], self.signal_store)
+        days = slice(1, max(1, len(gain) - self.target_period))
+        matrix = matrix[days]
+        with np.errstate(invalid='ignore'):
+            gain = np.asarray(gain)[days]
+            up, down = gain > 0, gain < 0
+
+        # one row per combination and one column per day
+        counts = dict((key, []) for key in ["bull_signal_count", "valid_bull_signal_count",
+                                            "bear_signal_count", "valid_bear_signal_count"])
+        for value, prefix, valid in [(1, "bull", up), (-1, "bear", down)]:
+            planes = (matrix == value).T
+            masks = planes
+            for size, level in enumerate(self.levels):
+                if size > 0:
+                    parents = self.parents[size]
+                    masks = masks[parents[:, 0]] & planes[parents[:, 1]]
+                counts[prefix + "_signal_count"].append(masks.sum(axis=1))
+                counts["valid_" + prefix + "_signal_count"].append((masks & valid).sum(axis=1))
+
+        for key, values in counts.items():
+            result[key] = np.concatenate(values) if len(values) > 0 else np.zeros(0, dtype=np.int64)
+        self.ts_print("{}: {} days".format(result["symbol"], len(gain)))
+
+
+    def generate_report(self):
+        """
+        Generate the table of the combinations ranked by the bull percent.
+        """
+        columns = ["bull_signal_count", "valid_bull_signal_count", "bear_signal_count", "valid_bear_signal_count"]
+        totals = dict((key, np.zeros(len(self.combinations), dtype=np.int64)) for key in columns)
+        for result in self.results:
+            for key in columns:
+                totals[key] += result[key]
+
+        names = [f[0] for f in self.features]
+        table = pd.DataFrame(totals, columns=columns)
+        table.insert(0, "features", [" & ".join(names[i] for i in c) for c in self.combinations])
+        table.insert(1, "size", [len(c) for c in self.combinations])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table["bull_percent"] = np.where(table["bull_signal_count"] > 0, table["valid_bull_signal_count"]
+                                             * 100.0 / table["bull_signal_count"], 0)
+            table["bear_percent"] = np.where(table["bear_signal_count"] > 0, table["valid_bear_signal_count"]
+                                             * 100.0 / table["bear_signal_count"], 0)
+
+        table["enough"] = table["bull_signal_count"] >= self.min_signals
+        table = table.sort_values(["enough", "bull_percent", "bull_signal_count"], ascending=False)
+        self.table = table.drop("enough", axis=1).reset_index(drop=True)
+        self.report = self.table.to_string()
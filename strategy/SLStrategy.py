@@ -2,6 +2,7 @@ import pandas as pd
 
 import analysis.indicators as ind
 from analysis.basic import normalize
+from analysis.IndicatorGraph import IndicatorGraph
 """
 This class defines the trading strategy. The x and y values of the trading strategy.
 
@@ -35,15 +36,19 @@ class SLStrategy(object):
         target_period: int
         """
         self.indicators = indicators
+        # the indicators share the intermediate results, e.g. the EMAs of macd and ema
+        self.graph = IndicatorGraph([(indicator["name"], indicator["params"]) for indicator in indicators])
         self.learner = learner
         self.target = target
         self.target_period = target_period
         self.base_price = None
+        self.bases = {}
 
 
     def train_learner(self, prices):
         self.base_price = prices["Close"][0]
-        x = self.calculate_x(prices)
+        self.bases = {}
+        x = self.calculate_x(prices, self.bases)
         y = self.calculate_y(prices)
 
         vals = y.to_frame().join(x, how="inner")
@@ -54,14 +59,26 @@ class SLStrategy(object):
         self.learner.train(vals[vals.columns[1:]].values, vals[vals.columns[0]].values)
 
 
-    def calculate_x(self, prices):
+    def calculate_x(self, prices, bases=None):
+        """
+        Parameters
+        ----------
+        prices: DataFrame
+        bases: dict
+            column -> the value that normalizes the indicator. The first value of the
+            indicator is used and added to the dict if the column is not in it.
+        """
         x = pd.DataFrame(index=prices.index)
+        if bases is None:
+            bases = {}
 
-        for indicator in self.indicators:
-            ind_vals = getattr(ind, indicator["name"])(prices, indicator["params"])
+        for indicator, ind_vals in zip(self.indicators, self.graph.evaluate(prices)):
             ind_vals = ind_vals[indicator["column"]].dropna()
-            if indicator["normalize"] and ind_vals[0] != 0:
-                ind_vals = normalize(ind_vals)
+            if indicator["column"] not in bases:
+                bases[indicator["column"]] = ind_vals[0]
+            base = bases[indicator["column"]]
+            if indicator["normalize"] and base != 0:
+                ind_vals = normalize(ind_vals, base)
             x = x.join(pd.DataFrame(ind_vals.values, index=ind_vals.index, columns=[indicator["column"]]), how="inner")
 
         return x
@@ -92,9 +109,10 @@ class SLStrategy(object):
         ----------
         new_prices: DataFrame
             previous daily prices, we use these prices to calculate the indicators (x)
-            in the recent days. new prices must be started from the same date as training
-            prices because both indicator value and its normalized value may be different
-            with different start date.
+            in the recent days. The indicators are normalized by the values of training,
+            only the last <num> rows and the warm-up rows of the indicators are used. If
+            an indicator needs the whole history (e.g. obv), new prices must be started
+            from the same date as training prices.
         num: int
 
         Returns
@@ -102,7 +120,11 @@ class SLStrategy(object):
         y: np.array
             the predicted y.
         """
-        x = self.calculate_x(new_prices)
+        length = ind.lookback([(indicator["name"], indicator["params"]) for indicator in self.indicators])
+        if length is not None:
+            new_prices = new_prices.iloc[-(num + length):]
+
+        x = self.calculate_x(new_prices, dict(self.bases))
         x = x.iloc[-num:, :]
         return self.learner.query(x.values)
 
@@ -1,64 +1,88 @@
 import pandas as pd
+import numpy as np
 
-import analysis.indicator_feature as indfr
-from analysis.basic import daily_prices_to_weekly_prices
+from analysis.feature_matrix import feature_matrix, feature_names, feature_positions, FeatureRow
+from analysis.MultiTimeframe import MultiTimeframe
+from analysis.resample import WEEK
 
 class Strategy(object):
-
-    def __init__(self, features, week_features=None, allow_short=True, start_value=1000000):
+    """
+    The base of the strategies that trade on the features of the prices. The signal
+    methods (is_buy_signal, ...) read the features of the current day:
+
+        curr_features: FeatureRow
+            the features of the day, by position or by name, e.g. curr_features[0]
+            or curr_features["reverse_kdj_cross"]
+        curr_timeframe_features: dict
+            period -> the FeatureRow of the last completed bar of the period
+        curr_week_features: FeatureRow
+            the same as curr_timeframe_features["W"]
+
+    The features of all the days are the int8 matrix feature_matrix (dates x
+    features) and the DataFrame features (the columns are the names of the features).
+    """
+
+    def __init__(self, features, week_features=None, allow_short=True, start_value=1000000,
+                 timeframe_features=None):
         """
         Parameters
         -----------
         features: dict
             Format: [("feature_function_name", {feature parameters})]
         week_features: dict
+            the features of the weekly prices, the same as timeframe_features={"W": week_features}
+        timeframe_features: dict
+            period -> the features of the prices of the period, the period is "W", "M"
+            or the number of trading days (see analysis.resample)
         """
         self.feature_params = features
         self.week_feature_params = week_features
+        self.timeframe_feature_params = dict(timeframe_features or {})
+        if week_features is not None:
+            self.timeframe_feature_params[WEEK] = week_features
         self.allow_short = allow_short
         self.start_value = start_value
 
 
-    def __calculate_features(self, feature_params, prices):
-        if feature_params is None:
-            return None
-
-        features = pd.DataFrame(index=prices.index)
-        for f in feature_params:
-            values = getattr(indfr, f[0])(prices, f[1])
-            features = features.join(values.to_frame())
-            features.rename(columns={features.columns[-1]: f[0]}, inplace=True)
-
-        return features
-
-
     def generate_orders(self, prices, symbol):
         self.prices = prices
-        self.features = self.__calculate_features(self.feature_params, prices)
-        if self.week_feature_params is not None:
-            self.week_prices = daily_prices_to_weekly_prices(prices)
-            self.week_features = self.__calculate_features(self.week_feature_params, self.week_prices)
+        self.feature_matrix = feature_matrix(prices, self.feature_params or [], symbol)
+        self.features = pd.DataFrame(self.feature_matrix, index=prices.index,
+                                     columns=feature_names(self.feature_params or []))
+
+        positions = feature_positions(self.feature_params or [])
+
+        # the features of the last completed bar of each period on each day
+        self.timeframes = MultiTimeframe(prices)
+        self.timeframe_features = {}
+        timeframe_positions = {}
+        for period, params in self.timeframe_feature_params.items():
+            timeframe_positions[period] = feature_positions(params)
+            bar_matrix = feature_matrix(self.timeframes.bars(period), params, symbol)
+            self.timeframe_features[period] = self.timeframes.align(bar_matrix, period, fill=0)
+            if period == WEEK:
+                self.week_prices = self.timeframes.bars(WEEK)
+                self.week_features = pd.DataFrame(bar_matrix, index=self.week_prices.index,
+                                                  columns=feature_names(params))
+        ready = self.timeframes.ready(self.timeframe_features.keys())
+        closes = np.asarray(prices['Close'])
 
         cash = self.start_value
         long_shares = short_shares = 0
         orders = []
-        week_index = 0
-        pre_week = prices.index[0].isocalendar()[1]
         self.curr_week_features = None
-
-        for date in prices.index:
-            if self.week_feature_params is not None:
-                week = date.isocalendar()[1]
-                if week != pre_week:
-                    self.curr_week_features = self.week_features.iloc[week_index]
-                    week_index += 1
-                    pre_week = week
-
-                if self.curr_week_features is None:
-                    continue
-
-            self.curr_features = self.features.loc[date]
-            close = prices.loc[date, 'Close']
+        self.curr_timeframe_features = {}
+
+        for i, date in enumerate(prices.index):
+            # the days before the first completed bar of any period
+            if not ready[i]:
+                continue
+            for period, matrix in self.timeframe_features.items():
+                self.curr_timeframe_features[period] = FeatureRow(matrix[i], timeframe_positions[period])
+            self.curr_week_features = self.curr_timeframe_features.get(WEEK)
+
+            self.curr_features = FeatureRow(self.feature_matrix[i], positions)
+            close = closes[i]
 
             if long_shares == 0 and self.is_buy_signal():
                 long_shares = round(cash / close, 0)
@@ -1,11 +1,31 @@
 import pandas as pd
+import numpy as np
+import threading as th
+import shutil
+import tempfile
+import urlparse
 import math
+import json
+import os
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
 
 from utils.webdata import get_close_of_symbols, get_data_of_symbol
 from utils.draw import plot_histogram, plot_scatter
 from analysis.basic import compute_daily_returns, analyze_market_correlation, evaluate_predict_result
 from strategy.QStrategy import QStrategy
 from learner.NaiveBayesLearner import NaiveBayesLearner
+from utils.PriceFetcher import PriceFetcher
+import analysis.indicators as ind
+import analysis.streaming as streaming
+from analysis.IndicatorCache import IndicatorCache
+from analysis.resample import resample
+from analysis.MultiTimeframe import MultiTimeframe
+from analysis.SignalStore import SignalStore, signal_key
+from utils.TradingCalendar import TradingCalendar
+from utils.PriceStore import PriceStore, DATE_FORMAT
+from utils.ingest import update_store, APPENDED, INGESTED
 
 
 def test_market_correlation_analysis():
@@ -60,7 +80,282 @@ def test_nbayes_learner():
     print learner.query(datax)
 
 
+class CannedPriceHandler(BaseHTTPRequestHandler):
+    """
+    A stand-in of the historical price service, it serves the canned prices of
+    the business days in the requested range.
+    """
+    protocol_version = "HTTP/1.1"   # keep the connections alive
+    requested = []
+    lock = th.Lock()    # the date parsing is not thread safe
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlsplit(self.path).query)
+        self.lock.acquire()
+        try:
+            start = pd.Timestamp(query["startdate"][0])
+            end = pd.Timestamp(query["enddate"][0])
+            self.requested.append((query["q"][0], start, end))
+        finally:
+            self.lock.release()
+
+        lines = ["Date,Open,High,Low,Close,Volume"]
+        for date in reversed(pd.bdate_range(start, end)):
+            price = 100 + date.dayofyear / 10.0
+            lines.append("{},{},{},{},{},{}".format(date.strftime("%d-%b-%y"), price, price + 1,
+                                                   price - 1, price + 0.5, 1000))
+        body = "\n".join(lines) + "\n"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def test_price_fetcher():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CannedPriceHandler)
+    server_thread = th.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    cache_dir = tempfile.mkdtemp()
+    fetcher = None
+
+    try:
+        url = "http://127.0.0.1:{}/finance/historical".format(server.server_port)
+        fetcher = PriceFetcher(url=url, cache_dir=cache_dir, thread_number=4, rate=100, burst=10)
+        prices = fetcher.fetch_many(["AAPL", "IBM", "FB"], "2015-01-01", "2015-06-30")
+        assert sorted(prices.keys()) == ["AAPL", "FB", "IBM"]
+        assert len(prices["AAPL"]) == len(pd.bdate_range("2015-01-01", "2015-06-30"))
+        assert len(CannedPriceHandler.requested) == 3
+
+        # only the missing span is fetched
+        df = fetcher.fetch("AAPL", "2015-03-01", "2015-09-30")
+        assert CannedPriceHandler.requested[-1][1:] == (pd.Timestamp("2015-07-01"), pd.Timestamp("2015-09-30"))
+        assert df.index[0] == pd.Timestamp("2015-03-02") and df.index[-1] == pd.Timestamp("2015-09-30")
+        assert np.allclose(df["Close"].values, 100.5 + df.index.dayofyear / 10.0)
+
+        fetcher.fetch("AAPL", "2015-04-01", "2015-05-01")
+        assert len(CannedPriceHandler.requested) == 4
+        print "Requests:", fetcher.requests
+    finally:
+        if fetcher is not None:
+            fetcher.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(cache_dir)
+
+
+def make_prices(rows, start="2010-01-04", seed=0):
+    """
+    The random walk prices of the business days from start.
+    """
+    random = np.random.RandomState(seed)
+    close = 50 * np.exp(np.cumsum(random.normal(0, 0.02, rows)))
+    open_ = close * (1 + random.normal(0, 0.005, rows))
+    high = np.maximum(open_, close) * (1 + random.uniform(0, 0.01, rows))
+    low = np.minimum(open_, close) * (1 - random.uniform(0, 0.01, rows))
+    volume = random.randint(1000, 100000, rows).astype(np.float64)
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+                        index=pd.bdate_range(start, periods=rows),
+                        columns=["Open", "High", "Low", "Close", "Volume"])
+
+
+def test_streaming_indicators():
+    prices = make_prices(400)
+    seeded = 250
+    for name, cls in sorted(streaming.INDICATORS.items()):
+        params = {"windows": [5, 20]} if name in ["sma", "ema"] else None
+        batch = getattr(ind, name)(prices) if params is None else getattr(ind, name)(prices, params)
+
+        # the seeded values and the values of the replayed bars are the batch values
+        indicator = cls(params)
+        history = indicator.seed(prices.iloc[:seeded])
+        assert list(history.columns) == list(batch.columns), name
+        assert np.allclose(history.values, batch.values[:seeded], rtol=1e-9, atol=1e-9, equal_nan=True), name
+        snapshot = json.loads(json.dumps(indicator.snapshot()))
+        replayed = np.array([indicator.update(prices.iloc[i]) for i in range(seeded, len(prices))])
+        assert np.allclose(replayed, batch.values[seeded:], rtol=1e-9, atol=1e-9, equal_nan=True), name
+
+        # the restored indicator continues from the snapshot
+        restored = cls(params)
+        restored.restore(snapshot)
+        continued = np.array([restored.update(prices.iloc[i]) for i in range(seeded, len(prices))])
+        assert np.allclose(continued, replayed, rtol=0, atol=0, equal_nan=True), name
+    print "Streaming indicators:", len(streaming.INDICATORS)
+
+
+def test_moving_average_sweeps():
+    params = {"windows": [2, 5, 10, 20, 60, 200]}
+    prices = make_prices(1000)
+    flat = prices.copy()
+    flat["Close"] = np.round(flat["Close"].values, 0)
+    gaps = prices.copy()
+    gaps.iloc[[0, 1, 100, 500], gaps.columns.get_loc("Close")] = np.nan
+    for data in [prices, flat, gaps]:
+        for sweep, batch in [(ind.sma_sweep, ind.sma), (ind.ema_sweep, ind.ema)]:
+            expected = batch(data, params)
+            values = sweep(data, params)
+            assert list(values.columns) == list(expected.columns)
+            assert np.allclose(values.values, expected.values, rtol=1e-9, atol=1e-9, equal_nan=True), sweep.__name__
+    print "Moving average sweeps:", len(params["windows"]), "windows"
+
+
+def test_indicator_cache():
+    prices = make_prices(400)
+    params = {"windows": [12, 26, 9]}
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        cache = IndicatorCache(cache_dir)
+        values = cache.compute("TEST", ind.macd, prices.iloc[:300], params)
+        assert values.equals(ind.macd(prices.iloc[:300], params))
+        cache.save()
+
+        # the values are read by another cache, the new bars are computed
+        cache = IndicatorCache(cache_dir)
+        assert cache.compute("TEST", ind.macd, prices.iloc[:300], params).equals(values)
+        extended = cache.compute("TEST", ind.macd, prices, params)
+        assert np.allclose(extended.values, ind.macd(prices, params).values, equal_nan=True)
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["extensions"] == 1 and stats["entries"] == 1
+
+        # the prices of the same dates were changed, the values are computed again
+        changed = prices.copy()
+        changed["Close"] += 1
+        assert cache.compute("TEST", ind.macd, changed, params).equals(ind.macd(changed, params))
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+
+        # the least recently used entries are removed
+        cache = IndicatorCache(cache_dir, max_bytes=stats["bytes"])
+        cache.compute("TEST", ind.rsi, prices, {"window": 14})
+        stats = cache.stats()
+        assert stats["evictions"] == 1 and stats["entries"] == 1 and stats["bytes"] <= stats["max_bytes"]
+        print "Indicator cache:", stats
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_resample():
+    prices = make_prices(400)
+    reductions = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    groups = {"W": prices.index.to_period("W"), "M": prices.index.to_period("M"),
+              5: np.arange(len(prices)) // 5}
+    for period, keys in groups.items():
+        expected = prices.groupby(keys).agg(reductions)[prices.columns]
+        bars = resample(prices, period)
+        assert np.allclose(bars.values, expected.values), period
+        last_days = pd.Series(prices.index, index=prices.index).groupby(keys).last()
+        assert (bars.index == last_days.values).all(), period
+        assert resample(prices, period, drop_last=True).equals(bars.iloc[:-1]), period
+
+    # each day gets the last completed week
+    timeframes = MultiTimeframe(prices)
+    weeks = timeframes.bars("W")
+    close = timeframes.align(weeks["Close"], "W")
+    for date in prices.index[::7]:
+        completed = weeks.index[weeks.index < date - pd.Timedelta(days=date.dayofweek)]
+        if len(completed) == 0:
+            assert np.isnan(close[date])
+        else:
+            assert close[date] == weeks["Close"][completed[-1]]
+    print "Resampled weeks:", len(weeks)
+
+
+def test_signal_store():
+    dates = pd.bdate_range("2015-01-01", periods=300)
+    calendar = TradingCalendar.from_dates(dates)
+    random = np.random.RandomState(0)
+    signals = dict((symbol, random.randint(-1, 2, (2, len(dates))).astype(np.int8))
+                   for symbol in ["AAPL", "FB", "IBM"])
+    store_dir = tempfile.mkdtemp()
+
+    try:
+        store = SignalStore(store_dir, calendar)
+        for symbol, values in signals.items():
+            store.put(symbol, "trend", dates, values[0])
+            store.put(symbol, "reverse", dates[10:], values[1][10:])
+        store.save()
+
+        # the signals are read by another store
+        store = SignalStore(store_dir, calendar)
+        for symbol, values in signals.items():
+            assert (store.get(symbol, "trend").values == values[0]).all()
+            assert (store.get(symbol, "reverse").values[10:] == values[1][10:]).all()
+        date = dates[50]
+        expected = sorted(s for s, v in signals.items() if v[0][50] == 1 and v[1][50] == -1)
+        assert sorted(store.match(date, [("trend", 1), ("reverse", -1)])) == expected
+        counts = store.counts([("trend", 1)])
+        assert (counts.values == sum(v[0] == 1 for v in signals.values())).all()
+
+        # the signal is computed again if the prices were changed, the sources are stored apart
+        def above_mean(prices):
+            return prices["Close"] - prices["Close"].mean()
+        prices = make_prices(len(dates), start=dates[0])
+        changed = make_prices(len(dates), start=dates[0], seed=1)
+        assert (store.compute("TEST", above_mean, prices).values == np.sign(above_mean(prices))).all()
+        assert (store.compute("TEST", above_mean, changed).values == np.sign(above_mean(changed))).all()
+        assert (store.compute("TEST", above_mean, prices, source="web").values == np.sign(above_mean(prices))).all()
+        assert (store.get("TEST", signal_key("above_mean")).values == np.sign(above_mean(changed))).all()
+
+        # the store is cleared if the calendar was changed
+        store = SignalStore(store_dir, TradingCalendar.from_dates(dates[1:]))
+        store.put("VMW", "trend", dates[1:], np.ones(len(dates) - 1))
+        assert store.get("AAPL", "trend") is None and store.count(dates[5], [("trend", 1)]) == 1
+        assert not any(f.endswith(".npz") for f in os.listdir(store_dir))
+        print "Signal store:", len(signals), "symbols"
+    finally:
+        shutil.rmtree(store_dir)
+
+
+def test_ingest():
+    prices = make_prices(300).round(2)
+    prices_dir = tempfile.mkdtemp()
+    store_dir = tempfile.mkdtemp()
+    csvfile = os.path.join(prices_dir, "TEST.csv")
+
+    def write(df, newest_first, mtime):
+        df = df.iloc[::-1] if newest_first else df
+        df.to_csv(csvfile, index_label="Date", date_format=DATE_FORMAT, float_format="%.2f")
+        os.utime(csvfile, (mtime, mtime))
+
+    try:
+        for newest_first in [False, True]:
+            store = PriceStore(store_dir, prices_dir)
+            write(prices.iloc[:200], newest_first, 1000)
+            assert update_store(store, ["TEST"])[INGESTED] == 1
+
+            # only the new rows are parsed
+            write(prices.iloc[:250], newest_first, 2000)
+            assert update_store(store, ["TEST"])[APPENDED] == 1
+            assert np.allclose(store.get_prices("TEST").values, prices.values[:250]) and not store.is_stale("TEST")
+
+            # the history was rewritten when the new rows were added
+            adjusted = prices.copy()
+            adjusted.iloc[100:130, :4] -= 0.01
+            write(adjusted, newest_first, 3000)
+            assert update_store(store, ["TEST"])[INGESTED] == 1
+            assert np.allclose(store.get_prices("TEST").values, adjusted.values)
+        print "Ingest: ok"
+    finally:
+        shutil.rmtree(prices_dir)
+        shutil.rmtree(store_dir)
+
+
 if __name__ == "__main__":
     test_market_correlation_analysis()
     # test_qstrategy()
-    # test_nbayes_learner()
\ No newline at end of file
+    # test_nbayes_learner()
+    # test_price_fetcher()
+    # test_streaming_indicators()
+    # test_moving_average_sweeps()
+    # test_indicator_cache()
+    # test_resample()
+    # test_signal_store()
+    # test_ingest()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import threading as th
+import hashlib
+import json
+import os
+
+"""
+The fingerprints of the source files (e.g. data/prices/*.csv). The fingerprint of a
+file is the sha1 digest of its content. The size and mtime of the file are recorded
+with the digest, the file is hashed again only when its size or mtime was changed,
+so a file that was touched or copied without changes keeps its fingerprint.
+
+A derived artefact (the binary price store, the cached prices, the compiled symbol
+universe) records the fingerprints of its sources when it is built, it is out of date
+only if one of the fingerprints is different, see Fingerprints.changed.
+"""
+
+INDEX_FILE = "data/fingerprints.json"
+READ_BLOCK = 1024 * 1024
+
+
+def hash_file(path):
+    """
+    Get the sha1 hex digest of the content of the file.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class Fingerprints(object):
+    """
+    The fingerprints of files, it is thread safe.
+    """
+
+    def __init__(self, index_file=INDEX_FILE):
+        """
+        Parameters
+        -----------
+        index_file: string
+            the json file that saves the recorded fingerprints between runs, None
+            if the fingerprints are only kept in memory
+        """
+        self.index_file = index_file
+        self.index = None   # path -> [size, mtime, digest]
+        self.dirty = False
+        self.hashed = 0
+        self.lock = th.Lock()
+
+
+    def get(self, path):
+        """
+        Get the fingerprint of the file.
+
+        Returns
+        ----------
+        digest: string
+            the sha1 hex digest of the content, None if the file does not exist
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        self.lock.acquire()
+        try:
+            self.__load()
+            record = self.index.get(path)
+        finally:
+            self.lock.release()
+
+        if record is not None and record[0] == stat.st_size and record[1] == stat.st_mtime:
+            return record[2]
+
+        digest = hash_file(path)
+        self.lock.acquire()
+        self.index[path] = [stat.st_size, stat.st_mtime, digest]
+        self.dirty = True
+        self.hashed += 1
+        self.lock.release()
+        return digest
+
+
+    def changed(self, records):
+        """
+        Get the files whose fingerprints are different from the recorded fingerprints.
+
+        Parameters
+        ----------
+        records: dict
+            path -> the fingerprint that a derived artefact was built from
+
+        Returns
+        ----------
+        paths: list
+            the files that were changed or removed
+        """
+        return [path for path, digest in records.items() if digest is None or self.get(path) != digest]
+
+
+    def save(self):
+        """
+        Save the fingerprints to the index file if they were changed.
+        """
+        self.lock.acquire()
+        try:
+            if self.index_file is None or not self.dirty:
+                return
+            folder = os.path.dirname(self.index_file)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            tmp_path = self.index_file + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.index, f)
+            os.rename(tmp_path, self.index_file)
+            self.dirty = False
+        finally:
+            self.lock.release()
+
+
+    def __load(self):
+        if self.index is not None:
+            return
+        self.index = {}
+        if self.index_file is not None and os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r") as f:
+                    self.index = json.load(f)
+            except ValueError:
+                print "Failed to read the fingerprints in: ", self.index_file
+
+
+# the fingerprints shared by the loaders of the process
+fingerprints = Fingerprints()
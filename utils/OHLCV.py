@@ -0,0 +1,129 @@
+import pandas as pd
+import numpy as np
+
+from utils.PriceStore import COLUMNS, DAY_NS, days_to_index
+
+"""
+A compact container of daily bars. The functions in analysis.indicators,
+analysis.candlestick_pattern and analysis.indicator_feature accept it as
+the prices in place of a DataFrame, they read the columns as arrays with
+price_field, so the DataFrame is only built when to_frame is called.
+"""
+
+
+def price_field(prices, name):
+    """
+    Get a column of the prices (DataFrame or OHLCV) as a float64 array.
+    """
+    return np.asarray(prices[name], dtype=np.float64)
+
+
+class OHLCV(object):
+
+    __slots__ = ("dates", "open", "high", "low", "close", "volume", "_index", "_frame")
+
+    def __init__(self, dates, open, high, low, close, volume):
+        """
+        Parameters
+        -----------
+        dates: np.array
+            int64, the trading days (days since 1970-01-01)
+        open: np.array
+            float32 or float64
+        high: np.array
+        low: np.array
+        close: np.array
+        volume: np.array
+            int64
+        """
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self._index = None
+        self._frame = None
+
+
+    @staticmethod
+    def from_arrays(days, values, dtype=np.float64):
+        """
+        Create the bars from the arrays of the price store.
+
+        Parameters
+        ----------
+        days: np.array
+            the trading days (days since 1970-01-01)
+        values: np.array
+            the [Open, High, Low, Close, Volume] values, one row per day
+        dtype: np.dtype
+            the type of the prices, the prices are views of values if dtype is float64
+        """
+        return OHLCV(np.asarray(days, dtype=np.int64),
+                     values[:, 0].astype(dtype, copy=False),
+                     values[:, 1].astype(dtype, copy=False),
+                     values[:, 2].astype(dtype, copy=False),
+                     values[:, 3].astype(dtype, copy=False),
+                     values[:, 4].astype(np.int64))
+
+
+    @staticmethod
+    def from_frame(df, dtype=np.float64):
+        """
+        Create the bars from a DataFrame that contains the columns [Open, High, Low, Close, Volume].
+        """
+        days = df.index.values.view(np.int64) // DAY_NS
+        bars = OHLCV.from_arrays(days, df[COLUMNS].values, dtype)
+        bars._index = df.index
+        return bars
+
+
+    @property
+    def index(self):
+        """
+        The dates as a DatetimeIndex, it is created on the first access.
+        """
+        if self._index is None:
+            self._index = days_to_index(self.dates)
+        return self._index
+
+
+    def __len__(self):
+        return len(self.dates)
+
+
+    def __getitem__(self, name):
+        """
+        Get a column by its DataFrame name, e.g. bars["Close"].
+        """
+        if name == "Open":
+            return self.open
+        elif name == "High":
+            return self.high
+        elif name == "Low":
+            return self.low
+        elif name == "Close":
+            return self.close
+        elif name == "Volume":
+            return self.volume
+        raise KeyError(name)
+
+
+    def slice(self, start, stop):
+        """
+        Get the bars in the positions [start, stop), the arrays are views.
+        """
+        return OHLCV(self.dates[start:stop], self.open[start:stop], self.high[start:stop],
+                     self.low[start:stop], self.close[start:stop], self.volume[start:stop])
+
+
+    def to_frame(self):
+        """
+        Convert the bars to a DataFrame, the DataFrame is created on the first call.
+        """
+        if self._frame is None:
+            self._frame = pd.DataFrame({"Open": self.open, "High": self.high, "Low": self.low,
+                                        "Close": self.close, "Volume": self.volume},
+                                       index=self.index, columns=COLUMNS)
+        return self._frame
@@ -0,0 +1,197 @@
+import threading as th
+import numpy as np
+
+from collections import OrderedDict
+from utils.PriceStore import to_day
+
+"""
+A process-wide cache of the price histories of symbols. The loaders in utils.csvdata
+and utils.webdata put the histories they read into the shared price_cache, a
+request of a date range is answered by slicing a cached history that covers it.
+"""
+
+
+def slice_by_date(df, start=None, end=None):
+    """
+    Get the rows of the DataFrame in the date range [start, end]. The index of the
+    DataFrame must be sorted, the returned DataFrame is a view of df.
+    """
+    days = df.index.values.view(np.int64) // (24 * 3600 * 10**9)
+    lo = 0 if start is None else np.searchsorted(days, to_day(start), side='left')
+    hi = len(days) if end is None else np.searchsorted(days, to_day(end), side='right')
+    return df.iloc[lo:hi]
+
+
+class PriceCache(object):
+    """
+    A LRU cache of price DataFrames bounded by the number of bytes. Each entry records
+    the date range it covers and the version of its source, so that a cached history is
+    not used after its source was changed. It is thread safe.
+
+    The cached DataFrames are shared with the callers, they must not be modified.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Parameters
+        -----------
+        max_bytes: int
+            the maximum number of bytes of the cached DataFrames
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = th.Lock()
+
+
+    def get(self, key, start=None, end=None, version=None):
+        """
+        Get the cached prices in the range [start, end].
+
+        Parameters
+        ----------
+        key: tuple
+            for example ("csv", "AAPL")
+        start: string
+            the start date, None means the cached history must start from the first date
+        end: string
+            the end date, None means the cached history must end at the last date
+        version: object
+            the version of the source, the entry is dropped if its version is different
+
+        Returns
+        ----------
+        df: DataFrame
+            None if the range is not covered by the cache
+        """
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry is not None and entry[3] != version:
+                self.__remove(key)
+                entry = None
+
+            if entry is None or not self.__covers(entry, start, end):
+                self.misses += 1
+                return None
+
+            self.entries[key] = self.entries.pop(key)   # move to the end, most recently used
+            self.hits += 1
+            df = entry[0]
+        finally:
+            self.lock.release()
+
+        return slice_by_date(df, start, end)
+
+
+    def get_entry(self, key, version=None):
+        """
+        Get the cached history and the range it covers without counting a hit or miss.
+
+        Returns
+        ----------
+        entry: tuple
+            (df, start_day, end_day) or None. start_day and end_day are days since
+            1970-01-01, None means the history is complete on that side.
+        """
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry is None or entry[3] != version:
+                return None
+            return entry[:3]
+        finally:
+            self.lock.release()
+
+
+    def put(self, key, df, start=None, end=None, version=None):
+        """
+        Cache the prices.
+
+        Parameters
+        ----------
+        key: tuple
+        df: DataFrame
+            the prices, sorted by date
+        start: string
+            the start date of the range covered by df, None if df starts from the first date
+        end: string
+            the end date of the range covered by df, None if df ends at the last date
+        version: object
+            the version of the source
+        """
+        size = int(df.memory_usage(index=True).sum())
+        start_day = None if start is None else to_day(start)
+        end_day = None if end is None else to_day(end)
+
+        self.lock.acquire()
+        try:
+            if key in self.entries:
+                self.__remove(key)
+
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = (df, start_day, end_day, version, size)
+            self.bytes += size
+            self.__evict()
+        finally:
+            self.lock.release()
+
+
+    def resize(self, max_bytes):
+        self.lock.acquire()
+        self.max_bytes = max_bytes
+        self.__evict()
+        self.lock.release()
+
+
+    def clear(self):
+        self.lock.acquire()
+        self.entries.clear()
+        self.bytes = 0
+        self.lock.release()
+
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+
+        Returns
+        ----------
+        stats: dict
+            the keys are [hits, misses, evictions, entries, bytes, max_bytes]
+        """
+        self.lock.acquire()
+        stats = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                 "entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+        self.lock.release()
+        return stats
+
+
+    def __covers(self, entry, start, end):
+        start_day, end_day = entry[1], entry[2]
+        if start_day is not None and (start is None or to_day(start) < start_day):
+            return False
+        if end_day is not None and (end is None or to_day(end) > end_day):
+            return False
+        return True
+
+
+    def __remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry[4]
+
+
+    def __evict(self):
+        while self.bytes > self.max_bytes and len(self.entries) > 0:
+            key = next(iter(self.entries))   # the least recently used entry
+            self.__remove(key)
+            self.evictions += 1
+
+
+# the cache shared by utils.csvdata and utils.webdata
+price_cache = PriceCache()
@@ -0,0 +1,354 @@
+import pandas as pd
+import numpy as np
+import threading as th
+import httplib
+import socket
+import urllib
+import urlparse
+import Queue
+import json
+import time
+import os
+
+from StringIO import StringIO
+from utils.PriceStore import COLUMNS, DATE_FORMAT, read_price_csv, to_day, days_to_index
+
+"""
+The fetch layer of utils.webdata. It downloads the daily prices of symbols from the
+historical price service with a pool of worker threads. Each worker keeps its HTTP
+connections alive, the requests to a host are rate limited and the failed requests
+are retried with exponential backoff.
+
+The fetched prices are saved in the cache directory, one csv file per symbol in the
+same format as the files in 'data/prices/' and a json file that records the date
+range covered by the csv file. Only the days that are not covered are fetched.
+"""
+
+GOOGLE_URL = "http://www.google.com/finance/historical"
+URL_DATE_FORMAT = '%b %d, %Y'
+
+
+class RateLimiter(object):
+    """
+    A token bucket that limits the number of requests per second. It is thread safe.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Parameters
+        -----------
+        rate: float
+            the number of requests per second
+        burst: int
+            the maximum number of requests that can be sent at once
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.time()
+        self.lock = th.Lock()
+
+
+    def acquire(self):
+        """
+        Wait until a request can be sent.
+        """
+        while True:
+            self.lock.acquire()
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.lock.release()
+                return
+            wait = (1 - self.tokens) / self.rate
+            self.lock.release()
+            time.sleep(wait)
+
+
+class FetchError(Exception):
+    pass
+
+
+class PriceFetcher(object):
+
+    def __init__(self, url=GOOGLE_URL, cache_dir="data/webcache/", thread_number=8,
+                 rate=5.0, burst=5, max_retries=3, backoff=0.5, timeout=10):
+        """
+        Parameters
+        -----------
+        url: string
+            the url of the historical price service, it accepts the query parameters
+            q (symbol), startdate, enddate and output=csv
+        cache_dir: string
+            the directory of the fetched prices, None disables the disk cache
+        thread_number: int
+            the number of worker threads of fetch_many
+        rate: float
+            the maximum number of requests per second to a host
+        burst: int
+            the maximum number of requests sent to a host at once
+        max_retries: int
+            the number of retries of a failed request
+        backoff: float
+            the seconds to wait before the first retry, it doubles after each retry
+        timeout: float
+            the socket timeout in seconds
+        """
+        self.url = url
+        self.cache_dir = cache_dir
+        self.thread_number = thread_number
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.limiters = {}
+        self.symbol_locks = {}
+        self.lock = th.Lock()
+        self.local = th.local()   # the connections of each thread
+        self.connections = []     # the connections of all the threads
+        self.requests = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """
+        Close the kept-alive connections of all the worker threads.
+        """
+        self.lock.acquire()
+        connections, self.connections = self.connections, []
+        self.lock.release()
+        for conn in connections:
+            conn.close()
+
+
+    def fetch(self, symbol, start, end):
+        """
+        Get the daily prices of the symbol in the range [start, end].
+
+        Returns
+        ----------
+        df: DataFrame
+            it contains the columns [Open, High, Low, Close, Volume], None if failed
+        """
+        lock = self.__symbol_lock(symbol)
+        lock.acquire()
+        try:
+            return self.__fetch(symbol, to_day(start), to_day(end))
+        except FetchError as err:
+            print "Failed to to get the data of symbol: ", symbol
+            print err
+            return None
+        finally:
+            lock.release()
+
+
+    def fetch_many(self, symbols, start, end):
+        """
+        Get the daily prices of the symbols with the worker threads.
+
+        Returns
+        ----------
+        prices: dict
+            symbol -> DataFrame, the symbols that failed are not included
+        """
+        tasks = Queue.Queue()
+        for symbol in symbols:
+            tasks.put(symbol)
+
+        results = {}
+        results_lock = th.Lock()
+
+        def work():
+            while True:
+                try:
+                    symbol = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+                df = self.fetch(symbol, start, end)
+                if df is not None:
+                    results_lock.acquire()
+                    results[symbol] = df
+                    results_lock.release()
+
+        threads = [th.Thread(target=work) for i in range(min(self.thread_number, len(symbols)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return results
+
+
+    def __fetch(self, symbol, start_day, end_day):
+        cached, covered = self.__read_cache(symbol)
+
+        # fetch the days before and after the covered range, the covered range stays continuous
+        parts = [] if cached is None else [cached]
+        if covered is None:
+            parts.append(self.__request(symbol, start_day, end_day))
+            covered = [start_day, end_day]
+        else:
+            if start_day < covered[0]:
+                parts.append(self.__request(symbol, start_day, covered[0] - 1))
+                covered[0] = start_day
+            if end_day > covered[1]:
+                parts.append(self.__request(symbol, covered[1] + 1, end_day))
+                covered[1] = end_day
+
+        if len(parts) > 1 or cached is None:
+            df = pd.concat(parts)
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+            # today's prices may be incomplete, they are fetched again next time
+            covered[1] = min(covered[1], to_day(pd.Timestamp.today()) - 1)
+            self.__write_cache(symbol, df, covered)
+        else:
+            df = cached
+
+        days = df.index.values.view(np.int64) // (24 * 3600 * 10**9)
+        lo = np.searchsorted(days, start_day, side='left')
+        hi = np.searchsorted(days, end_day, side='right')
+        return df.iloc[lo:hi]
+
+
+    def __request(self, symbol, start_day, end_day):
+        """
+        Request the prices of the symbol in the range from the service.
+        """
+        params = urllib.urlencode({
+            "q": symbol,
+            "startdate": days_to_index([start_day])[0].strftime(URL_DATE_FORMAT),
+            "enddate": days_to_index([end_day])[0].strftime(URL_DATE_FORMAT),
+            "output": "csv",
+        })
+        url = urlparse.urlsplit(self.url)
+        path = "{}?{}".format(url.path, params)
+        limiter = self.__limiter(url.netloc)
+
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(delay)
+                delay *= 2
+
+            limiter.acquire()
+            try:
+                status, body = self.__get(url.scheme, url.netloc, path)
+            except (httplib.HTTPException, socket.error) as err:
+                self.__close(url.netloc)
+                error = err
+                continue
+
+            if status == 200:
+                try:
+                    return read_price_csv(StringIO(body))
+                except (ValueError, KeyError) as err:
+                    raise FetchError("{} invalid response: {}".format(symbol, err))
+            if status == 404 or status == 400:   # the symbol or the range has no prices
+                return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([]), dtype=np.float64)
+            error = "HTTP status {}".format(status)
+            if status != 429 and status < 500:
+                break
+
+        raise FetchError("{} {}".format(symbol, error))
+
+
+    def __get(self, scheme, netloc, path):
+        """
+        Send the GET request with the connection of the current thread.
+        """
+        connections = getattr(self.local, "connections", None)
+        if connections is None:
+            connections = self.local.connections = {}
+
+        conn = connections.get(netloc)
+        if conn is None:
+            conn_class = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+            conn = connections[netloc] = conn_class(netloc, timeout=self.timeout)
+            self.lock.acquire()
+            self.connections.append(conn)
+            self.lock.release()
+
+        conn.request("GET", path, headers={"Connection": "keep-alive"})
+        response = conn.getresponse()
+        body = response.read()
+        self.lock.acquire()
+        self.requests += 1
+        self.lock.release()
+        if response.getheader("connection", "").lower() == "close":
+            self.__close(netloc)
+        return response.status, body
+
+
+    def __close(self, netloc):
+        connections = getattr(self.local, "connections", {})
+        conn = connections.pop(netloc, None)
+        if conn is not None:
+            conn.close()
+            self.lock.acquire()
+            if conn in self.connections:
+                self.connections.remove(conn)
+            self.lock.release()
+
+
+    def __limiter(self, netloc):
+        self.lock.acquire()
+        limiter = self.limiters.get(netloc)
+        if limiter is None:
+            limiter = self.limiters[netloc] = RateLimiter(self.rate, self.burst)
+        self.lock.release()
+        return limiter
+
+
+    def __symbol_lock(self, symbol):
+        self.lock.acquire()
+        lock = self.symbol_locks.get(symbol)
+        if lock is None:
+            lock = self.symbol_locks[symbol] = th.Lock()
+        self.lock.release()
+        return lock
+
+
+    def __read_cache(self, symbol):
+        """
+        Returns
+        ----------
+        df: DataFrame
+            the cached prices, None if the symbol is not cached
+        covered: list
+            [start_day, end_day], the range covered by the cached prices
+        """
+        if self.cache_dir is None:
+            return None, None
+
+        meta_file = os.path.join(self.cache_dir, "{}.json".format(symbol))
+        csv_file = os.path.join(self.cache_dir, "{}.csv".format(symbol))
+        if not os.path.exists(meta_file) or not os.path.exists(csv_file):
+            return None, None
+
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        return read_price_csv(csv_file), [meta["start"], meta["end"]]
+
+
+    def __write_cache(self, symbol, df, covered):
+        if self.cache_dir is None:
+            return
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        df.to_csv(os.path.join(self.cache_dir, "{}.csv".format(symbol)),
+                  index_label="Date", date_format=DATE_FORMAT)
+        with open(os.path.join(self.cache_dir, "{}.json".format(symbol)), "w") as f:
+            json.dump({"start": covered[0], "end": covered[1]}, f)
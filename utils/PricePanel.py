@@ -0,0 +1,161 @@
+import pandas as pd
+import numpy as np
+
+from utils.PriceStore import COLUMNS, read_price_csv, to_day, days_to_index
+from utils.TradingCalendar import TradingCalendar
+
+"""
+The prices of a universe of symbols saved in one aligned array with the shape
+(symbols, trading days, fields). The trading days are the days of a trading
+calendar or the union of the trading days of the symbols, the value is NaN if
+the symbol has no price on the day.
+"""
+
+
+class PricePanel(object):
+
+    def __init__(self, values, symbols, days, fields):
+        """
+        Parameters
+        -----------
+        values: np.array or np.memmap
+            the prices with the shape (symbols, days, fields)
+        symbols: list
+            the symbols of the rows
+        days: np.array
+            the trading days of the columns (days since 1970-01-01)
+        fields: list
+            the names of the fields, for example ["Close"]
+        """
+        self.values = values
+        self.symbols = list(symbols)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.fields = list(fields)
+        self.symbol_index = dict((s, i) for i, s in enumerate(self.symbols))
+        self.field_index = dict((f, i) for i, f in enumerate(self.fields))
+        self.dates = days_to_index(self.days)
+
+
+    def symbol_pos(self, symbol):
+        """
+        Get the row of the symbol.
+        """
+        return self.symbol_index[symbol]
+
+
+    def date_pos(self, date):
+        """
+        Get the column of the date, -1 if the date is not a trading day of the panel.
+        """
+        day = to_day(date)
+        pos = np.searchsorted(self.days, day)
+        if pos < len(self.days) and self.days[pos] == day:
+            return pos
+        return -1
+
+
+    def date_range(self, start=None, end=None):
+        """
+        Get the columns of the date range [start, end] as a slice.
+        """
+        lo = 0 if start is None else np.searchsorted(self.days, to_day(start), side='left')
+        hi = len(self.days) if end is None else np.searchsorted(self.days, to_day(end), side='right')
+        return slice(lo, hi)
+
+
+    def field(self, name):
+        """
+        Get the values of the field, the returned array is a view with the shape (symbols, days).
+        """
+        return self.values[:, :, self.field_index[name]]
+
+
+    def to_frame(self, name="Close", symbols=None):
+        """
+        Get the values of the field as a DataFrame, one column per symbol.
+        """
+        values = self.field(name)
+        if symbols is None:
+            symbols = self.symbols
+        else:
+            values = values[[self.symbol_index[s] for s in symbols]]
+        return pd.DataFrame(values.T, index=self.dates, columns=symbols)
+
+
+    def symbol_frame(self, symbol):
+        """
+        Get the prices of the symbol as a DataFrame, the days that the symbol has no price are dropped.
+        """
+        df = pd.DataFrame(self.values[self.symbol_index[symbol]], index=self.dates, columns=self.fields)
+        return df.dropna(how="all")
+
+
+def load_panel(symbols, store, start=None, end=None, fields=COLUMNS, dtype=np.float32, filename=None,
+               calendar=None):
+    """
+    Load the prices of the symbols as a panel.
+
+    Parameters
+    ----------
+    symbols: list
+        the symbols to load
+    store: PriceStore
+        the price store, the csv file is read if the symbol is stale in the store
+    start: string
+        the start date, the first date by default
+    end: string
+        the end date, the last date by default
+    fields: list
+        the fields to load, subset of [Open, High, Low, Close, Volume]
+    dtype: np.dtype
+        the type of the values, float32 halves the memory of float64
+    filename: string
+        if specified, the panel is backed by a memory-mapped file instead of memory
+    calendar: TradingCalendar
+        the trading days of the panel, the union of the trading days of the symbols by default
+
+    Returns
+    ----------
+    panel: PricePanel
+    """
+    columns = [COLUMNS.index(f) for f in fields]
+    start_day = None if start is None else to_day(start)
+    end_day = None if end is None else to_day(end)
+
+    # first pass, read the dates of the symbols to build the trading days
+    loaded = []
+    for symbol in symbols:
+        try:
+            if not store.is_stale(symbol):
+                dates, values = store.get_arrays(symbol, start, end)
+            else:
+                df = read_price_csv(store.csv_path(symbol))
+                dates = df.index.values.astype('datetime64[D]').astype(np.int64)
+                values = df.values
+                lo = 0 if start_day is None else np.searchsorted(dates, start_day, side='left')
+                hi = len(dates) if end_day is None else np.searchsorted(dates, end_day, side='right')
+                dates, values = dates[lo:hi], values[lo:hi]
+        except IOError:
+            print "Failed to load the prices of symbol: ", symbol
+            continue
+        loaded.append((symbol, dates, values))
+
+    if calendar is None:
+        calendar = TradingCalendar(np.concatenate([item[1] for item in loaded] + [np.zeros(0, dtype=np.int64)]))
+    days_range = calendar.range(start, end)
+    days = calendar.days[days_range]
+
+    shape = (len(loaded), len(days), len(fields))
+    if filename is None:
+        buffer = np.empty(shape, dtype=dtype)
+    else:
+        buffer = np.memmap(filename, dtype=dtype, mode='w+', shape=shape)
+    buffer.fill(np.nan)
+
+    # second pass, copy the values to their positions in the calendar
+    for i, (symbol, dates, values) in enumerate(loaded):
+        pos = calendar.positions(dates) - days_range.start
+        mask = (pos >= 0) & (pos < len(days))
+        buffer[i, pos[mask], :] = values[mask][:, columns]
+
+    return PricePanel(buffer, [item[0] for item in loaded], days, fields)
@@ -0,0 +1,338 @@
+import pandas as pd
+import numpy as np
+import threading as th
+import hashlib
+import json
+import os
+
+from optparse import OptionParser
+from StringIO import StringIO
+from utils.Fingerprints import fingerprints
+
+"""
+A binary price store built from the csv files in the 'data/prices/' directory.
+
+Each symbol is saved as two raw binary files in the store directory:
+    <symbol>.dates: int64 array, the trading days (days since 1970-01-01)
+    <symbol>.ohlcv: float64 array with the shape (rows, 5), the columns are
+                    [Open, High, Low, Close, Volume]
+The index.json file records the number of rows, the date range and the size,
+mtime and fingerprint (see utils.Fingerprints) of the source csv file of each
+symbol. It also records the number of
+ingested bytes of the csv file and the hash of the ingested bytes, so utils.ingest
+can append the new rows of a csv file without parsing it again.
+
+Both files are memory-mapped when they are read, so a date range is returned
+as a view of the mapped arrays without parsing or copying the data.
+"""
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+DATE_FORMAT = '%d-%b-%y'
+INDEX_FILE = "index.json"
+DAY_NS = 24 * 3600 * 10**9
+
+
+def to_day(value):
+    """
+    Convert a date (string, date, datetime or Timestamp) to the number of days since 1970-01-01.
+    """
+    return pd.Timestamp(value).value // DAY_NS
+
+
+def days_to_index(days):
+    """
+    Convert an array of days since 1970-01-01 to a DatetimeIndex.
+    """
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64) * DAY_NS)
+
+
+def read_price_csv(csvfile, sort=True):
+    """
+    Read the price csv file of a symbol.
+
+    Parameters
+    ----------
+    csvfile: string or file
+        the path of the csv file or a file-like object
+    sort: boolean
+        sort the rows by date
+
+    Returns
+    ----------
+    df: DataFrame
+        it contains the columns [Open, High, Low, Close, Volume], the rows that
+        have empty values are dropped.
+    """
+    df = pd.read_csv(csvfile, index_col=0, na_values=['nan', '-'])
+    df.index = pd.to_datetime(df.index, format=DATE_FORMAT)
+    df = df[COLUMNS].astype(np.float64)
+    df.dropna(inplace=True)
+    if sort:
+        df.sort_index(inplace=True)
+    return df
+
+
+class PriceStore(object):
+
+    def __init__(self, store_dir="data/store/", prices_dir="data/prices/"):
+        """
+        Parameters
+        -----------
+        store_dir: string
+            the directory of the binary files
+        prices_dir: string
+            the directory of the source csv files
+        """
+        self.store_dir = store_dir
+        self.prices_dir = prices_dir
+        self.index = {}
+        self.index_mtime = None
+        self.maps = {}
+        self.lock = th.Lock()
+
+
+    def csv_path(self, symbol):
+        return os.path.join(self.prices_dir, "{}.csv".format(symbol))
+
+
+    def file_path(self, symbol, ext):
+        return os.path.join(self.store_dir, "{}.{}".format(symbol, ext))
+
+
+    def ingest(self, symbols=None):
+        """
+        Convert the csv files to the binary store.
+
+        Parameters
+        ----------
+        symbols: list
+            the symbols to ingest. If not specified, all the csv files in the
+            prices directory will be ingested.
+
+        Returns
+        ----------
+        count: int
+            the number of ingested symbols
+        """
+        if not os.path.exists(self.store_dir):
+            os.makedirs(self.store_dir)
+
+        if symbols is None:
+            symbols = [f[:-4] for f in os.listdir(self.prices_dir) if f.endswith(".csv")]
+
+        self.reload_index()
+        count = 0
+        for symbol in symbols:
+            try:
+                self.index[symbol] = self.ingest_symbol(symbol)
+                count += 1
+            except (IOError, ValueError, KeyError) as err:
+                print "Failed to ingest the csv file of symbol: ", symbol
+                print err
+
+        self.save_index()
+        return count
+
+
+    def ingest_symbol(self, symbol):
+        """
+        Convert the csv file of the symbol to binary files. The index is not saved.
+
+        Returns
+        ----------
+        entry: dict
+            the index entry of the symbol
+        """
+        csvfile = self.csv_path(symbol)
+        stat = os.stat(csvfile)
+        with open(csvfile, "rb") as f:
+            content = f.read()
+
+        df = read_price_csv(StringIO(content), sort=False)
+        ascending = df.index.is_monotonic_increasing
+        df.sort_index(inplace=True)
+        # the ingested bytes end with the last complete line
+        offset = content.rfind("\n") + 1
+
+        days = df.index.values.astype('datetime64[D]').astype(np.int64)
+        values = np.ascontiguousarray(df[COLUMNS].values, dtype=np.float64)
+        days.tofile(self.file_path(symbol, "dates"))
+        values.tofile(self.file_path(symbol, "ohlcv"))
+
+        self.lock.acquire()
+        self.maps.pop(symbol, None)
+        self.lock.release()
+
+        return {
+            "rows": len(days),
+            "first": int(days[0]) if len(days) > 0 else None,
+            "last": int(days[-1]) if len(days) > 0 else None,
+            "size": len(content),
+            "mtime": stat.st_mtime,
+            "source": hashlib.sha1(content).hexdigest(),
+            "offset": offset,
+            "ascending": ascending,
+            "prefix_hash": hashlib.sha1(content[:offset]).hexdigest(),
+        }
+
+
+    def append_symbol(self, symbol, days, values):
+        """
+        Append the rows to the binary files of the symbol. The rows must be later than
+        the stored rows, the index entry of the symbol is not updated.
+        """
+        with open(self.file_path(symbol, "dates"), "ab") as f:
+            np.asarray(days, dtype=np.int64).tofile(f)
+        with open(self.file_path(symbol, "ohlcv"), "ab") as f:
+            np.ascontiguousarray(values, dtype=np.float64).tofile(f)
+
+        self.lock.acquire()
+        self.maps.pop(symbol, None)
+        self.lock.release()
+
+
+    def save_index(self):
+        path = os.path.join(self.store_dir, INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.rename(tmp_path, path)
+        self.index_mtime = os.stat(path).st_mtime
+
+
+    def reload_index(self):
+        """
+        Load the index file if it was changed since it was loaded last time.
+        """
+        path = os.path.join(self.store_dir, INDEX_FILE)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+
+        if mtime == self.index_mtime:
+            return
+
+        with open(path, "r") as f:
+            index = json.load(f)
+
+        self.lock.acquire()
+        self.index = index
+        self.index_mtime = mtime
+        self.maps = {}
+        self.lock.release()
+
+
+    def fingerprint(self, symbol):
+        """
+        Get the fingerprint of the csv file that the stored prices of the symbol were
+        built from, None if the symbol was not ingested.
+        """
+        self.reload_index()
+        entry = self.index.get(symbol)
+        return None if entry is None else entry.get("source")
+
+
+    def is_stale(self, symbol):
+        """
+        Check whether the stored prices of the symbol are out of date. The prices
+        are stale if the symbol was not ingested or the content of its csv file
+        was changed after the ingestion. The csv file is hashed only if its mtime
+        was changed.
+        """
+        self.reload_index()
+        entry = self.index.get(symbol)
+        if entry is None:
+            return True
+
+        try:
+            stat = os.stat(self.csv_path(symbol))
+        except OSError:
+            return False   # the csv file was removed, use the stored prices
+
+        if stat.st_size != entry["size"]:
+            return True
+        if stat.st_mtime == entry["mtime"]:
+            return False
+        # the file may be touched or copied without changes
+        return fingerprints.get(self.csv_path(symbol)) != entry.get("source")
+
+
+    def __open(self, symbol):
+        """
+        Get the memory-mapped dates and ohlcv arrays of the symbol.
+        """
+        arrays = self.maps.get(symbol)
+        if arrays is not None:
+            return arrays
+
+        rows = self.index[symbol]["rows"]
+        if rows == 0:
+            arrays = (np.zeros(0, dtype=np.int64), np.zeros((0, len(COLUMNS)), dtype=np.float64))
+        else:
+            dates = np.memmap(self.file_path(symbol, "dates"), dtype=np.int64, mode='r', shape=(rows,))
+            values = np.memmap(self.file_path(symbol, "ohlcv"), dtype=np.float64, mode='r',
+                               shape=(rows, len(COLUMNS)))
+            arrays = (dates, values)
+
+        self.lock.acquire()
+        self.maps[symbol] = arrays
+        self.lock.release()
+        return arrays
+
+
+    def get_arrays(self, symbol, start=None, end=None):
+        """
+        Get the stored prices of the symbol in the specified range. The returned arrays
+        are read-only views of the memory-mapped files.
+
+        Parameters
+        ----------
+        symbol: string
+        start: string
+            the start date, the first stored date by default
+        end: string
+            the end date, the last stored date by default
+
+        Returns
+        ----------
+        dates: np.array
+            the trading days (days since 1970-01-01)
+        values: np.array
+            the [Open, High, Low, Close, Volume] values, one row per trading day
+        """
+        dates, values = self.__open(symbol)
+        lo = 0 if start is None else np.searchsorted(dates, to_day(start), side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, to_day(end), side='right')
+        return dates[lo:hi], values[lo:hi]
+
+
+    def get_prices(self, symbol, start=None, end=None):
+        """
+        Get the stored prices of the symbol in the specified range as a DataFrame.
+        The DataFrame shares the memory of the mapped file, so it is read-only.
+
+        Returns
+        ----------
+        df: DataFrame
+            it contains the columns [Open, High, Low, Close, Volume]
+        """
+        dates, values = self.get_arrays(symbol, start, end)
+        return pd.DataFrame(values, index=days_to_index(dates), columns=COLUMNS, copy=False)
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-d storedir] [-p pricesdir] [symbol1 symbol2 ...]",)
+    parser.add_option("-d", "--storedir", dest="store_dir", default="data/store/",
+                      help="the directory of the binary store; the default value is data/store/")
+    parser.add_option("-p", "--pricesdir", dest="prices_dir", default="data/prices/",
+                      help="the directory of the csv files; the default value is data/prices/")
+
+    options, args = parser.parse_args()
+    store = PriceStore(options.store_dir, options.prices_dir)
+    count = store.ingest(args if len(args) > 0 else None)
+    print "Ingested {} symbols to {}".format(count, options.store_dir)
+
+
+if __name__ == "__main__":
+    main()
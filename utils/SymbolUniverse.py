@@ -0,0 +1,219 @@
+import pandas as pd
+import numpy as np
+import os
+
+from utils.Fingerprints import fingerprints
+
+"""
+The universe of the symbols listed in the data/*_symbols.csv files. The listings
+are compiled once to typed arrays (numeric market cap, last sale and IPO year,
+integer codes of the exchange, sector and industry) and saved to an npz file,
+so the symbols can be filtered with vectorised masks. The npz file records the
+fingerprints of the listing files, it is compiled again when they are changed.
+"""
+
+EXCHANGE_FILES = {
+    "AMEX": "data/AMEX_symbols.csv",
+    "NASDAQ": "data/NASDAQ_symbols.csv",
+    "NYSE": "data/NYSE_symbols.csv",
+}
+CACHE_FILE = "data/universe.npz"
+UNITS = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+# the filters of the symbols whose price > 1 and market cap is in billions ("$xB", not "$xT")
+BILLION_CAPS = {"min_price": 1, "min_cap": 1e9, "max_cap": 1e12}
+
+
+def parse_market_cap(values):
+    """
+    Convert the market cap strings (e.g. "$1.17B", "$73.81M", "n/a") to numbers, NaN if unknown.
+    """
+    values = pd.Series(values, dtype=object).fillna("n/a").astype(str).str.strip()
+    units = values.str[-1].map(UNITS)
+    numbers = pd.to_numeric(values.str[:-1].str.lstrip("$"), errors="coerce")
+    return (numbers * units).values.astype(np.float64)
+
+
+class SymbolUniverse(object):
+
+    def __init__(self, columns, exchanges, sectors, industries, sources=None):
+        """
+        Parameters
+        -----------
+        columns: dict
+            the typed columns, the keys are [symbol, name, exchange, last_sale,
+            market_cap, ipo_year, sector, industry]. exchange, sector and industry
+            are the integer codes of the names, ipo_year is 0 if unknown.
+        exchanges: list
+            the names of the exchange codes
+        sectors: list
+            the names of the sector codes
+        industries: list
+            the names of the industry codes
+        sources: dict
+            listing file -> the fingerprint of the file that the universe was compiled from
+        """
+        self.columns = columns
+        self.exchanges = [str(name) for name in exchanges]
+        self.sectors = [str(name) for name in sectors]
+        self.industries = [str(name) for name in industries]
+        self.symbols = [str(symbol) for symbol in columns["symbol"]]
+        self.sources = {} if sources is None else sources
+
+
+    @staticmethod
+    def load(files=EXCHANGE_FILES, cache_file=CACHE_FILE):
+        """
+        Load the compiled universe, it is compiled from the listing files if the cache
+        file does not exist or the listing files were changed.
+        """
+        if cache_file is not None and os.path.exists(cache_file):
+            universe = SymbolUniverse.read(cache_file)
+            if sorted(universe.sources.keys()) == sorted(files.values()) and \
+                    len(fingerprints.changed(universe.sources)) == 0:
+                return universe
+
+        universe = SymbolUniverse.compile(files)
+        if cache_file is not None:
+            universe.save(cache_file)
+        return universe
+
+
+    @staticmethod
+    def compile(files=EXCHANGE_FILES):
+        """
+        Compile the listing files.
+
+        Parameters
+        ----------
+        files: dict
+            exchange name -> listing csv file
+        """
+        frames = []
+        for exchange in sorted(files.keys()):
+            df = pd.read_csv(files[exchange], dtype=str, keep_default_na=False)
+            df["Exchange"] = exchange
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True)
+
+        exchange = pd.Categorical(df["Exchange"])
+        sector = pd.Categorical(df["Sector"])
+        industry = pd.Categorical(df["industry"])
+        columns = {
+            "symbol": df["Symbol"].str.strip().values.astype(str),
+            "name": df["Name"].values.astype(str),
+            "exchange": exchange.codes.astype(np.int16),
+            "last_sale": pd.to_numeric(df["LastSale"], errors="coerce").values.astype(np.float64),
+            "market_cap": parse_market_cap(df["MarketCap"].values),
+            "ipo_year": pd.to_numeric(df["IPOyear"], errors="coerce").fillna(0).values.astype(np.int16),
+            "sector": sector.codes.astype(np.int16),
+            "industry": industry.codes.astype(np.int16),
+        }
+        sources = dict((f, fingerprints.get(f)) for f in files.values())
+        return SymbolUniverse(columns, exchange.categories, sector.categories, industry.categories, sources)
+
+
+    @staticmethod
+    def read(filename):
+        data = np.load(filename)
+        columns = dict((key[4:], data[key]) for key in data.files if key.startswith("col_"))
+        sources = {}
+        if "source_files" in data.files:
+            sources = dict(zip(data["source_files"].tolist(), data["source_hashes"].tolist()))
+        return SymbolUniverse(columns, data["exchanges"], data["sectors"], data["industries"], sources)
+
+
+    def save(self, filename):
+        arrays = dict(("col_" + key, value) for key, value in self.columns.items())
+        np.savez(filename, exchanges=np.array(self.exchanges, dtype=str),
+                 sectors=np.array(self.sectors, dtype=str),
+                 industries=np.array(self.industries, dtype=str),
+                 source_files=np.array(sorted(self.sources.keys()), dtype=str),
+                 source_hashes=np.array([self.sources[f] for f in sorted(self.sources.keys())], dtype=str),
+                 **arrays)
+
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+
+    def mask(self, min_cap=None, max_cap=None, min_price=None, exchanges=None, sectors=None,
+             industries=None, min_ipo_year=None, max_ipo_year=None):
+        """
+        Get the boolean mask of the symbols that pass all the filters.
+
+        Parameters
+        ----------
+        min_cap: float
+            market cap >= min_cap
+        max_cap: float
+            market cap < max_cap
+        min_price: float
+            last sale > min_price
+        exchanges: list
+            the exchange is in the list, e.g. ["NYSE", "NASDAQ"]
+        sectors: list
+            the sector is in the list, e.g. ["Technology"]
+        industries: list
+            the industry is in the list
+        min_ipo_year: int
+            IPO year >= min_ipo_year, the symbols of unknown IPO year are excluded
+        max_ipo_year: int
+            IPO year <= max_ipo_year, the symbols of unknown IPO year are excluded
+
+        Returns
+        ----------
+        mask: np.array
+        """
+        cols = self.columns
+        mask = np.ones(len(self.symbols), dtype=bool)
+        # the comparisons with NaN are False, so the unknown values are excluded
+        with np.errstate(invalid="ignore"):
+            if min_cap is not None:
+                mask &= cols["market_cap"] >= min_cap
+            if max_cap is not None:
+                mask &= cols["market_cap"] < max_cap
+            if min_price is not None:
+                mask &= cols["last_sale"] > min_price
+        if exchanges is not None:
+            mask &= np.in1d(cols["exchange"], self.__codes(self.exchanges, exchanges))
+        if sectors is not None:
+            mask &= np.in1d(cols["sector"], self.__codes(self.sectors, sectors))
+        if industries is not None:
+            mask &= np.in1d(cols["industry"], self.__codes(self.industries, industries))
+        if min_ipo_year is not None:
+            mask &= (cols["ipo_year"] >= min_ipo_year) & (cols["ipo_year"] > 0)
+        if max_ipo_year is not None:
+            mask &= (cols["ipo_year"] <= max_ipo_year) & (cols["ipo_year"] > 0)
+        return mask
+
+
+    def filter(self, **filters):
+        """
+        Get the symbols that pass the filters, see mask for the filters.
+
+        Returns
+        ----------
+        symbols: list
+        """
+        return [self.symbols[i] for i in np.flatnonzero(self.mask(**filters))]
+
+
+    def select(self, **filters):
+        """
+        Get the universe of the symbols that pass the filters, see mask for the filters.
+
+        Returns
+        ----------
+        universe: SymbolUniverse
+        """
+        mask = self.mask(**filters)
+        columns = dict((key, value[mask]) for key, value in self.columns.items())
+        return SymbolUniverse(columns, self.exchanges, self.sectors, self.industries, self.sources)
+
+
+    def __codes(self, names, selected):
+        return [names.index(name) for name in selected if name in names]
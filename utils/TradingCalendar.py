@@ -0,0 +1,157 @@
+import pandas as pd
+import numpy as np
+
+from utils.PriceStore import to_day, days_to_index
+
+"""
+The trading days of the market. The loaders align the prices of symbols to the
+calendar by the integer positions of their dates instead of joining DataFrames.
+The calendar is derived from the trading days of a reference symbol (SPY), or
+from the business days and a table of holidays.
+"""
+
+
+class TradingCalendar(object):
+
+    def __init__(self, days):
+        """
+        Parameters
+        -----------
+        days: np.array
+            the sorted trading days (days since 1970-01-01)
+        """
+        self.days = np.unique(np.asarray(days, dtype=np.int64))
+        self.__index = None
+
+
+    @staticmethod
+    def from_dates(dates):
+        """
+        Create the calendar from a DatetimeIndex, for example the index of the prices of SPY.
+        """
+        return TradingCalendar(pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64))
+
+
+    @staticmethod
+    def from_holidays(start, end, holidays=()):
+        """
+        Create the calendar from the business days in [start, end] excluding the holidays.
+
+        Parameters
+        ----------
+        start: string
+        end: string
+        holidays: list
+            the dates of the holidays
+        """
+        days = pd.bdate_range(start, end).values.astype('datetime64[D]').astype(np.int64)
+        if len(holidays) > 0:
+            days = np.setdiff1d(days, [to_day(d) for d in holidays])
+        return TradingCalendar(days)
+
+
+    @property
+    def index(self):
+        """
+        The trading days as a DatetimeIndex.
+        """
+        if self.__index is None:
+            self.__index = days_to_index(self.days)
+        return self.__index
+
+
+    def __len__(self):
+        return len(self.days)
+
+
+    def positions(self, dates):
+        """
+        Get the positions of the dates in the calendar.
+
+        Parameters
+        ----------
+        dates: DatetimeIndex or np.array
+            the dates, or the days since 1970-01-01 if it is an integer array
+
+        Returns
+        ----------
+        pos: np.array
+            the positions, -1 if the date is not a trading day
+        """
+        days = self.__to_days(dates)
+        pos = np.searchsorted(self.days, days)
+        found = pos < len(self.days)
+        found[found] = self.days[pos[found]] == days[found]
+        pos[~found] = -1
+        return pos
+
+
+    def range(self, start=None, end=None):
+        """
+        Get the positions of the trading days in [start, end] as a slice.
+        """
+        lo = 0 if start is None else np.searchsorted(self.days, to_day(start), side='left')
+        hi = len(self.days) if end is None else np.searchsorted(self.days, to_day(end), side='right')
+        return slice(lo, hi)
+
+
+    def align(self, dates, values, positions=None):
+        """
+        Align the values to the calendar, the values of the dates that are not
+        trading days are dropped.
+
+        Parameters
+        ----------
+        dates: DatetimeIndex or np.array
+            the dates of the values
+        values: np.array
+            1-D or 2-D array, one row per date
+        positions: slice
+            the range of the calendar to align to, the whole calendar by default
+
+        Returns
+        ----------
+        aligned: np.array
+            one row per trading day, NaN if the date has no value
+        """
+        values = np.asarray(values, dtype=np.float64)
+        pos = self.positions(dates)
+        if positions is None:
+            positions = slice(0, len(self.days))
+        lo, hi = positions.start, positions.stop
+
+        aligned = np.empty((hi - lo,) + values.shape[1:])
+        aligned.fill(np.nan)
+        mask = (pos >= lo) & (pos < hi)
+        aligned[pos[mask] - lo] = values[mask]
+        return aligned
+
+
+    def offset(self, dates, n):
+        """
+        Get the dates n trading days after (or before if n is negative) the dates.
+
+        Parameters
+        ----------
+        dates: DatetimeIndex or np.array
+        n: int
+
+        Returns
+        ----------
+        days: np.array
+            the days since 1970-01-01, -1 if the date is out of the calendar.
+            A date that is not a trading day counts from the previous trading day.
+        """
+        days = self.__to_days(dates)
+        pos = np.searchsorted(self.days, days, side='right') - 1 + n
+        valid = (pos >= 0) & (pos < len(self.days))
+        result = np.empty(len(days), dtype=np.int64)
+        result.fill(-1)
+        result[valid] = self.days[pos[valid]]
+        return result
+
+
+    def __to_days(self, dates):
+        if isinstance(dates, np.ndarray) and dates.dtype.kind in 'iu':
+            return dates.astype(np.int64)
+        return pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64)
@@ -1,9 +1,28 @@
+__author__ = 'huiche'
 import pandas as pd
+import numpy as np
 import os
 
+from utils.PriceStore import PriceStore, COLUMNS, read_price_csv
+from utils.PricePanel import load_panel
+from utils.TradingCalendar import TradingCalendar
+from utils.PriceCache import price_cache, slice_by_date
+from utils.OHLCV import OHLCV
+from utils.Fingerprints import fingerprints
+import analysis.indicators as ind
+
+# the binary store of the csv files, run 'python -m utils.PriceStore' to build it
+price_store = PriceStore()
+# the trading calendars derived from the reference symbols, symbol -> (version, calendar)
+calendars = {}
+
 def get_data_of_symbol(symbol, start, end, fill_empty=True):
     """
-    Get the daily prices of the symbol in the specified range from csv file.
+    Get the daily prices of the symbol in the specified range. The whole history of
+    the symbol is read from the binary price store and cached in the shared price
+    cache, the csv file is parsed only when the symbol was not ingested or its csv
+    file was changed after the ingestion. The returned DataFrame is shared with the
+    cache, it must not be modified.
 
     Parameters
     ----------
@@ -19,21 +38,105 @@ def get_data_of_symbol(symbol, start, end, fill_empty=True):
     df: DataFrame
         it contains the columns [Open, High, Low, Close, Volume]
     """
-    csvfile = "data/prices/{}.csv".format(symbol)
-    dates = pd.date_range(start, end)
-    df = pd.DataFrame(index=dates)
-    dateparser = lambda x: pd.datetime.strptime(x, '%d-%b-%y')
-    df_temp = pd.read_csv(csvfile, index_col=0, parse_dates=[0], date_parser=dateparser,  na_values=['nan', '-'])
-    df = df.join(df_temp)
-    df.dropna(inplace=True)
-
-    # fill empty values
-    if fill_empty:
-        df.fillna(method='ffill', inplace=True)
-        df.fillna(method='backfill', inplace=True)
+    # the rows that have empty values are dropped when the csv file is read,
+    # so there is nothing to fill
+    version = get_fingerprint(symbol)
+    df = price_cache.get(("csv", symbol), start, end, version=version)
+    if df is None:
+        df = slice_by_date(__load_history(symbol, version), start, end)
 
     return df
 
+
+def get_data_with_lookback(symbol, start, end, indicators):
+    """
+    Get the daily prices of the symbol in the specified range and the rows before
+    the range that the indicators need to warm up, see analysis.indicators.warmup.
+
+    Parameters
+    ----------
+    symbol: string
+        the symbol of the stock
+    start: string
+        the start date
+    end: string
+        the end date
+    indicators: list
+        the (name, params) of the indicators that will be computed on the prices
+
+    Returns
+    ----------
+    df: DataFrame
+        the prices that start from the warm-up rows, it is shared with the cache
+    offset: int
+        the position of the first row of the range in df
+    """
+    history = get_data_of_symbol(symbol, None, end)
+    pos = 0 if start is None else history.index.searchsorted(pd.Timestamp(start))
+    length = ind.lookback(indicators)
+    lo = 0 if length is None else max(0, pos - length)
+    return history.iloc[lo:], pos - lo
+
+
+def get_bars_of_symbol(symbol, start, end, dtype=np.float64):
+    """
+    Get the daily prices of the symbol as OHLCV bars, the functions in analysis
+    accept the bars in place of the DataFrame of get_data_of_symbol. The bars are
+    views of the price store if the symbol is ingested and dtype is float64, no
+    DataFrame is created.
+
+    Parameters
+    ----------
+    symbol: string
+        the symbol of the stock
+    start: string
+        the start date
+    end: string
+        the end date
+    dtype: np.dtype
+        the type of the prices, float32 halves the memory
+
+    Returns
+    ----------
+    bars: OHLCV
+    """
+    if not price_store.is_stale(symbol):
+        days, values = price_store.get_arrays(symbol, start, end)
+        return OHLCV.from_arrays(days, values, dtype)
+
+    return OHLCV.from_frame(get_data_of_symbol(symbol, start, end), dtype)
+
+
+def get_fingerprint(symbol):
+    """
+    Get the fingerprint of the prices of the symbol, see utils.Fingerprints. The
+    artefacts derived from the prices record it to detect that the prices were changed.
+    It is the fingerprint recorded by the price store if the stored prices are up to
+    date, so the csv file is not read.
+
+    Returns
+    ----------
+    fingerprint: string
+        None if the symbol has no prices
+    """
+    if not price_store.is_stale(symbol):
+        return price_store.fingerprint(symbol)
+    return fingerprints.get(price_store.csv_path(symbol))
+
+
+def __load_history(symbol, version):
+    """
+    Read the whole history of the symbol and cache it.
+    """
+    if not price_store.is_stale(symbol):
+        history = price_store.get_prices(symbol)
+    else:
+        history = read_price_csv(price_store.csv_path(symbol))
+
+    price_cache.put(("csv", symbol), history, version=version)
+    return history
+
+
 def get_available_symbols():
     """
     Get the symbols in the data/prices/ directory.
@@ -43,4 +146,84 @@ def get_available_symbols():
         if file.endswith(".csv"):
             symbols.append(file[:-4])
 
-    return symbols
\ No newline at end of file
+    return symbols
+
+
+def get_trading_calendar(symbol="SPY"):
+    """
+    Get the trading calendar derived from the trading days of the reference symbol.
+    The calendar is built once and rebuilt only if the prices of the symbol were changed.
+    """
+    version = get_fingerprint(symbol)
+    cached = calendars.get(symbol)
+    if cached is None or cached[0] != version:
+        cached = calendars[symbol] = (version, TradingCalendar.from_dates(get_data_of_symbol(symbol, None, None).index))
+    return cached[1]
+
+
+def get_panel(symbols=None, start=None, end=None, fields=COLUMNS, dtype=np.float32, filename=None,
+              calendar=None):
+    """
+    Get the prices of the symbols as one aligned panel.
+
+    Parameters
+    ----------
+    symbols: list
+        the symbols of the stocks, all the symbols in the data/prices/ directory by default
+    start: string
+        the start date
+    end: string
+        the end date
+    fields: list
+        the fields to load, subset of [Open, High, Low, Close, Volume]
+    dtype: np.dtype
+        the type of the values
+    filename: string
+        the file that backs the panel, the panel is in memory by default
+    calendar: TradingCalendar
+        the trading days of the panel, the union of the trading days of the symbols by default
+
+    Returns
+    ----------
+    panel: PricePanel
+    """
+    if symbols is None:
+        symbols = get_available_symbols()
+
+    return load_panel(symbols, price_store, start=start, end=end, fields=fields, dtype=dtype, filename=filename,
+                      calendar=calendar)
+
+
+def get_close_of_symbols(symbols, start, end, add_spy=True, fill_empty=True):
+    """
+    Get the close prices of the symbols from the price store. Add SPY by default, the
+    prices are aligned to the trading calendar of SPY if it is added.
+
+    Parameters
+    ----------
+    symbols: list
+        the symbols of the stocks
+    start: string
+        the start date
+    end: string
+        the end date
+    add_spy: add SPY to the data
+
+    Returns
+    ----------
+    df: DataFrame
+        the close prices of the stocks
+    """
+    if add_spy and 'SPY' not in symbols:  # add SPY for reference, if absent
+        symbols = symbols + ['SPY']
+
+    # the dates that SPY has no trades are not in its calendar
+    calendar = get_trading_calendar("SPY") if add_spy else None
+    panel = get_panel(symbols, start, end, fields=["Close"], dtype=np.float64, calendar=calendar)
+    df = panel.to_frame("Close")
+
+    # fill empty values
+    if fill_empty:
+        df.fillna(method='ffill', inplace=True)
+        df.fillna(method='backfill', inplace=True)
+    return df
@@ -0,0 +1,199 @@
+import numpy as np
+import hashlib
+import os
+
+from optparse import OptionParser
+from StringIO import StringIO
+from utils.PriceStore import PriceStore, read_price_csv
+
+"""
+Incremental ingestion of the daily price updates. The nightly job adds the new bars
+to the csv files: after the last line of the files sorted by ascending date, or
+right after the header of the files sorted by descending date (the ingested lines
+are shifted by the length of the new lines). Only the new lines are parsed and
+appended to the binary price store.
+
+The store records the sha1 digest of the ingested bytes of a csv file. The ingested
+bytes are hashed again before the new lines are appended, a csv file whose history
+was rewritten (e.g. adjusted for a dividend) is ingested again. The files that were
+touched without changes are skipped.
+"""
+
+UNCHANGED = "unchanged"
+APPENDED = "appended"
+INGESTED = "ingested"
+
+
+def update_symbol(store, symbol):
+    """
+    Ingest the new rows of the csv file of the symbol. The index of the store is not saved.
+
+    Parameters
+    ----------
+    store: PriceStore
+    symbol: string
+
+    Returns
+    ----------
+    result: string
+        UNCHANGED, APPENDED or INGESTED
+    """
+    entry = store.index.get(symbol)
+    csvfile = store.csv_path(symbol)
+    stat = os.stat(csvfile)
+
+    if entry is None or "prefix_hash" not in entry:
+        store.index[symbol] = store.ingest_symbol(symbol)
+        return INGESTED
+
+    if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+        return UNCHANGED
+
+    with open(csvfile, "rb") as f:
+        content = f.read()
+    if entry["ascending"]:
+        result = __append(store, symbol, entry, content)
+    else:
+        result = __prepend(store, symbol, entry, content)
+
+    if result == INGESTED:
+        store.index[symbol] = store.ingest_symbol(symbol)
+    elif entry["size"] == len(content):
+        # all the bytes of the csv file were checked
+        entry["mtime"] = stat.st_mtime
+    return result
+
+
+def __append(store, symbol, entry, content):
+    """
+    Ingest the new lines after the ingested bytes of a file sorted by ascending date.
+    """
+    offset = entry["offset"]
+    prefix = hashlib.sha1(content[:offset])
+    if len(content) < offset or prefix.hexdigest() != entry["prefix_hash"]:
+        return INGESTED
+
+    # only ingest the complete lines, the last line may be still being written
+    new = content[offset:content.rfind("\n") + 1]
+    if len(new) == 0:
+        return UNCHANGED
+
+    header = content[:content.find("\n") + 1]
+    df = read_price_csv(StringIO(header + new))
+    days = df.index.values.astype('datetime64[D]').astype(np.int64)
+    if entry["last"] is not None and len(days) > 0 and days[0] <= entry["last"]:
+        # the new rows are not later than the ingested rows
+        return INGESTED
+
+    __append_rows(store, symbol, entry, days, df.values)
+    prefix.update(new)
+    __ingested(entry, offset + len(new), prefix.hexdigest())
+    return APPENDED
+
+
+def __prepend(store, symbol, entry, content):
+    """
+    Ingest the new lines right after the header of a file sorted by descending date,
+    the ingested lines are shifted by the length of the new lines.
+    """
+    offset = entry["offset"]
+    shift = len(content) - entry["size"]
+    header = content[:content.find("\n") + 1]
+    if shift < 0 or len(header) == 0 or len(header) > offset:
+        return INGESTED
+
+    # the ingested bytes at their positions before the new lines were added
+    start = len(header) + shift
+    if hashlib.sha1(header + content[start:offset + shift]).hexdigest() != entry["prefix_hash"]:
+        return INGESTED
+
+    new = content[len(header):start]
+    if len(new) == 0:
+        return UNCHANGED
+    if not new.endswith("\n"):
+        return INGESTED
+
+    df = read_price_csv(StringIO(header + new), sort=False)
+    if not df.index.is_monotonic_decreasing:
+        return INGESTED
+    df.sort_index(inplace=True)
+    days = df.index.values.astype('datetime64[D]').astype(np.int64)
+    if entry["last"] is not None and len(days) > 0 and days[0] <= entry["last"]:
+        # the new rows are not later than the ingested rows
+        return INGESTED
+
+    __append_rows(store, symbol, entry, days, df.values)
+    __ingested(entry, offset + shift, hashlib.sha1(content[:offset + shift]).hexdigest())
+    return APPENDED
+
+
+def __append_rows(store, symbol, entry, days, values):
+    if len(days) == 0:
+        return
+    store.append_symbol(symbol, days, values)
+    entry["rows"] += len(days)
+    entry["last"] = int(days[-1])
+    if entry["first"] is None:
+        entry["first"] = int(days[0])
+
+
+def __ingested(entry, offset, digest):
+    """
+    Record the ingested bytes, the csv file is up to date in the store only if all
+    its lines were ingested, then its fingerprint is the digest of the ingested bytes.
+    """
+    entry["offset"] = offset
+    entry["prefix_hash"] = digest
+    entry["size"] = offset
+    entry["source"] = digest
+
+
+def update_store(store, symbols=None):
+    """
+    Ingest the new rows of the csv files and save the index of the store.
+
+    Parameters
+    ----------
+    store: PriceStore
+    symbols: list
+        the symbols to update, all the csv files in the prices directory by default
+
+    Returns
+    ----------
+    counts: dict
+        the number of symbols of each result, e.g. {"unchanged": 10, "appended": 5000, "ingested": 2}
+    """
+    if not os.path.exists(store.store_dir):
+        os.makedirs(store.store_dir)
+
+    if symbols is None:
+        symbols = [f[:-4] for f in os.listdir(store.prices_dir) if f.endswith(".csv")]
+
+    store.reload_index()
+    counts = {UNCHANGED: 0, APPENDED: 0, INGESTED: 0}
+    for symbol in symbols:
+        try:
+            counts[update_symbol(store, symbol)] += 1
+        except (IOError, OSError, ValueError, KeyError) as err:
+            print "Failed to update the prices of symbol: ", symbol
+            print err
+
+    store.save_index()
+    return counts
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-d storedir] [-p pricesdir] [symbol1 symbol2 ...]",)
+    parser.add_option("-d", "--storedir", dest="store_dir", default="data/store/",
+                      help="the directory of the binary store; the default value is data/store/")
+    parser.add_option("-p", "--pricesdir", dest="prices_dir", default="data/prices/",
+                      help="the directory of the csv files; the default value is data/prices/")
+
+    options, args = parser.parse_args()
+    store = PriceStore(options.store_dir, options.prices_dir)
+    counts = update_store(store, args if len(args) > 0 else None)
+    print "Unchanged: {} Appended: {} Ingested: {}".format(counts[UNCHANGED], counts[APPENDED], counts[INGESTED])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 import pandas as pd
-import pandas_datareader.data as web
+import numpy as np
 
-from pandas_datareader._utils import RemoteDataError
+from utils.PriceCache import price_cache
+from utils.PriceFetcher import PriceFetcher
+from utils.TradingCalendar import TradingCalendar
+
+# the fetch layer, it keeps the fetched prices in the data/webcache/ directory
+fetcher = PriceFetcher()
 
 
 def get_data_of_symbol(symbol, start, end, fill_empty=True):
     """
-    Get the daily prices of the symbol in the specified range.
+    Get the daily prices of the symbol in the specified range. The fetched prices are
+    cached in the shared price cache, a range covered by a previous request is not
+    fetched again.
 
     Parameters
     ----------
@@ -22,24 +29,52 @@ def get_data_of_symbol(symbol, start, end, fill_empty=True):
     df: DataFrame
         it contains the columns [Open, High, Low, Close, Volume]
     """
-    try:
-        df = web.DataReader(symbol, 'google', start, end)
-    except RemoteDataError as err:
-        print "Failed to to get the data of symbol: ", symbol
-        print err.strerror
-        return None
+    df = price_cache.get(("web", symbol), start, end)
+    if df is None:
+        df = fetcher.fetch(symbol, start, end)
+        if df is None:
+            return None
+        price_cache.put(("web", symbol), df, start, end)
 
-    # fill empty values
+    # fill empty values, the cached DataFrame must not be modified
     if fill_empty:
-        df.fillna(method='ffill', inplace=True)
+        df = df.fillna(method='ffill')
         df.fillna(method='backfill', inplace=True)
 
     return df
 
 
+def get_data_of_symbols(symbols, start, end):
+    """
+    Get the daily prices of the symbols, the symbols that are not cached are fetched concurrently.
+
+    Returns
+    ----------
+    prices: dict
+        symbol -> DataFrame, the symbols that failed are not included
+    """
+    prices = {}
+    missing = []
+    for symbol in symbols:
+        df = price_cache.get(("web", symbol), start, end)
+        if df is None:
+            missing.append(symbol)
+        else:
+            prices[symbol] = df
+
+    fetched = fetcher.fetch_many(missing, start, end)
+    for symbol in fetched.keys():
+        price_cache.put(("web", symbol), fetched[symbol], start, end)
+    prices.update(fetched)
+    return prices
+
+
 def get_close_of_symbols(symbols, start, end, add_spy=True, fill_empty=True):
     """
-    Get the adj close prices of the symbols. Add SPY by default.
+    Get the adj close prices of the symbols. Add SPY by default, the prices are aligned
+    to the trading days of SPY if it is added, otherwise to the union of the trading days
+    of the symbols.
+
     Parameters
     ----------
     symbols: list
@@ -55,25 +90,25 @@ def get_close_of_symbols(symbols, start, end, add_spy=True, fill_empty=True):
     df: DataFrame
         the adj close prices of the stocks
     """
-    dates = pd.date_range(start, end)
-    df = pd.DataFrame(index=dates)
     if add_spy and 'SPY' not in symbols:  # add SPY for reference, if absent
         symbols = symbols + ['SPY']
 
-    for symbol in symbols:
-        df_temp = get_data_of_symbol(symbol, start, end, fill_empty=False)
-        if df_temp is None:
-            continue
-
-        df_temp = df_temp['Close'].to_frame()   # get the 'adj close' column and convert to DataFrame
-        df_temp.rename(columns={'Close': symbol}, inplace=True)
-        df = df.join(df_temp)
+    prices = get_data_of_symbols(symbols, start, end)
+    symbols = [s for s in symbols if s in prices]
+    if add_spy and 'SPY' in prices:  # the dates that SPY has no trades are not in its calendar
+        calendar = TradingCalendar.from_dates(prices['SPY'].index)
+    else:
+        calendar = TradingCalendar(np.concatenate(
+            [prices[s].index.values.astype('datetime64[D]').astype(np.int64) for s in symbols] +
+            [np.zeros(0, dtype=np.int64)]))
 
-    if add_spy:  # drop dates that SPY has no trades
-        df.dropna(subset=["SPY"], inplace=True)
+    values = np.empty((len(calendar), len(symbols)))
+    for i, symbol in enumerate(symbols):
+        values[:, i] = calendar.align(prices[symbol].index, prices[symbol]['Close'].values)
+    df = pd.DataFrame(values, index=calendar.index, columns=symbols)
 
     # fill empty values
     if fill_empty:
         df.fillna(method='ffill', inplace=True)
         df.fillna(method='backfill', inplace=True)
-    return df
\ No newline at end of file
+    return df